@@ -0,0 +1,5 @@
+"""Sub-package for the measurement acquisition sequence."""
+
+from . import settling
+from . import planner
+from . import sequencer
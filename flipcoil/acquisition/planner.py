@@ -0,0 +1,112 @@
+"""Scan planner for the measurement sequence.
+
+Builds N-dimensional grids of setpoints (plan points, see the sequencer
+PLAN_KEYS) ordered to limit the stage travel and the power supply swing:
+
+- the current is the slowest axis and is always stepped from the start to
+  the end setpoint, so the magnet follows a single (monotonic) hysteresis
+  branch;
+- the stage axes are scanned in serpentine order (each row starts where
+  the previous one ended);
+- the motion parameters (speed, acceleration and jerk), which cost no
+  travel, change fastest.
+"""
+
+import numpy as _np
+
+
+# grid axes, slowest first
+AXIS_ORDER = ['current', 'y', 'x', 'speed', 'accel', 'jerk']
+
+# axes that are settled together after a change (see estimate_time)
+SETTLE_GROUPS = {'x': 'stage', 'y': 'stage', 'current': 'current'}
+
+
+def axis_values(start, end, step):
+    """Returns the setpoints of a scan axis.
+
+    Args:
+        start (float): first setpoint;
+        end (float): last setpoint (always included);
+        step (float): setpoint step (the sign is taken from start and end,
+            0 measures only the end setpoint).
+
+    Returns:
+        list of setpoints.
+    """
+    if step == 0 or start == end:
+        return [end]
+    step = abs(step) if end > start else -abs(step)
+    # number of steps
+    n_steps = int(1 + _np.ceil((end - start)/step))
+    values = [start + i*step for i in range(n_steps)]
+    values[-1] = end
+    return values
+
+
+def grid_plan(axes):
+    """Builds the plan of an N-dimensional scan grid.
+
+    Args:
+        axes (dict): setpoint lists of the scanned parameters (keys in
+            AXIS_ORDER).
+
+    Returns:
+        list of plan points, in the order described in the module
+        docstring.
+    """
+    _points = [{}]
+    for key in [key for key in AXIS_ORDER if key in axes]:
+        _values = list(axes[key])
+        _new_points = []
+        for i, point in enumerate(_points):
+            # the current is never reversed (hysteresis)
+            if key != 'current' and i % 2 == 1:
+                _row = _values[::-1]
+            else:
+                _row = _values
+            for value in _row:
+                _point = dict(point)
+                _point[key] = value
+                _new_points.append(_point)
+        _points = _new_points
+    return _points
+
+
+def estimate_time(plan, measurement_time, repeats=1, start=None, rates=None,
+                  settle_times=None):
+    """Estimates the total time of a scan plan.
+
+    Args:
+        plan (list): plan points;
+        measurement_time (float): time of one measurement [s];
+        repeats (int): number of measurements per point;
+        start (dict): setpoints before the scan (None does not count the
+            first change of each axis travel);
+        rates (dict): change rates of the axes [setpoint units/s] (the
+            axes without rate change instantly);
+        settle_times (dict): settle time after a change of each axis [s]
+            (axes in the same SETTLE_GROUPS group settle together).
+
+    Returns:
+        estimated time [s].
+    """
+    rates = rates or {}
+    settle_times = settle_times or {}
+    _total = 0
+    _previous = dict(start or {})
+    for point in plan:
+        _change = 0
+        _settle = {}
+        for key, value in point.items():
+            if _previous.get(key) == value:
+                continue
+            if key in _previous and key in rates:
+                _change = max(_change,
+                              abs(value - _previous[key])/rates[key])
+            _group = SETTLE_GROUPS.get(key, key)
+            _settle[_group] = max(_settle.get(_group, 0),
+                                  settle_times.get(key, 0))
+        _previous.update(point)
+        _total += _change + sum(_settle.values()) + repeats*measurement_time
+    return _total
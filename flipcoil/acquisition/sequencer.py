@@ -0,0 +1,1023 @@
+"""Measurement sequencer for the Flip Coil Control application.
+
+The measurement loops run on a worker thread as a state machine, so the
+GUI thread only builds the scan plan and displays the progress. Each state
+handler does one step of the acquisition (position, arm, move, read,
+analyse, save) and returns the name of the next state (None ends the
+measurement). Progress, running results and finished measurements are
+published through Qt signals, which are delivered on the receivers'
+threads.
+
+A plan is a list of points, each point a dict with the setpoints applied
+before its measurements (keys in PLAN_KEYS, an empty dict measures at the
+current setpoints). Every point is measured repeats times.
+"""
+
+import sys as _sys
+import time as _time
+import threading as _threading
+import traceback as _traceback
+import numpy as _np
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+from qtpy.QtCore import (
+    QObject as _QObject,
+    Signal as _Signal,
+    )
+
+import flipcoil.data as _data
+from flipcoil.acquisition.settling import (
+    EncoderSettle as _EncoderSettle,
+    CurrentSettle as _CurrentSettle,
+    VoltageNoiseSettle as _VoltageNoiseSettle,
+    )
+from flipcoil.analysis.ambient import (
+    AmbientMemo as _AmbientMemo,
+    ambient_saved as _ambient_saved,
+    )
+from flipcoil.analysis.firstintegral import (
+    FC_WINDOW as _FC_WINDOW,
+    SW_WINDOW as _SW_WINDOW,
+    FirstIntegralResult as _FirstIntegralResult,
+    subtract_ambient as _subtract_ambient,
+    )
+from flipcoil.analysis.motionend import (
+    record_samples as _record_samples,
+    step_end_index as _step_end_index,
+    )
+from flipcoil.analysis.streaming import (
+    first_integral_stream as _first_integral_stream,
+    first_integral_sw_stream as _first_integral_sw_stream,
+    stacked_result as _stacked_result,
+    )
+from flipcoil.devices import (
+    ppmac as _ppmac,
+    fdi as _fdi,
+    ps as _ps,
+    volt as _volt,
+    )
+
+
+# scan parameters and their labels in the measurement names
+PLAN_KEYS = ['x', 'y', 'current', 'speed', 'accel', 'jerk']
+PLAN_LABELS = {'x': 'X', 'y': 'Y', 'current': 'I', 'speed': 'Spd',
+               'accel': 'Acc', 'jerk': 'Jrk'}
+
+
+def setpoint_label(point):
+    """Returns the label of a plan point used in the measurement names.
+
+    Args:
+        point (dict): plan point.
+
+    Returns:
+        label string (e.g. '_X=1.00_'), empty for an empty point.
+    """
+    _labels = ['{0}={1:.2f}'.format(PLAN_LABELS[key], point[key])
+               for key in PLAN_KEYS if key in point]
+    if len(_labels) == 0:
+        return ''
+    return '_' + '_'.join(_labels) + '_'
+
+
+def save_log(array, name='', comments=''):
+    """Saves log on file."""
+    name = name + _time.strftime('_%y_%m_%d_%H_%M', _time.localtime()) + '.dat'
+    head = ('Turn1[V.s]\tTurn2[V.s]\tTurn3[V.s]\tTurn4[V.s]\tTurn5[V.s]\t' +
+            'Turn6[V.s]\tTurn7[V.s]\tTurn8[V.s]\tTurn9[V.s]\tTurn10[V.s]')
+    comments = comments + '\n'
+    _np.savetxt(name, array, delimiter='\t', comments=comments, header=head)
+
+
+class SequenceAborted(Exception):
+    """Raised inside the sequence when the measurement is aborted."""
+
+    def __init__(self, message='Measurement Aborted.'):
+        super().__init__(message)
+
+
+class Sequencer(_QObject):
+    """Runs a measurement plan on a worker thread.
+
+    Subclasses implement the state handlers (state_<name> methods) of one
+    measurement, starting at first_state.
+    """
+
+    state_changed = _Signal(str)
+    progress = _Signal(int, int, str)  # step, total steps, label text
+    # FirstIntegralResult, saved record (see saved_record)
+    measurement_done = _Signal(object, object)
+    finished = _Signal(bool, str)  # success, message
+    log = _Signal(str)  # log message (settle and cycle times)
+
+    mode = ''
+    first_state = 'prepare'
+
+    def __init__(self, meas, plan=None, repeats=1, parent=None):
+        """Initialize object.
+
+        Args:
+            meas (MeasurementData or MeasurementDataSW): measurement data
+                (filled and saved by the sequencer);
+            plan (list): plan points (see module docstring);
+            repeats (int): number of measurements per point;
+            parent (QObject): parent object.
+        """
+        super().__init__(parent)
+        self.meas = meas
+        self.plan = [{}] if plan is None else list(plan)
+        self.repeats = repeats
+        self.cfg = None
+        self.ppmac_cfg = None
+        self.poller = None
+        self.window = None  # analysis window (see the subclasses)
+        self.name = ''
+        self.comments = ''
+        self.direction = ''
+        self.database_name = None
+        self.mongo = False
+        self.server = None
+        # running I_std limit [T.m] that aborts a measurement (None disables)
+        self.max_running_std = None
+        self.settle_time = 10  # [s] waited after each setpoint change
+        # settle detectors of the setpoint changes (None waits settle_time)
+        self.move_settle = _EncoderSettle([1, 2, 3, 4])
+        self.current_settle = _CurrentSettle()
+        self.settle_log = []  # settle time of each detector wait
+        self.state = 'idle'
+        self.step = 0
+        self.total = 0
+        self.result = None
+        self.cycle_times = []  # [s] repetition cycle times
+        self.amb_memo = None
+        self._t_cycle = None
+        self._current = None
+        self._restore = {}
+        self._setpoint = {}  # setpoints applied by the plan
+        self._abort = _threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        """True while the sequence thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Starts the sequence on a worker thread."""
+        self._abort.clear()
+        _ppmac.flag_abort = False
+        self._thread = _threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def abort(self):
+        """Requests the sequence to stop (motions in progress are aborted).
+        """
+        self._abort.set()
+        _ppmac.flag_abort = True
+
+    def wait(self, time):
+        """Waits while checking the abort request.
+
+        Args:
+            time (float): time to wait [s].
+        """
+        if self._abort.wait(max(time, 0)):
+            raise SequenceAborted()
+
+    def check_abort(self):
+        """Raises SequenceAborted if the sequence was aborted."""
+        if self._abort.is_set() or _ppmac.flag_abort:
+            raise SequenceAborted()
+
+    def set_state(self, state):
+        """Updates the current state."""
+        self.state = state
+        self.state_changed.emit(state)
+
+    def steps_per_measurement(self):
+        """Returns the number of progress steps of one measurement."""
+        return 1
+
+    def measurement_time(self):
+        """Returns the estimated time of one measurement [s]."""
+        return 0
+
+    def settle_times(self):
+        """Returns the maximum settle time after a change of each scan
+        axis [s] (see planner.estimate_time)."""
+        _times = {}
+        for key, detector in [('x', self.move_settle),
+                              ('y', self.move_settle),
+                              ('current', self.current_settle)]:
+            if detector is None:
+                _times[key] = self.settle_time
+            else:
+                _times[key] = detector.timeout
+        return _times
+
+    def start_cycle(self):
+        """Starts the cycle time measurement of a new measurement."""
+        self.cycle_times = []
+        self._t_cycle = _time.time()
+
+    def end_cycle(self):
+        """Records the time since the end of the previous repetition."""
+        _now = _time.time()
+        if self._t_cycle is not None:
+            self.cycle_times.append(_now - self._t_cycle)
+        self._t_cycle = _now
+
+    def report(self, stream, label='Measurement'):
+        """Publishes the progress and the running field integral.
+
+        Args:
+            stream (StreamingFirstIntegral): streaming analysis;
+            label (str): progress label.
+        """
+        self.step += 1
+        _text = '{0}\nI = {1:.2f} +/- {2:.2f} G.cm ({3} repetitions)'.format(
+            label, stream.I_mean*10**6, stream.I_std*10**6, stream.count)
+        if len(self.cycle_times) > 0:
+            _text = _text + '\nCycle time: {0:.1f} s'.format(
+                self.cycle_times[-1])
+        self.progress.emit(self.step, self.total, _text)
+        if stream.is_diverging(self.max_running_std):
+            raise SequenceAborted(
+                'Field integral standard deviation above the limit.\n'
+                'Measurement Aborted.')
+
+    def read_positions(self, motors, max_age=None):
+        """Returns motor positions, reusing the poller cache if available.
+
+        Args:
+            motors (list): motor numbers;
+            max_age (float): maximum age of the cached positions [s].
+
+        Returns:
+            array with the motor positions [counts].
+        """
+        if self.poller is not None:
+            _pos = self.poller.positions(motors, max_age=max_age)
+        else:
+            _pos = _ppmac.read_motor_pos(motors)
+        if _pos is None:
+            raise RuntimeError('Failed to read the motor positions.')
+        return _pos
+
+    def run(self):
+        """Runs all points of the plan (worker thread)."""
+        _ok, _message = False, 'Measurement Failed.'
+        try:
+            self.prepare_database()
+            self._setpoint = {}
+            self.step = 0
+            self.total = (len(self.plan)*self.repeats *
+                          self.steps_per_measurement())
+            for point in self.plan:
+                self.check_abort()
+                self.set_state('setpoint')
+                self.apply_setpoint(point)
+                for _ in range(self.repeats):
+                    self.check_abort()
+                    self.new_measurement(point)
+                    self.run_states(self.first_state)
+            _ok, _message = True, 'Measurement Finished.'
+        except SequenceAborted as e:
+            _message = str(e)
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            # the multimeter state is unknown after a failure
+            _volt.clear_settings()
+        finally:
+            try:
+                self.restore_setpoint(turn_off=_ok)
+                self.close()
+            except Exception:
+                _traceback.print_exc(file=_sys.stdout)
+            self.set_state('idle')
+            self.finished.emit(_ok, _message)
+
+    def run_states(self, state):
+        """Runs the state handlers of one measurement.
+
+        Args:
+            state (str): initial state.
+        """
+        while state is not None:
+            self.check_abort()
+            self.set_state(state)
+            state = getattr(self, 'state_' + state)()
+
+    def prepare_database(self):
+        """Connects the measurement and ambient field documents."""
+        self.meas.db_update_database(
+            self.database_name, mongo=self.mongo, server=self.server)
+        _amb_meas = type(self.meas)()
+        _amb_meas.db_update_database(
+            self.database_name, mongo=self.mongo, server=self.server)
+        self.amb_memo = _AmbientMemo(_amb_meas)
+
+    def new_measurement(self, point):
+        """Updates the name, hour and comments of the next measurement.
+
+        Args:
+            point (dict): current plan point.
+        """
+        _p_str = setpoint_label(point)
+        _name = self.name
+        if self.mode == 'fc' or len(point) > 0:
+            _name = _name + '_' + self.direction + _p_str
+        self.meas.name = _name + _time.strftime('_%y%m%d_%H%M')
+        self.meas.hour = _time.strftime('%H:%M:%S')
+        if len(point) > 0:
+            self.meas.comments = (self.comments + ' Scan: ' +
+                                  _p_str.strip('_') + '.')
+        else:
+            self.meas.comments = self.comments
+
+    def apply_setpoint(self, point):
+        """Applies the setpoints of a plan point.
+
+        Only the setpoints changed since the previous point are applied
+        and settled, as assumed by planner.estimate_time.
+
+        Args:
+            point (dict): plan point.
+        """
+        _changed = {key: value for key, value in point.items()
+                    if key not in self._setpoint or
+                    self._setpoint[key] != value}
+        _detectors = []
+        if 'x' in _changed or 'y' in _changed:
+            self.move_xy(_changed.get('x'), _changed.get('y'))
+            _detectors.append(self.move_settle)
+        for key in ['speed', 'accel', 'jerk']:
+            if key in _changed and self.cfg is not None:
+                self._restore.setdefault(key, getattr(self.cfg, key))
+                setattr(self.cfg, key, _changed[key])
+        if 'current' in _changed:
+            _ps.set_slowref(_changed['current'])
+            self._current = _changed['current']
+            if self.current_settle is not None:
+                self.current_settle.setpoint = _changed['current']
+            _detectors.append(self.current_settle)
+        self._setpoint.update(point)
+        if None in _detectors:
+            self.wait(self.settle_time)
+        _label = setpoint_label(point).strip('_')
+        for detector in _detectors:
+            if detector is not None:
+                _settled, _time_settle = self.settle(detector, _label)
+                self.log.emit('{0}: {1} {2} in {3:.2f} s'.format(
+                    _label, detector.name,
+                    'settled' if _settled else 'timeout', _time_settle))
+
+    def settle(self, detector, label=''):
+        """Waits a settle detector and logs its settle time.
+
+        Args:
+            detector (SettleDetector): settle detector;
+            label (str): point label in the settle log.
+
+        Returns:
+            (settled, settle time [s]) tuple (see SettleDetector.wait).
+        """
+        _settled, _time_settle = detector.wait(sleep=self.wait)
+        self.settle_log.append({'point': label, 'detector': detector.name,
+                                'time': _time_settle, 'settled': _settled})
+        return _settled, _time_settle
+
+    def restore_setpoint(self, turn_off=True):
+        """Restores the parameters changed by the plan.
+
+        Args:
+            turn_off (bool): if True, the power supply is turned off after
+                a current scan.
+        """
+        for key, value in self._restore.items():
+            setattr(self.cfg, key, value)
+        self._restore = {}
+        self._setpoint = {}
+        if turn_off and self._current is not None:
+            _ps.set_slowref(self._current)
+            _time.sleep(5)
+            _ps.turn_off()
+        self._current = None
+
+    def move_xy(self, x=None, y=None):
+        """Moves the X and Y motors and waits the end of the move.
+
+        Args:
+            x (float): X setpoint (None keeps the current position);
+            y (float): Y setpoint (None keeps the current position).
+        """
+        _msgs = []
+        _motors = []
+        if x is not None:
+            _msgs.append('#1,3j=' + str(x/self.ppmac_cfg.x_sf))
+            _motors.extend([1, 3])
+        if y is not None:
+            _msgs.append('#2,4j=' + str(y/self.ppmac_cfg.y_sf))
+            _motors.extend([2, 4])
+        _ppmac.write('#1..4j/')
+        _ppmac.write(';'.join(_msgs))
+        if _ppmac.wait_motion_done(_motors)['aborted']:
+            raise SequenceAborted()
+
+    def close(self):
+        """Releases the resources of the sequence (end of run)."""
+        pass
+
+    def subtract_ambient(self, result):
+        """Discounts the ambient field from the result (if selected)."""
+        if self.meas.Iamb_id > 0:
+            _subtract_ambient(result, self.amb_memo.get(self.meas.Iamb_id))
+
+    def save_measurement(self):
+        """Saves current measurement into database.
+
+        Returns:
+            measurement id.
+        """
+        _idn = self.meas.db_save()
+        self.record_saved(_idn)
+        return _idn
+
+    def record_saved(self, idn):
+        """Invalidates the ambient field memos if an ambient measurement
+        was saved."""
+        if idn is not None and self.meas.Iamb_id == 0:
+            _ambient_saved(self.meas.collection_name, idn)
+
+    def saved_record(self, idn):
+        """Returns the fields of the saved measurement, copied on the
+        sequence thread so the receivers can cache its analysis while the
+        next measurement runs.
+
+        Args:
+            idn (int): measurement id (None if the save failed).
+
+        Returns:
+            dict with the id, collection name, analysis window and the
+            measurement (and configuration) fields;
+            None if the measurement was not saved.
+        """
+        if idn is None:
+            return None
+        _record = {
+            'idn': idn,
+            'collection_name': self.meas.collection_name,
+            'window': self.window,
+            'meas': {attr: getattr(self.meas, attr, None) for attr in
+                     list(self.meas.db_dict) + _FirstIntegralResult.fields},
+            }
+        if self.cfg is not None:
+            # the stored configuration, without the plan parameters
+            _record['cfg'] = {attr: getattr(self.cfg, attr, None)
+                              for attr in self.cfg.db_dict}
+            _record['cfg'].update(self._restore)
+        return _record
+
+    def state_save(self):
+        """Saves the measurement and publishes its result."""
+        _idn = self.save_measurement()
+        if len(self.cycle_times) > 0:
+            self.log.emit(
+                '{0}: cycle time {1:.2f} s (min {2:.2f} s, max {3:.2f} s, '
+                '{4} repetitions)'.format(
+                    self.meas.name, _np.mean(self.cycle_times),
+                    min(self.cycle_times), max(self.cycle_times),
+                    len(self.cycle_times)))
+        self.measurement_done.emit(self.result, self.saved_record(_idn))
+        return None
+
+
+class FlipCoilSequencer(Sequencer):
+    """Flip coil measurement sequence.
+
+    States: prepare, backlash, arm, move, read (forward, then backward),
+    analyse and save.
+    """
+
+    mode = 'fc'
+
+    def __init__(self, cfg, meas, plan=None, repeats=1, parent=None):
+        """Initialize object.
+
+        Args:
+            cfg (MeasurementConfig): measurement configuration;
+            meas (MeasurementData): measurement data;
+            plan (list): plan points (see module docstring);
+            repeats (int): number of measurements per point;
+            parent (QObject): parent object.
+        """
+        super().__init__(meas, plan=plan, repeats=repeats, parent=parent)
+        self.cfg = cfg
+        self.fdi_mode = False
+        self.window = _FC_WINDOW
+        self.flag_rm_backlash = True
+        self.flag_save = False
+        # shortens the flip coil records to the end of the flux step
+        self.flag_adaptive_duration = False
+        self.adaptive_margin = 0.5  # [s] recorded after the flux step
+        # gathers the rotation encoders during the flips
+        self.flag_gather = False
+        self.gather_frequency = 1000  # [Hz]
+        # scale factors of the recorded X and Y positions
+        self.x_sf = 1
+        self.y_sf = 1
+        # overlaps the record transfer and the encoder readout with the
+        # damping wait (False runs every step in series)
+        self.flag_pipeline = True
+        self.pretrigger_time = 1  # [s] recorded before each flip
+        self.damping_time = 5  # [s] from the end of a record to the next
+        self.traj_frw = None
+        self.traj_bck = None
+        self.executor = None
+
+    def steps_per_measurement(self):
+        """Returns the number of progress steps of one measurement."""
+        return self.cfg.nmeasurements
+
+    def measurement_time(self):
+        """Returns the estimated time of one measurement [s]."""
+        return 1.5 + self.cfg.nmeasurements*(2*self.cfg.duration +
+                                             self.damping_time)
+
+    def wait_motion_end(self, t0, timeout, distance=None):
+        """Waits the rotation motors (5 and 6) to stop.
+
+        Args:
+            t0 (float): acquisition trigger time [s];
+            timeout (float): maximum time after t0 [s];
+            distance (float): move distance [steps].
+
+        Returns:
+            time between t0 and the end of the motion [s];
+            None if the motors are still moving after the timeout.
+        """
+        _metrics = _ppmac.wait_motion_done(
+            [5, 6], timeout=max(t0 + timeout - _time.time(), 0),
+            distance=distance)
+        if not _metrics['done']:
+            return None
+        return _time.time() - t0
+
+    def adapt_acquisition(self, data_frw, data_bck, stop_times,
+                          window=None):
+        """Shortens the multimeter records to the end of the flux step.
+
+        Args:
+            data_frw (array): first forward voltage record [V];
+            data_bck (array): first backward voltage record [V];
+            stop_times (list): encoder stop times after the triggers [s]
+                (None if unknown);
+            window (tuple): analysis window, kept inside the records (None
+                uses the default flip coil window).
+
+        Returns:
+            number of samples of each record.
+        """
+        _nrdgs = min(len(data_frw), len(data_bck))
+        _end = _step_end_index(
+            _np.array([data_frw[:_nrdgs], data_bck[:_nrdgs]]).T)
+        _stop_times = [t for t in stop_times if t is not None]
+        _stop = max(_stop_times) if len(_stop_times) > 0 else None
+        _min_samples = None if window is None else window[1] + 1
+        _nsamples = _record_samples(
+            self.cfg.nplc/60, end_index=_end, stop_time=_stop,
+            margin=self.adaptive_margin, min_samples=_min_samples,
+            max_samples=_nrdgs)
+        if _nsamples < _nrdgs:
+            _volt.configure_nrdgs(_nsamples)
+        return _nsamples
+
+    def state_prepare(self):
+        """Configures the motors and the integrator."""
+        _cfg = self.cfg
+        _steps_per_turn = self.ppmac_cfg.steps_per_turn
+        _speed = _cfg.speed * _steps_per_turn * 10**-3  # [turns/s]
+        if _cfg.accel != 0:
+            _ta = -1/_cfg.accel * 1/_steps_per_turn * 10**6  # [turns/s^2]
+        else:
+            _ta = 0
+        if _cfg.jerk != 0:
+            _ts = -1/_cfg.jerk * 1/_steps_per_turn * 10**9  # [turns/s^3]
+        else:
+            _ts = 0
+        self.start_pos = int(_cfg.start_pos*10**3)
+
+        # acquisition buffers (one row per repetition), allocated when the
+        # record length is known
+        self.data = {'f': None, 'b': None}
+        self.stop_times = {'f': None, 'b': None}
+        self.stream = _first_integral_stream(
+            _cfg, fdi_mode=self.fdi_mode, window=self.window)
+        self.record_time = _cfg.duration  # [s]
+        for attr in ['pos7f', 'pos7b', 'pos8f', 'pos8b']:
+            setattr(self.meas, attr, _np.zeros((2, _cfg.nmeasurements)))
+
+        _ppmac.kill([1, 2, 3, 4])
+        self.wait(1)
+        # X and Y motors do not move during the measurement, so the
+        # positions polled before it are reused if they are fresh
+        _pos = self.read_positions([1, 3, 2, 4], max_age=2)
+        self.meas.x_pos = _pos[:2]*self.x_sf
+        self.meas.y_pos = _pos[2:]*self.y_sf
+
+        _ppmac.set_jog([5, 6], _speed, _ta, _ts)
+
+        self.gather = False
+        self.traj_frw = None
+        self.traj_bck = None
+        if self.flag_gather:
+            self.gather = _ppmac.configure_gather(
+                [7, 8], frequency=self.gather_frequency,
+                duration=self.record_time + 1)
+            self.traj_frw = []
+            self.traj_bck = []
+
+        if self.fdi_mode:
+            self.counts = _fdi.configure_integrator(time=_cfg.duration,
+                                                    interval=50)
+            _fdi.send('INP:COUP DC')
+        else:
+            self.counts = int(_np.ceil(3/(_cfg.nplc/60)))
+            _volt.configure_volt(nplc=_cfg.nplc, time=_cfg.duration)
+        self.wait(0.5)
+        if self.flag_pipeline and self.executor is None:
+            self.executor = _ThreadPoolExecutor(max_workers=1)
+        self.t_ready = 0
+        self.index = 0
+        self.start_cycle()
+        return 'backlash'
+
+    def close(self):
+        """Stops the readout thread."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def state_backlash(self):
+        """Removes the rotation backlash before a repetition."""
+        if self.flag_pipeline and self.index > 0:
+            # the motors are idle since the end of the previous flip
+            _pos = _np.array([self.meas.pos7b[1, self.index - 1],
+                              self.meas.pos8b[1, self.index - 1]])
+        else:
+            _pos = self.read_positions([7, 8], max_age=1)
+        if (self.flag_rm_backlash and
+                any(abs(_pos) % 360000 > self.cfg.max_init_error)):
+            _ppmac.remove_backlash(self.start_pos)
+        self.learn = all([self.flag_adaptive_duration, not self.fdi_mode,
+                          self.index == 0])
+        self.flip = 'f'
+        return 'arm'
+
+    def state_arm(self):
+        """Waits the coil damping and triggers the integrator (or the
+        multimeter) acquisition."""
+        self.wait(self.t_ready - _time.time())
+        if self.fdi_mode:
+            _fdi.start_measurement()
+        else:
+            _volt.start_measurement()
+        self.t0 = _time.time()
+        # the initial positions are read while the baseline is recorded
+        _pos7 = getattr(self.meas, 'pos7' + self.flip)
+        _pos8 = getattr(self.meas, 'pos8' + self.flip)
+        _pos7[0, self.index], _pos8[0, self.index] = (
+            _ppmac.read_motor_pos([7, 8]))
+        self.wait(self.t0 + self.pretrigger_time - _time.time())
+        return 'move'
+
+    def state_move(self):
+        """Starts the flip."""
+        if self.gather:
+            _ppmac.start_gather()
+        _steps = self.cfg.steps_f if self.flip == 'f' else self.cfg.steps_b
+        _ppmac.write('#5j^' + str(_steps[0]) + ';#6j^' + str(_steps[1]))
+        return 'read'
+
+    def wait_record(self):
+        """Waits the multimeter record of the current flip."""
+        if self.learn:
+            _steps = (self.cfg.steps_f if self.flip == 'f'
+                      else self.cfg.steps_b)
+            self.stop_times[self.flip] = self.wait_motion_end(
+                self.t0, self.record_time, distance=max(_np.abs(_steps)))
+        _volt.wait_readings(
+            timeout=self.t0 + self.record_time + 1 - _time.time())
+
+    def read_record(self):
+        """Reads the record of the current flip into the buffer.
+
+        Returns:
+            record (a row of the acquisition buffer).
+        """
+        _n = self.cfg.nmeasurements
+        _buffer = self.data[self.flip]
+        if self.fdi_mode:
+            if _buffer is None:
+                _buffer = _np.empty((_n, self.counts - 1))
+                self.data[self.flip] = _buffer
+            _record = _fdi.read_stream(
+                out=_buffer[self.index], timeout=self.cfg.duration + 2)
+            if self.flip == 'b':
+                _fdi.send('INP:COUP GND')
+            return _record
+
+        if _buffer is None:
+            _buffer = _np.empty((_n, _volt.nrdgs))
+            self.data[self.flip] = _buffer
+        return _volt.read_memory_block(
+            _buffer.shape[1], out=_buffer[self.index])
+
+    def read_flip_end(self, flip, index):
+        """Reads the final encoder positions (and the trajectory) of a flip.
+
+        Args:
+            flip (str): 'f' for forward or 'b' for backward;
+            index (int): repetition index.
+        """
+        _pos7 = getattr(self.meas, 'pos7' + flip)
+        _pos8 = getattr(self.meas, 'pos8' + flip)
+        _pos7[1, index], _pos8[1, index] = _ppmac.read_motor_pos([7, 8])
+        if self.gather:
+            _ppmac.stop_gather()
+            _traj = self.traj_frw if flip == 'f' else self.traj_bck
+            _traj.append(_ppmac.read_gather())
+
+    def state_read(self):
+        """Reads the flip record and updates the running analysis.
+
+        In pipeline mode the PPMAC readout runs in parallel with the record
+        transfer and analysis, and the damping time is counted from the
+        end of the record, so both overlap the damping wait.
+        """
+        _readout = None
+        if not self.fdi_mode:
+            self.wait_record()
+            _t_record = _time.time()
+            if self.flag_pipeline:
+                _readout = self.executor.submit(
+                    self.read_flip_end, self.flip, self.index)
+        _record = self.read_record()
+        if self.fdi_mode:
+            _t_record = _time.time()
+        if _readout is None:
+            self.read_flip_end(self.flip, self.index)
+
+        if self.flip == 'f':
+            self.stream.add_forward(_record)
+        else:
+            self.stream.add_backward(_record)
+        if _readout is not None:
+            _readout.result()
+
+        if self.flip == 'f':
+            # the backward flip waits the coil damping
+            if self.flag_pipeline:
+                self.t_ready = _t_record + self.damping_time
+            else:
+                self.t_ready = _time.time() + self.damping_time
+            self.flip = 'b'
+            return 'arm'
+
+        if self.learn:
+            # the next records are acquired with this length
+            _nrdgs = self.adapt_acquisition(
+                self.data['f'][0], self.data['b'][0],
+                [self.stop_times['f'], self.stop_times['b']],
+                window=self.stream.window)
+            for key in self.data:
+                self.data[key] = self.data[key][:, :_nrdgs]
+            self.stream.truncate(_nrdgs)
+            self.record_time = _nrdgs*self.cfg.nplc/60
+
+        self.index += 1
+        self.end_cycle()
+        self.report(self.stream)
+        if self.index < self.cfg.nmeasurements:
+            return 'backlash'
+        return 'analyse'
+
+    def state_analyse(self):
+        """Completes the analysis (already integrated during the
+        acquisition)."""
+        self.meas.data_frw = self.data['f'].transpose()
+        self.meas.data_bck = self.data['b'].transpose()
+
+        if self.flag_save:
+            save_log(self.meas.data_frw, 'frw', 'Flip Coil')
+            save_log(self.meas.data_bck, 'bck', 'Flip Coil')
+            save_log(self.meas.pos7f, 'pos7f')
+            save_log(self.meas.pos8f, 'pos8f')
+            save_log(self.meas.pos7b, 'pos7b')
+            save_log(self.meas.pos8b, 'pos8b')
+
+        self.result = self.stream.result()
+        self.subtract_ambient(self.result)
+        self.result.apply(self.meas)
+        return 'save'
+
+    def save_measurement(self):
+        """Saves current measurement and its trajectories.
+
+        Returns:
+            measurement id.
+        """
+        _idn = self.meas.db_save()
+        self.record_saved(_idn)
+        if self.traj_frw is not None and _idn is not None:
+            _data.trajectory.save_trajectories(
+                _data.trajectory.trajectory_filename(
+                    self.database_name, self.meas.collection_name, _idn),
+                self.traj_frw, self.traj_bck)
+        return _idn
+
+
+class StretchedWireSequencer(Sequencer):
+    """Stretched wire measurement sequence.
+
+    States: prepare, position, approach, arm, move, read (forward, then
+    backward), analyse and save.
+    """
+
+    mode = 'sw'
+
+    def __init__(self, meas, plan=None, repeats=1, parent=None):
+        """Initialize object.
+
+        Args:
+            meas (MeasurementDataSW): measurement data (with the motion
+                axis and the transversal positions);
+            plan (list): plan points (see module docstring);
+            repeats (int): number of measurements per point;
+            parent (QObject): parent object.
+        """
+        super().__init__(meas, plan=plan, repeats=repeats, parent=parent)
+        self.window = _SW_WINDOW
+        self.damping_time = 3  # [s] waited for the wire vibrations
+        # wire damping detector (None waits damping_time)
+        self.damping_settle = _VoltageNoiseSettle()
+        # counts the damping time from the end of the move, so it overlaps
+        # the end of the record and its transfer
+        self.flag_pipeline = True
+
+    def steps_per_measurement(self):
+        """Returns the number of progress steps of one measurement."""
+        return len(self.meas.transversal_pos)*self.meas.nmeasurements
+
+    def measurement_time(self):
+        """Returns the estimated time of one measurement [s]."""
+        if self.damping_settle is None:
+            _damping = self.damping_time
+        else:
+            _damping = self.damping_settle.timeout
+        return 1.5 + self.steps_per_measurement()*2*(self.meas.duration +
+                                                     _damping)
+
+    def move_axis(self, position):
+        """Moves the motion axis and waits the end of the move.
+
+        Args:
+            position (float): desired position in [mm].
+        """
+        if self.meas.motion_axis == 'X':
+            _motors, _sf = [1, 3], self.ppmac_cfg.x_sf
+            _lim = [self.ppmac_cfg.min_x, self.ppmac_cfg.max_x]
+        else:
+            _motors, _sf = [2, 4], self.ppmac_cfg.y_sf
+            _lim = [self.ppmac_cfg.min_y, self.ppmac_cfg.max_y]
+        if not _lim[0] <= position <= _lim[1]:
+            raise ValueError('{0} position out of range.'.format(
+                self.meas.motion_axis))
+
+        _target = position/_sf
+        _distance = abs(_target - self.read_positions(_motors[:1])[0])
+        _ppmac.write('#{0},{1}j/'.format(*_motors))
+        _ppmac.write('#{0},{1}j={2}'.format(_motors[0], _motors[1], _target))
+        if _ppmac.wait_motion_done(_motors, distance=_distance)['aborted']:
+            raise SequenceAborted()
+
+    def wait_damping(self, t_stop):
+        """Waits the wire vibrations damping.
+
+        Args:
+            t_stop (float): end of the move, start of the fixed damping
+                time (time.time()).
+        """
+        if self.damping_settle is None:
+            self.wait(t_stop + self.damping_time - _time.time())
+        else:
+            self.settle(self.damping_settle, 'Position {0:.3f} mm'.format(
+                self.meas.transversal_pos[self.ipos]))
+
+    def state_prepare(self):
+        """Configures the motion axis and the multimeter."""
+        if self.meas.motion_axis == 'X':
+            self.meas.speed = self.ppmac_cfg.speed_x  # [mm/s]
+            self.meas.accel = self.ppmac_cfg.accel_x  # [mm/s^2]
+            self.meas.jerk = self.ppmac_cfg.jerk_x  # [mm/s^3]
+            _ppmac.kill([2, 4, 5, 6])
+            _ppmac.write('#1,3j/')
+        else:
+            self.meas.speed = self.ppmac_cfg.speed_y  # [mm/s]
+            self.meas.accel = self.ppmac_cfg.accel_y  # [mm/s^2]
+            self.meas.jerk = self.ppmac_cfg.jerk_y  # [mm/s^3]
+            _ppmac.kill([1, 3, 5, 6])
+            _ppmac.write('#2,4j/')
+        self.wait(1)
+
+        _volt.configure_volt(nplc=self.meas.nplc, time=self.meas.duration)
+        self.wait(0.5)
+
+        # data[i, j, k]
+        # i: position index
+        # j: measurement voltage array index
+        # k: measurement number index
+        _shape = (len(self.meas.transversal_pos), _volt.nrdgs,
+                  self.meas.nmeasurements)
+        self.data = {'f': _np.empty(_shape), 'b': _np.empty(_shape)}
+        self.streams = []
+        self.ipos = 0
+        self.start_cycle()
+        return 'position'
+
+    def state_position(self):
+        """Starts the measurements of the next transversal position."""
+        _pos = self.meas.transversal_pos[self.ipos]
+        self.init_pos = _pos - self.meas.step/2  # [mm]
+        self.end_pos = _pos + self.meas.step/2  # [mm]
+        if len(self.streams) > 0:
+            # the window detected on the first position is kept
+            _window = self.streams[0].window
+        else:
+            _window = self.window
+        self.stream = _first_integral_sw_stream(self.meas, window=_window)
+        self.streams.append(self.stream)
+        self.index = 0
+        return 'approach'
+
+    def state_approach(self):
+        """Moves to the initial position and waits the vibrations damping.
+        """
+        self.move_axis(self.init_pos)
+        self.wait_damping(_time.time())
+        self.flip = 'f'
+        return 'arm'
+
+    def state_arm(self):
+        """Triggers the multimeter acquisition."""
+        _volt.start_measurement()
+        self.t0 = _time.time()
+        self.wait(1)
+        return 'move'
+
+    def state_move(self):
+        """Moves the wire across the step."""
+        if self.flip == 'f':
+            self.move_axis(self.end_pos)
+        else:
+            self.move_axis(self.init_pos)
+        self.t_stop = _time.time()
+        return 'read'
+
+    def state_read(self):
+        """Reads the record and updates the running analysis."""
+        _volt.wait_readings(
+            timeout=self.t0 + self.meas.duration + 1 - _time.time())
+        _buffer = self.data[self.flip]
+        _record = _volt.read_memory_block(
+            _buffer.shape[1], out=_buffer[self.ipos, :, self.index],
+            reverse=True)
+
+        if self.flip == 'f':
+            self.stream.add_forward(_record)
+            self.wait_damping(self.t_stop if self.flag_pipeline
+                              else _time.time())
+            self.flip = 'b'
+            return 'arm'
+
+        self.stream.add_backward(_record)
+        self.index += 1
+        self.end_cycle()
+        self.report(self.stream, 'Position {0:.3f} mm'.format(
+            self.meas.transversal_pos[self.ipos]))
+        if self.index < self.meas.nmeasurements:
+            return 'approach'
+        self.ipos += 1
+        if self.ipos < len(self.meas.transversal_pos):
+            return 'position'
+        return 'analyse'
+
+    def state_analyse(self):
+        """Completes the analysis (already integrated during the
+        acquisition)."""
+        self.meas.data_frw = self.data['f']
+        self.meas.data_bck = self.data['b']
+        self.result = _stacked_result(self.streams)
+        self.subtract_ambient(self.result)
+        self.result.apply(self.meas)
+        return 'save'
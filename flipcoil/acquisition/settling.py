@@ -0,0 +1,217 @@
+"""Settle detectors for the measurement sequence.
+
+The fixed waits after a setpoint change (stage move, current change) or a
+stretched wire move are replaced by detectors that poll a physical signal
+and return as soon as it is settled. The default timeouts are the fixed
+waits they replace, so a detector is never slower than the fixed wait.
+"""
+
+import time as _time
+import collections as _collections
+import numpy as _np
+
+from flipcoil.devices import (
+    ppmac as _ppmac,
+    ps as _ps,
+    volt as _volt,
+    )
+
+
+class SettleDetector():
+    """Polls a signal until check() returns True or the timeout expires."""
+
+    name = 'settle'
+
+    def __init__(self, timeout=10, poll=0.2, min_time=0):
+        """Initialize object.
+
+        Args:
+            timeout (float): maximum settle time [s];
+            poll (float): polling interval [s];
+            min_time (float): minimum settle time [s].
+        """
+        self.timeout = timeout
+        self.poll = poll
+        self.min_time = min_time
+
+    def reset(self):
+        """Clears the polled samples (called before each wait)."""
+        pass
+
+    def finish(self):
+        """Restores the devices changed by check (called after each wait).
+        """
+        pass
+
+    def check(self):
+        """Returns True if the signal is settled."""
+        return True
+
+    def wait(self, sleep=_time.sleep):
+        """Waits the signal to settle.
+
+        Args:
+            sleep (function): sleep function (e.g. one that checks an
+                abort request).
+
+        Returns:
+            (settled, settle time [s]) tuple, settled is False if the
+            timeout expired.
+        """
+        _t0 = _time.time()
+        self.reset()
+        try:
+            sleep(self.min_time)
+            while True:
+                if self.check():
+                    return True, _time.time() - _t0
+                _remaining = _t0 + self.timeout - _time.time()
+                if _remaining <= 0:
+                    return False, _time.time() - _t0
+                sleep(min(self.poll, _remaining))
+        finally:
+            self.finish()
+
+
+class EncoderSettle(SettleDetector):
+    """Settled when the encoder jitter is below a tolerance."""
+
+    name = 'encoder'
+
+    def __init__(self, motors=[1, 2, 3, 4], tolerance=5, samples=5,
+                 timeout=10, poll=0.2, min_time=0):
+        """Initialize object.
+
+        Args:
+            motors (list): motor numbers;
+            tolerance (float): maximum peak to peak position of each motor
+                over the last samples [counts];
+            samples (int): number of positions checked;
+            timeout (float): maximum settle time [s];
+            poll (float): polling interval [s];
+            min_time (float): minimum settle time [s].
+        """
+        super().__init__(timeout=timeout, poll=poll, min_time=min_time)
+        self.motors = list(motors)
+        self.tolerance = tolerance
+        self.samples = samples
+        self._pos = _collections.deque(maxlen=samples)
+
+    def reset(self):
+        """Clears the polled positions."""
+        self._pos.clear()
+
+    def check(self):
+        """Returns True if the encoder jitter is below the tolerance."""
+        _pos = _ppmac.read_motor_pos(self.motors)
+        if _pos is None:
+            return False
+        self._pos.append(_pos)
+        if len(self._pos) < self.samples:
+            return False
+        return bool(_np.all(_np.ptp(_np.array(self._pos), axis=0) <=
+                            self.tolerance))
+
+
+class CurrentSettle(SettleDetector):
+    """Settled when the current readback is at the setpoint and stable."""
+
+    name = 'current'
+
+    def __init__(self, tolerance=0.05, max_rate=0.01, samples=3,
+                 timeout=10, poll=0.5, min_time=0):
+        """Initialize object.
+
+        Args:
+            tolerance (float): maximum difference between the readback and
+                the setpoint [A];
+            max_rate (float): maximum rate of change of the readback [A/s];
+            samples (int): number of readbacks used in the rate fit;
+            timeout (float): maximum settle time [s];
+            poll (float): polling interval [s];
+            min_time (float): minimum settle time [s].
+        """
+        super().__init__(timeout=timeout, poll=poll, min_time=min_time)
+        self.tolerance = tolerance
+        self.max_rate = max_rate
+        self.samples = samples
+        self.setpoint = None
+        self._readback = _collections.deque(maxlen=samples)
+
+    def reset(self):
+        """Clears the polled readbacks."""
+        self._readback.clear()
+
+    def check(self):
+        """Returns True if the current is within tolerance and stable."""
+        self._readback.append((_time.time(), float(_ps.read_iload1())))
+        if abs(self._readback[-1][1] - self.setpoint) > self.tolerance:
+            return False
+        if len(self._readback) < self.samples:
+            return False
+        _t, _current = _np.array(self._readback).T
+        _rate = _np.polyfit(_t - _t[0], _current, 1)[0]
+        return abs(_rate) <= self.max_rate
+
+
+class VoltageNoiseSettle(SettleDetector):
+    """Settled when the coil (or wire) voltage RMS is at the noise floor.
+
+    Each check acquires a short multimeter burst with the configured
+    integration time, so the multimeter must be configured (see
+    Multimeter.configure_volt). The number of readings is restored after
+    the wait.
+    """
+
+    name = 'voltage'
+
+    def __init__(self, noise_floor=None, factor=1.5, decay=0.9, nrdgs=20,
+                 timeout=3, poll=0, min_time=0):
+        """Initialize object.
+
+        Args:
+            noise_floor (float): voltage noise RMS [V] (None detects the
+                floor when the RMS stops decaying);
+            factor (float): settled RMS limit, in noise floors;
+            decay (float): minimum RMS ratio between consecutive bursts at
+                the noise floor (if noise_floor is None, the RMS must also
+                not grow, so a coil still ringing up is not settled);
+            nrdgs (int): number of readings per burst;
+            timeout (float): maximum settle time [s];
+            poll (float): interval between bursts [s];
+            min_time (float): minimum settle time [s].
+        """
+        super().__init__(timeout=timeout, poll=poll, min_time=min_time)
+        self.noise_floor = noise_floor
+        self.factor = factor
+        self.decay = decay
+        self.nrdgs = nrdgs
+        self._rms = None
+        self._nrdgs = None
+
+    def reset(self):
+        """Configures the multimeter bursts."""
+        self._rms = None
+        self._nrdgs = _volt.nrdgs
+        _volt.configure_nrdgs(self.nrdgs)
+
+    def finish(self):
+        """Restores the number of readings of the measurement."""
+        if self._nrdgs is not None:
+            _volt.configure_nrdgs(self._nrdgs)
+            self._nrdgs = None
+
+    def check(self):
+        """Returns True if the voltage RMS is at the noise floor."""
+        _volt.start_measurement()
+        _volt.wait_readings(timeout=self.nrdgs*_volt.reading_time + 1)
+        _readings = _volt.read_memory_block(self.nrdgs)
+        if _readings is None:
+            return False
+        _rms = _np.std(_readings)
+        if self.noise_floor is not None:
+            return _rms <= self.factor*self.noise_floor
+        _previous, self._rms = self._rms, _rms
+        if _previous is None:
+            return False
+        return self.decay*_previous <= _rms <= _previous
@@ -0,0 +1,9 @@
+"""Sub-package for flip coil and stretched wire data analysis."""
+
+from . import integration
+from . import firstintegral
+from . import cache
+from . import ambient
+from . import streaming
+from . import motionend
+from . import window
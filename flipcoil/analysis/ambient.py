@@ -0,0 +1,121 @@
+"""Ambient field subtraction."""
+
+import weakref as _weakref
+import threading as _threading
+import numpy as _np
+
+from flipcoil.analysis.cache import (
+    invalidate_ambient as _invalidate_ambient,
+    )
+
+
+# live memos, invalidated when an ambient record is saved
+_memos = _weakref.WeakSet()
+_memos_lock = _threading.Lock()
+
+
+class AmbientField():
+    """Ambient field measurement summary."""
+
+    def __init__(self, idn, name, I_mean, I_std):
+        """Initialize object.
+
+        Args:
+            idn (int): ambient measurement id;
+            name (str): ambient measurement name;
+            I_mean (float or array): ambient field integral [T.m];
+            I_std (float or array): ambient field integral deviation [T.m].
+        """
+        self.idn = idn
+        self.name = name
+        self.I_mean = I_mean
+        self.I_std = I_std
+
+
+class AmbientMemo():
+    """Memoized ambient field measurements, keyed by Iamb_id.
+
+    Only the name and the I_mean/I_std summaries are read from the
+    database, so the raw arrays of the ambient record are never decoded.
+    Entries must be invalidated when the ambient record changes: records
+    saved by this process are invalidated by ambient_saved, other changes
+    (e.g. reprocessing the database) need an explicit invalidate call.
+    """
+
+    def __init__(self, meas):
+        """Initialize object.
+
+        Args:
+            meas (MeasurementData or MeasurementDataSW): document used to
+                read the ambient records (database already configured).
+        """
+        self.meas = meas
+        self._entries = {}
+        self._lock = _threading.Lock()
+        with _memos_lock:
+            _memos.add(self)
+
+    def get(self, idn):
+        """Returns the AmbientField of the measurement idn."""
+        idn = int(idn)
+        with self._lock:
+            if idn in self._entries:
+                return self._entries[idn]
+
+        _amb = AmbientField(
+            idn, self.meas.db_get_value('name', idn),
+            self.meas.db_get_value('I_mean', idn),
+            self.meas.db_get_value('I_std', idn))
+        with self._lock:
+            self._entries[idn] = _amb
+        return _amb
+
+    def invalidate(self, idn=None):
+        """Removes one (or all, if idn is None) memoized entries."""
+        with self._lock:
+            if idn is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(int(idn), None)
+
+
+def ambient_saved(collection_name, idn=None):
+    """Invalidates the memoized entries of a saved ambient record and the
+    cached analysis results that discount it.
+
+    Args:
+        collection_name (str): collection of the saved record;
+        idn (int): id of the saved record (None invalidates all entries of
+            the collection).
+    """
+    with _memos_lock:
+        _memo_list = list(_memos)
+    for memo in _memo_list:
+        if getattr(memo.meas, 'collection_name', None) == collection_name:
+            memo.invalidate(idn)
+    _invalidate_ambient(collection_name, idn)
+
+
+def subtract_ambient_batch(I_mean, I_std, amb_ids, memo):
+    """Discounts the ambient field from a batch of measurements.
+
+    Args:
+        I_mean (array): field integrals [T.m], one measurement per row;
+        I_std (array): field integral deviations [T.m], one measurement
+            per row;
+        amb_ids (array): ambient measurement id of each row (rows with
+            id 0 are not changed);
+        memo (AmbientMemo): ambient field measurements.
+
+    Returns:
+        I_mean, I_std arrays with the ambient field discounted.
+    """
+    I_mean = _np.array(I_mean, dtype=float)
+    I_std = _np.array(I_std, dtype=float)
+    amb_ids = _np.asarray(amb_ids, dtype=int)
+    for idn in _np.unique(amb_ids[amb_ids > 0]):
+        _amb = memo.get(idn)
+        _sel = amb_ids == idn
+        I_mean[_sel] = I_mean[_sel] - _amb.I_mean
+        I_std[_sel] = (I_std[_sel]**2 + _np.asarray(_amb.I_std)**2)**0.5
+    return I_mean, I_std
@@ -0,0 +1,146 @@
+"""Memory bounded cache of analysis results."""
+
+import weakref as _weakref
+import hashlib as _hashlib
+import threading as _threading
+import collections as _collections
+import numpy as _np
+
+
+# live caches, invalidated when an ambient record is saved
+_caches = _weakref.WeakSet()
+_caches_lock = _threading.Lock()
+
+
+def params_digest(params):
+    """Returns a hash string of a dict of analysis parameters."""
+    _text = repr(sorted((str(k), repr(v)) for k, v in params.items()))
+    return _hashlib.sha1(_text.encode()).hexdigest()
+
+
+def _nbytes(value, seen):
+    """Estimates the memory used by the arrays referenced by value."""
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, _np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(val, seen) for val in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(val, seen) for val in value)
+    if hasattr(value, '__dict__'):
+        return _nbytes(vars(value), seen)
+    return 0
+
+
+class AnalysisCache():
+    """LRU cache of derived analysis products.
+
+    Entries are keyed by collection name, measurement id and a digest of
+    the analysis parameters, and the least recently used entries are
+    discarded when the arrays held by the cache exceed max_bytes. Entries
+    with the ambient field discounted keep the ambient measurement id, so
+    they are discarded when that ambient record is saved (see
+    invalidate_ambient).
+    """
+
+    def __init__(self, max_bytes=256*2**20):
+        """Initialize object.
+
+        Args:
+            max_bytes (int): memory limit for the cached arrays [bytes].
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = _collections.OrderedDict()
+        self._lock = _threading.Lock()
+        with _caches_lock:
+            _caches.add(self)
+
+    @staticmethod
+    def make_key(collection_name, idn, params=None):
+        """Returns the cache key of a measurement.
+
+        Args:
+            collection_name (str): database collection name;
+            idn (int): measurement id;
+            params (dict): analysis parameters.
+        """
+        if params is None:
+            params = {}
+        return (collection_name, int(idn), params_digest(params))
+
+    def get(self, key):
+        """Returns the cached value or None if key is not in the cache."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key, value, amb_idn=0):
+        """Stores a value, evicting the least recently used entries.
+
+        Args:
+            key (tuple): cache key (see make_key);
+            value (object): value to store;
+            amb_idn (int): id of the ambient measurement discounted from
+                the value (0 if none).
+
+        Returns:
+            True if the value was stored;
+            False if it alone exceeds the memory limit.
+        """
+        _size = _nbytes(value, set())
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            if _size > self.max_bytes:
+                return False
+            while self._entries and self.nbytes + _size > self.max_bytes:
+                self.nbytes -= self._entries.popitem(last=False)[1][1]
+            self._entries[key] = (value, _size, int(amb_idn or 0))
+            self.nbytes += _size
+            return True
+
+    def invalidate(self, collection_name=None, idn=None):
+        """Removes the entries of a measurement, a collection or all."""
+        with self._lock:
+            for key in list(self._entries):
+                if all([collection_name is None or key[0] == collection_name,
+                        idn is None or key[1] == idn]):
+                    self.nbytes -= self._entries.pop(key)[1]
+
+    def invalidate_ambient(self, collection_name, amb_idn=None):
+        """Removes the entries that discount an ambient measurement.
+
+        Args:
+            collection_name (str): collection of the ambient measurement;
+            amb_idn (int): ambient measurement id (None removes the entries
+                that discount any ambient measurement of the collection).
+        """
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if all([key[0] == collection_name, entry[2] > 0,
+                        amb_idn is None or entry[2] == amb_idn]):
+                    self.nbytes -= self._entries.pop(key)[1]
+
+    def stats(self):
+        """Returns a dict with the cache counters."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'entries': len(self._entries), 'nbytes': self.nbytes}
+
+
+def invalidate_ambient(collection_name, amb_idn=None):
+    """Removes the entries of all caches that discount an ambient
+    measurement (see AnalysisCache.invalidate_ambient)."""
+    with _caches_lock:
+        _cache_list = list(_caches)
+    for cache in _cache_list:
+        cache.invalidate_ambient(collection_name, amb_idn)
@@ -0,0 +1,196 @@
+"""First field integral analysis.
+
+Pure numpy functions computing the flip coil and stretched wire results
+from the database documents (MeasurementConfig, MeasurementData and
+MeasurementDataSW). Nothing here depends on Qt, so the analysis can run in
+worker threads or processes.
+"""
+
+import numpy as _np
+
+from flipcoil.analysis.integration import (
+    integrate_flux as _integrate_flux,
+    integrate_flux_batch as _integrate_flux_batch,
+    window_statistics as _window_statistics,
+    )
+from flipcoil.analysis.window import detect_window as _detect_window
+
+
+FC_BASELINE = 40  # [samples] used to estimate the voltage offset
+FC_WINDOW = (40, 61)  # [samples] flip coil step start and end
+FC_LAG = 2
+SW_WINDOW = (27, 61)  # [samples] stretched wire step start and end
+SW_LAG = 1
+
+
+class FirstIntegralResult():
+    """First field integral analysis results."""
+
+    fields = ['flx_f', 'flx_b', 'I_f', 'I_b', 'I', 'If', 'If_std',
+              'Ib', 'Ib_std', 'I_mean', 'I_std', 'window']
+
+    def __init__(self, **kwargs):
+        """Initialize object.
+
+        Args:
+            flx_f, flx_b (array): forward and backward flux [V.s];
+            I_f, I_b, I (array): forward, backward and mean field
+                integral curves [T.m];
+            If, Ib (array): field integral step of each repetition [T.m];
+            If_std, Ib_std, I_mean, I_std: field integral statistics [T.m];
+            window (tuple): (start, end) sample indexes of the step.
+        """
+        for field in self.fields:
+            setattr(self, field, kwargs.get(field))
+
+        # results before the ambient field subtraction
+        self.I_mean_meas = self.I_mean
+        self.I_std_meas = self.I_std
+
+        # ambient field measurement
+        self.amb_idn = 0
+        self.amb_name = ''
+        self.amb_I_mean = None
+        self.amb_I_std = None
+
+    def apply(self, meas):
+        """Copies the results into a measurement data instance.
+
+        Args:
+            meas (MeasurementData or MeasurementDataSW): measurement data.
+
+        Returns:
+            meas.
+        """
+        for field in self.fields:
+            setattr(meas, field, getattr(self, field))
+        return meas
+
+
+def _field_integral(flx_f, flx_b, factor, window, axis):
+    """Scales flux into field integral and calculates statistics."""
+    I_f = flx_f * factor
+    I_b = flx_b * factor
+    I = (I_f - I_b)/2
+    If, If_std, Ib, Ib_std, I_mean, I_std = _window_statistics(
+        I_f, I_b, window, axis=axis)
+    return FirstIntegralResult(
+        flx_f=flx_f, flx_b=flx_b, I_f=I_f, I_b=I_b, I=I,
+        If=If, If_std=If_std, Ib=Ib, Ib_std=Ib_std,
+        I_mean=I_mean, I_std=I_std, window=tuple(window))
+
+
+def resolve_window(window, data_frw, data_bck, default, lag, fdi_mode=False,
+                   axis=0):
+    """Returns the flux step window.
+
+    Args:
+        window (tuple or str): (start, end) sample indexes of the flux step,
+            or 'auto' to detect them from the raw data;
+        data_frw, data_bck (array): forward and backward raw data;
+        default (tuple): window used if the step is not detected;
+        lag (int): index shift of the integrated flux;
+        fdi_mode (bool): True if the raw data is flux instead of voltage;
+        axis (int): sample axis.
+
+    Returns:
+        (start, end) sample indexes.
+    """
+    if not isinstance(window, str):
+        return tuple(window)
+    if window != 'auto':
+        raise ValueError('Invalid window: {0}'.format(window))
+
+    _data = [_np.asarray(data_frw, dtype=float),
+             _np.asarray(data_bck, dtype=float)]
+    if fdi_mode:
+        # the flux step is detected on the flux increments
+        _data = [_np.diff(data, axis=axis) for data in _data]
+        lag = 1
+    _window = _detect_window(_np.stack(_data, axis=-1), lag=lag, axis=axis)
+    if _window is None:
+        return tuple(default)
+    return _window
+
+
+def first_integral(cfg, meas, fdi_mode=False, window=FC_WINDOW,
+                   baseline=FC_BASELINE):
+    """Calculates the first field integral from flip coil raw data.
+
+    Args:
+        cfg (MeasurementConfig): measurement configuration;
+        meas (MeasurementData): measurement data;
+        fdi_mode (bool): True if the data was acquired by the integrator
+            (flux) instead of the multimeter (voltage);
+        window (tuple or str): (start, end) sample indexes of the flux step,
+            or 'auto' to detect them;
+        baseline (int): number of initial samples used as voltage offset
+            (limited to the window start).
+
+    Returns:
+        FirstIntegralResult instance.
+    """
+    _dt = cfg.nplc/60
+    window = resolve_window(window, meas.data_frw, meas.data_bck, FC_WINDOW,
+                            FC_LAG, fdi_mode=fdi_mode)
+    baseline = max(min(baseline, window[0]), 1)
+    if not fdi_mode:
+        flx_f = _integrate_flux(meas.data_frw, _dt, baseline=baseline,
+                                lag=FC_LAG)
+        flx_b = _integrate_flux(meas.data_bck, _dt, baseline=baseline,
+                                lag=FC_LAG)
+    else:
+        flx_f = _np.array(meas.data_frw, dtype=float)
+        flx_b = _np.array(meas.data_bck, dtype=float)
+
+    # I = flux/(2*N*width)
+    _factor = 1/(2*cfg.turns*cfg.width)
+    return _field_integral(flx_f, flx_b, _factor, window, axis=0)
+
+
+def first_integral_sw(meas, window=SW_WINDOW, chunk_size=None):
+    """Calculates the first field integral from stretched wire raw data.
+
+    Args:
+        meas (MeasurementDataSW): measurement data, with data_frw and
+            data_bck shaped [position, sample, repetition];
+        window (tuple or str): (start, end) sample indexes of the flux step,
+            or 'auto' to detect them (one window for all positions);
+        chunk_size (int): number of positions integrated per call.
+
+    Returns:
+        FirstIntegralResult instance with statistics per position.
+    """
+    _dt = meas.nplc/60
+    window = resolve_window(window, meas.data_frw, meas.data_bck, SW_WINDOW,
+                            SW_LAG, axis=1)
+    _step = meas.step*1e-3  # [m]
+    flx_f = _integrate_flux_batch(meas.data_frw, _dt, lag=SW_LAG, axis=1,
+                                  chunk_size=chunk_size)
+    flx_b = _integrate_flux_batch(meas.data_bck, _dt, lag=SW_LAG, axis=1,
+                                  chunk_size=chunk_size)
+
+    # I = flux/(N*step)
+    _factor = 1/(meas.turns*_step)
+    return _field_integral(flx_f, flx_b, _factor, window, axis=1)
+
+
+def subtract_ambient(result, amb_meas):
+    """Discounts the ambient field measurement from the results.
+
+    Args:
+        result (FirstIntegralResult): analysis results, changed in place;
+        amb_meas (MeasurementData or MeasurementDataSW): ambient field
+            measurement (only name, idn, I_mean and I_std are used).
+
+    Returns:
+        result.
+    """
+    result.amb_idn = amb_meas.idn
+    result.amb_name = amb_meas.name
+    result.amb_I_mean = amb_meas.I_mean
+    result.amb_I_std = amb_meas.I_std
+
+    result.I_mean = result.I_mean_meas - amb_meas.I_mean
+    result.I_std = (result.I_std_meas**2 + amb_meas.I_std**2)**0.5
+    return result
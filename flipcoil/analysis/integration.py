@@ -0,0 +1,124 @@
+"""Flux integration engine.
+
+The coil voltage records are integrated along the sample axis for all
+repetitions at once. The results match the prefix integrals
+(np.trapz(v[:idx])) used by the legacy analysis code, including its index
+shift, apart from floating point rounding.
+"""
+
+import numpy as _np
+
+
+def cumulative_trapezoid(y, dx=1.0, axis=0):
+    """Cumulative trapezoidal integral of y along axis.
+
+    Args:
+        y (array): samples to integrate;
+        dx (float): sample spacing;
+        axis (int): integration axis.
+
+    Returns:
+        array with the same shape of y, where the element k holds the
+        integral from sample 0 to sample k (the first element is 0).
+    """
+    _y = _np.moveaxis(_np.asarray(y, dtype=float), axis, 0)
+    _out = _np.zeros(_y.shape)
+    if _y.shape[0] > 1:
+        _np.cumsum((_y[1:] + _y[:-1])*(dx/2), axis=0, out=_out[1:])
+    return _np.moveaxis(_out, 0, axis)
+
+
+def integrate_flux(voltage, dt, baseline=0, lag=1, axis=0):
+    """Integrates coil voltage records into flux.
+
+    Args:
+        voltage (array): voltage records [V], one repetition per column
+            (or any shape with the samples along axis);
+        dt (float): sample period [s];
+        baseline (int): number of initial samples averaged and discounted
+            as voltage offset (0 disables the offset correction);
+        lag (int): index shift of the integral. Sample j of the result holds
+            the integral up to sample j - lag. The flip coil analysis uses 2
+            and the stretched wire analysis uses 1.
+        axis (int): sample axis.
+
+    Returns:
+        flux array [V.s] with the same shape of voltage.
+    """
+    _v = _np.moveaxis(_np.asarray(voltage, dtype=float), axis, 0)
+    if baseline > 0:
+        _v = _v - _v[:baseline].mean(axis=0)
+
+    _n = _v.shape[0]
+    _flx = _np.zeros(_v.shape)
+    if _n > lag + 1:
+        _np.cumsum((_v[1:_n - lag] + _v[:_n - lag - 1])*(dt/2), axis=0,
+                   out=_flx[lag + 1:])
+    return _np.moveaxis(_flx, 0, axis)
+
+
+def integrate_flux_batch(voltage, dt, baseline=0, lag=1, axis=1,
+                         chunk_size=None):
+    """Integrates a stack of voltage records into flux.
+
+    The records are split along the first axis (e.g. the transversal
+    positions of a stretched wire scan) and integrated chunk_size records
+    at a time, so the temporary arrays stay bounded for very large scans.
+
+    Args:
+        voltage (array): voltage records [V], e.g. data[position, sample,
+            repetition];
+        dt (float): sample period [s];
+        baseline (int): number of initial samples discounted as offset;
+        lag (int): index shift of the integral (see integrate_flux);
+        axis (int): sample axis (must not be the first axis);
+        chunk_size (int): number of records integrated per call (None
+            integrates the whole stack at once).
+
+    Returns:
+        flux array [V.s] with the same shape of voltage.
+    """
+    _v = _np.asarray(voltage, dtype=float)
+    _axis = axis % _v.ndim
+    if _axis == 0:
+        raise ValueError('The sample axis must not be the first axis.')
+
+    if chunk_size is None or chunk_size >= _v.shape[0]:
+        return integrate_flux(_v, dt, baseline=baseline, lag=lag, axis=_axis)
+
+    _flx = _np.empty(_v.shape)
+    for i in range(0, _v.shape[0], chunk_size):
+        _flx[i:i + chunk_size] = integrate_flux(
+            _v[i:i + chunk_size], dt, baseline=baseline, lag=lag, axis=_axis)
+    return _flx
+
+
+def window_statistics(I_f, I_b, window, axis=0):
+    """Calculates the field integral step of each repetition.
+
+    The step is the difference between the integrated field at the window
+    end and start indexes. Statistics are taken over the repetitions, which
+    must be stored in the last axis.
+
+    Args:
+        I_f (array): forward field integral curves [T.m];
+        I_b (array): backward field integral curves [T.m];
+        window (tuple): (start, end) sample indexes;
+        axis (int): sample axis.
+
+    Returns:
+        If, If_std, Ib, Ib_std, I_mean, I_std. For flip coil data
+        (samples x repetitions) If and Ib are 1-d and the statistics are
+        scalars; for stretched wire data (positions x samples x
+        repetitions) they are computed per position.
+    """
+    _start, _end = window
+    If = (_np.take(I_f, _end, axis=axis) -
+          _np.take(I_f, _start, axis=axis))
+    Ib = (_np.take(I_b, _end, axis=axis) -
+          _np.take(I_b, _start, axis=axis))
+    If_std = If.std(axis=-1)
+    Ib_std = Ib.std(axis=-1)
+    I_mean = (If.mean(axis=-1) - Ib.mean(axis=-1))/2
+    I_std = 1/2*(If_std**2 + Ib_std**2)**0.5
+    return If, If_std, Ib, Ib_std, I_mean, I_std
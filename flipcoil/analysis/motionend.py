@@ -0,0 +1,82 @@
+"""Detection of the end of the flux step.
+
+The coil voltage returns to the baseline noise band once the coil stops
+moving, so the number of samples the acquisition needs can be learned from
+the first records (or from the encoder stop time) and the remaining
+acquisitions can be shortened.
+"""
+
+import numpy as _np
+
+from flipcoil.analysis.firstintegral import (
+    FC_BASELINE as _FC_BASELINE,
+    FC_WINDOW as _FC_WINDOW,
+    )
+
+
+def step_end_index(voltage, baseline=_FC_BASELINE, threshold=6, axis=0):
+    """Finds the sample where the voltage settles back to the baseline.
+
+    The baseline offset and noise are estimated from the initial samples of
+    each record (median and median absolute deviation), and all records are
+    checked at once.
+
+    Args:
+        voltage (array): voltage records [V], one repetition per column (or
+            any shape with the samples along axis);
+        baseline (int): number of initial samples before the flux step;
+        threshold (float): noise band half width, in noise standard
+            deviations;
+        axis (int): sample axis.
+
+    Returns:
+        index after the last sample out of the noise band (the largest over
+        all records), or None if no sample is out of the band.
+    """
+    _v = _np.moveaxis(_np.asarray(voltage, dtype=float), axis, 0)
+    _v = _v.reshape(_v.shape[0], -1)
+    _offset = _np.median(_v[:baseline], axis=0)
+    _noise = 1.4826*_np.median(_np.abs(_v[:baseline] - _offset), axis=0)
+    _noise = _np.maximum(_noise, _np.finfo(float).tiny)
+
+    _out = _np.abs(_v - _offset) > threshold*_noise
+    _found = _out.any(axis=0)
+    if not _found.any():
+        return None
+    _last = _v.shape[0] - _np.argmax(_out[::-1], axis=0)
+    return int(_last[_found].max())
+
+
+def record_samples(dt, end_index=None, stop_time=None, margin=0.5,
+                   min_samples=None, max_samples=None):
+    """Calculates the number of samples needed to record the flux step.
+
+    Args:
+        dt (float): sample period [s];
+        end_index (int): sample where the voltage settles (see
+            step_end_index);
+        stop_time (float): time between the acquisition trigger and the end
+            of the motion, read from the encoder [s];
+        margin (float): time recorded after the end of the step [s];
+        min_samples (int): minimum number of samples (the analysis window
+            must fit in the record, None uses the flip coil window);
+        max_samples (int): maximum number of samples (e.g. the configured
+            duration).
+
+    Returns:
+        number of samples, or max_samples if the end of the step is unknown.
+    """
+    _ends = []
+    if end_index is not None:
+        _ends.append(end_index)
+    if stop_time is not None:
+        _ends.append(int(_np.ceil(stop_time/dt)))
+    if len(_ends) == 0:
+        return max_samples
+
+    if min_samples is None:
+        min_samples = _FC_WINDOW[1] + 1
+    _nsamples = max(max(_ends) + int(_np.ceil(margin/dt)), min_samples)
+    if max_samples is not None:
+        _nsamples = min(_nsamples, max_samples)
+    return _nsamples
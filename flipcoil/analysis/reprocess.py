@@ -0,0 +1,390 @@
+"""Batch reprocessing of the measurement database.
+
+Recomputes the I_mean/I_std summaries of the measurements and
+measurements_sw collections, e.g. after a coil width or number of turns
+correction. Records are read by a pool of worker processes, and the
+updated summaries are written back in batched transactions, together with
+the width/turns overrides (the measurement configurations of the flip coil
+records and the turns of the stretched wire records), so the stored
+parameters match the summaries. Progress is
+kept in a checkpoint file (per collection and width/turns overrides), so an
+interrupted run resumes where it stopped and retries the failed records.
+
+Ambient field measurements (Iamb_id = 0) are reprocessed first, so the
+other measurements discount the updated ambient values.
+
+Usage:
+    python -m flipcoil.analysis.reprocess flip_coil_measurements.db
+        --collection measurements --width 12.5 --turns 10
+"""
+
+import os as _os
+import sys as _sys
+import json as _json
+import time as _time
+import sqlite3 as _sqlite3
+import argparse as _argparse
+import traceback as _traceback
+import multiprocessing as _multiprocessing
+import numpy as _np
+
+import flipcoil.data as _data
+from flipcoil.analysis.ambient import (
+    AmbientMemo as _AmbientMemo,
+    subtract_ambient_batch as _subtract_ambient_batch,
+    )
+from flipcoil.analysis.firstintegral import (
+    first_integral as _first_integral,
+    first_integral_sw as _first_integral_sw,
+    )
+
+
+COLLECTIONS = {
+    'measurements': _data.measurement.MeasurementData,
+    'measurements_sw': _data.measurement.MeasurementDataSW,
+    }
+
+# worker process state
+_worker = {}
+
+
+def _init_worker(database_name, mongo, server, collection, width, turns):
+    """Creates the database documents used by a worker process."""
+    _meas = COLLECTIONS[collection]()
+    _meas.db_update_database(database_name, mongo=mongo, server=server)
+    _cfg = _data.configuration.MeasurementConfig()
+    _cfg.db_update_database(database_name, mongo=mongo, server=server)
+    _worker.update({'meas': _meas, 'cfg': _cfg, 'collection': collection,
+                    'width': width, 'turns': turns})
+
+
+def _process_record(idn):
+    """Reads a measurement and recomputes its summary.
+
+    Returns:
+        (idn, Iamb_id, I_mean, I_std, cfg_id) without the ambient field
+        subtraction (cfg_id is None for stretched wire records);
+        (idn, None, None, None, None) if the record could not be processed.
+    """
+    try:
+        _meas = _worker['meas']
+        _meas.db_read(idn)
+        if _worker['turns'] is not None:
+            _meas.turns = _worker['turns']
+
+        if _worker['collection'] == 'measurements_sw':
+            _result = _first_integral_sw(_meas)
+            _cfg_id = None
+        else:
+            _cfg = _worker['cfg']
+            _cfg.db_read(_meas.cfg_id)
+            if _worker['width'] is not None:
+                _cfg.width = _worker['width']
+            if _worker['turns'] is not None:
+                _cfg.turns = _worker['turns']
+            _result = _first_integral(_cfg, _meas)
+            _cfg_id = _meas.cfg_id
+        return idn, _meas.Iamb_id, _result.I_mean, _result.I_std, _cfg_id
+    except Exception:
+        _traceback.print_exc(file=_sys.stdout)
+        return idn, None, None, None, None
+
+
+def override_fields(collection, width=None, turns=None):
+    """Returns the stored parameters changed by the overrides.
+
+    Args:
+        collection (str): 'measurements' or 'measurements_sw';
+        width (float): coil width override [m] (flip coil only);
+        turns (float): number of coil turns override.
+
+    Returns:
+        (fields, cfg_fields) dicts with the values set on the measurement
+        records and on their measurement configurations.
+    """
+    _overrides = {key: float(value) for key, value in
+                  [('width', width), ('turns', turns)] if value is not None}
+    if collection == 'measurements_sw':
+        _overrides.pop('width', None)
+        return _overrides, {}
+    return {}, _overrides
+
+
+def _encode(value, mongo):
+    """Converts a summary value to its database representation."""
+    if isinstance(value, _np.ndarray):
+        if mongo:
+            return value.tolist()
+        return _json.dumps(value.tolist())
+    return float(value)
+
+
+def write_batch(database_name, collection, rows, mongo=False, server=None,
+                fields=None, cfg_ids=(), cfg_fields=None):
+    """Writes updated summaries in a single transaction.
+
+    Args:
+        database_name (str): database file path (sqlite) or name (mongo);
+        collection (str): collection (table) name;
+        rows (list): list of (idn, I_mean, I_std) tuples;
+        mongo (bool): flag indicating mongoDB (True) or sqlite (False);
+        server (str): MongoDB server;
+        fields (dict): values set on each record with its summary;
+        cfg_ids (list): ids of the measurement configurations of the rows;
+        cfg_fields (dict): values set on the measurement configurations.
+    """
+    if len(rows) == 0:
+        return
+    fields = dict(fields or {})
+    cfg_fields = dict(cfg_fields or {})
+    _cfg_collection = _data.configuration.MeasurementConfig.collection_name
+    _cfg_ids = [int(idn) for idn in cfg_ids] if cfg_fields else []
+
+    if mongo:
+        import pymongo as _pymongo
+        _client = _pymongo.MongoClient(server)
+        try:
+            _requests = [
+                _pymongo.UpdateOne(
+                    {'id': int(idn)},
+                    {'$set': dict(fields, I_mean=_encode(I_mean, True),
+                                  I_std=_encode(I_std, True))})
+                for idn, I_mean, I_std in rows]
+            _client[database_name][collection].bulk_write(_requests)
+            if len(_cfg_ids) > 0:
+                _client[database_name][_cfg_collection].update_many(
+                    {'id': {'$in': _cfg_ids}}, {'$set': cfg_fields})
+        finally:
+            _client.close()
+    else:
+        _con = _sqlite3.connect(database_name)
+        try:
+            _set = ''.join(', {0} = ?'.format(key) for key in fields)
+            with _con:
+                _con.executemany(
+                    'UPDATE {0} SET I_mean = ?, I_std = ?{1} WHERE id = ?'
+                    .format(collection, _set),
+                    [(_encode(I_mean, False), _encode(I_std, False)) +
+                     tuple(fields.values()) + (int(idn),)
+                     for idn, I_mean, I_std in rows])
+                if len(_cfg_ids) > 0:
+                    _con.executemany(
+                        'UPDATE {0} SET {1} WHERE id = ?'.format(
+                            _cfg_collection,
+                            ', '.join('{0} = ?'.format(key)
+                                      for key in cfg_fields)),
+                        [tuple(cfg_fields.values()) + (idn,)
+                         for idn in _cfg_ids])
+        finally:
+            _con.close()
+
+
+def _subtract_ambient_rows(rows, memo):
+    """Discounts the ambient field from (idn, Iamb_id, I_mean, I_std) rows.
+
+    Returns:
+        list of (idn, I_mean, I_std) tuples.
+    """
+    # stretched wire summaries are only stacked if they have the same size
+    _groups = {}
+    for _row in rows:
+        _groups.setdefault(_np.shape(_row[2]), []).append(_row)
+
+    _rows = []
+    for _group in _groups.values():
+        _idns, _amb_ids, _I_mean, _I_std = zip(*_group)
+        _I_mean, _I_std = _subtract_ambient_batch(
+            _I_mean, _I_std, _amb_ids, memo)
+        _rows.extend(zip(_idns, _I_mean, _I_std))
+    return _rows
+
+
+def checkpoint_key(collection, width=None, turns=None):
+    """Returns the checkpoint key of a collection and its overrides."""
+    return '{0}|width={1}|turns={2}'.format(collection, width, turns)
+
+
+class Checkpoint():
+    """Reprocessing progress stored in a json file.
+
+    Each stage stores the last committed id and the ids of the records
+    that failed (retried by the next run).
+    """
+
+    def __init__(self, filename, restart=False):
+        """Initialize object.
+
+        Args:
+            filename (str): checkpoint file path;
+            restart (bool): if True, ignores previous progress.
+        """
+        self.filename = filename
+        self.state = {}
+        if not restart and _os.path.isfile(filename):
+            with open(filename, 'r') as _f:
+                self.state = _json.load(_f)
+
+    def _stage(self, key, stage):
+        """Returns the stored progress of a reprocessing stage."""
+        return self.state.get(key, {}).get(stage, {})
+
+    def last_id(self, key, stage):
+        """Returns the last committed id of a reprocessing stage."""
+        return self._stage(key, stage).get('last', 0)
+
+    def failed_ids(self, key, stage):
+        """Returns the ids of the failed records of a reprocessing stage."""
+        return self._stage(key, stage).get('failed', [])
+
+    def update(self, key, stage, idn, failed=()):
+        """Stores the progress of a reprocessing stage.
+
+        Args:
+            key (str): checkpoint key (see checkpoint_key);
+            stage (str): reprocessing stage;
+            idn (int): last committed id;
+            failed (list): ids of the failed records.
+        """
+        self.state.setdefault(key, {})[stage] = {
+            'last': int(idn), 'failed': sorted(int(i) for i in failed)}
+        _tmp = self.filename + '.tmp'
+        with open(_tmp, 'w') as _f:
+            _json.dump(self.state, _f)
+        _os.replace(_tmp, self.filename)
+
+
+def reprocess(database_name, collection='measurements', mongo=False,
+              server=None, width=None, turns=None, processes=None,
+              batch_size=100, checkpoint=None, restart=False):
+    """Recomputes I_mean/I_std for all records of a collection.
+
+    Args:
+        database_name (str): database file path (sqlite) or name (mongo);
+        collection (str): 'measurements' or 'measurements_sw';
+        mongo (bool): flag indicating mongoDB (True) or sqlite (False);
+        server (str): MongoDB server;
+        width (float): coil width override [m] (flip coil only);
+        turns (float): number of coil turns override;
+        processes (int): number of worker processes (None uses all cpus);
+        batch_size (int): number of records written per transaction;
+        checkpoint (str): checkpoint file path (None uses the database
+            name with a .reprocess.json suffix);
+        restart (bool): if True, ignores the checkpoint progress.
+
+    Returns:
+        dict with the number of updated and failed records, the elapsed
+        time [s] and the throughput [records/s].
+    """
+    if collection not in COLLECTIONS:
+        raise ValueError('Invalid collection: {0}'.format(collection))
+    if checkpoint is None:
+        checkpoint = str(database_name) + '.reprocess.json'
+    _checkpoint = Checkpoint(checkpoint, restart=restart)
+    _key = checkpoint_key(collection, width, turns)
+    _fields, _cfg_fields = override_fields(collection, width, turns)
+
+    _meas = COLLECTIONS[collection]()
+    _meas.db_update_database(database_name, mongo=mongo, server=server)
+    _all_ids = sorted(int(idn) for idn in _meas.db_get_values('id'))
+    _amb_ids = sorted(
+        int(item['id']) for item in _meas.db_search_field('Iamb_id', 0))
+    _amb_set = set(_amb_ids)
+    _stages = [
+        ('ambient', _amb_ids),
+        ('field', [idn for idn in _all_ids if idn not in _amb_set]),
+        ]
+
+    _memo = _AmbientMemo(_meas)
+    _nupdated = 0
+    _nfailed = 0
+    _t0 = _time.time()
+    _nprocesses = processes if processes else _os.cpu_count()
+    _chunksize = max(1, batch_size//(4*_nprocesses))
+    _initargs = (database_name, mongo, server, collection, width, turns)
+    with _multiprocessing.Pool(_nprocesses, initializer=_init_worker,
+                               initargs=_initargs) as _pool:
+        for _stage, _ids in _stages:
+            _last = _checkpoint.last_id(_key, _stage)
+            _retry = set(_checkpoint.failed_ids(_key, _stage))
+            _ids = [idn for idn in _ids if idn > _last or idn in _retry]
+            if len(_ids) == 0:
+                continue
+
+            # ambient values are read after the ambient stage is committed
+            _memo.invalidate()
+            _batch = []
+            _cfg_ids = set()
+            _failed = set()
+            _tb = _time.time()
+            for _n, (idn, Iamb_id, I_mean, I_std, cfg_id) in enumerate(
+                    _pool.imap(_process_record, _ids, _chunksize)):
+                if Iamb_id is None:
+                    _nfailed += 1
+                    _failed.add(idn)
+                else:
+                    _batch.append((idn, Iamb_id, I_mean, I_std))
+                    if cfg_id is not None:
+                        _cfg_ids.add(cfg_id)
+
+                if len(_batch) >= batch_size or _n == len(_ids) - 1:
+                    write_batch(database_name, collection,
+                                _subtract_ambient_rows(_batch, _memo),
+                                mongo=mongo, server=server, fields=_fields,
+                                cfg_ids=sorted(_cfg_ids),
+                                cfg_fields=_cfg_fields)
+                    # failed records (and retries not reached yet) are
+                    # kept for the next run
+                    _checkpoint.update(
+                        _key, _stage, max(_last, idn),
+                        _failed | set(i for i in _retry if i > idn))
+                    _nupdated += len(_batch)
+                    _rate = (_n + 1)/max(_time.time() - _tb, 1e-9)
+                    print('{0} {1}: {2}/{3} records ({4:.1f} records/s)'.format(
+                        collection, _stage, _n + 1, len(_ids), _rate))
+                    _batch = []
+                    _cfg_ids = set()
+
+    _elapsed = _time.time() - _t0
+    _summary = {
+        'updated': _nupdated,
+        'failed': _nfailed,
+        'elapsed': _elapsed,
+        'throughput': (_nupdated + _nfailed)/max(_elapsed, 1e-9),
+        }
+    print('{0}: {1} records updated, {2} failed in {3:.1f} s '
+          '({4:.1f} records/s)'.format(collection, _nupdated, _nfailed,
+                                       _elapsed, _summary['throughput']))
+    return _summary
+
+
+def main(argv=None):
+    """Command line entry point."""
+    _parser = _argparse.ArgumentParser(
+        description='Recompute I_mean/I_std of flip coil measurements.')
+    _parser.add_argument('database_name',
+                         help='database file path (sqlite) or name (mongo)')
+    _parser.add_argument('--collection', default='measurements',
+                         choices=sorted(COLLECTIONS))
+    _parser.add_argument('--mongo', action='store_true')
+    _parser.add_argument('--server', default='localhost')
+    _parser.add_argument('--width', type=float, default=None,
+                         help='coil width [mm] (flip coil only)')
+    _parser.add_argument('--turns', type=float, default=None,
+                         help='number of coil turns')
+    _parser.add_argument('--processes', type=int, default=None)
+    _parser.add_argument('--batch-size', type=int, default=100)
+    _parser.add_argument('--checkpoint', default=None)
+    _parser.add_argument('--restart', action='store_true',
+                         help='ignore the checkpoint progress')
+    _args = _parser.parse_args(argv)
+
+    _width = _args.width*10**-3 if _args.width is not None else None
+    reprocess(_args.database_name, collection=_args.collection,
+              mongo=_args.mongo, server=_args.server, width=_width,
+              turns=_args.turns, processes=_args.processes,
+              batch_size=_args.batch_size, checkpoint=_args.checkpoint,
+              restart=_args.restart)
+
+
+if __name__ == '__main__':
+    main()
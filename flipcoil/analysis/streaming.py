@@ -0,0 +1,248 @@
+"""Streaming first field integral analysis.
+
+Each repetition is integrated as soon as its record is read from the
+instrument, and the field integral statistics are updated online, so the
+measurement routines can show the running result and abort a diverging
+run. The final result is the same as the one computed by first_integral
+and first_integral_sw from the complete data.
+"""
+
+import numpy as _np
+
+from flipcoil.analysis.integration import integrate_flux as _integrate_flux
+from flipcoil.analysis.firstintegral import (
+    FC_BASELINE as _FC_BASELINE,
+    FC_WINDOW as _FC_WINDOW,
+    FC_LAG as _FC_LAG,
+    SW_WINDOW as _SW_WINDOW,
+    SW_LAG as _SW_LAG,
+    _field_integral,
+    resolve_window as _resolve_window,
+    )
+
+
+class RunningStatistics():
+    """Running mean and standard deviation (Welford's algorithm).
+
+    The standard deviation matches numpy's std (ddof=0) of the values added.
+    """
+
+    def __init__(self):
+        """Initialize object."""
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        """Adds a value to the statistics."""
+        self.count += 1
+        _delta = value - self.mean
+        self.mean = self.mean + _delta/self.count
+        self._m2 = self._m2 + _delta*(value - self.mean)
+
+    @property
+    def std(self):
+        """Standard deviation of the values added."""
+        if self.count == 0:
+            return 0.0
+        return (self._m2/self.count)**0.5
+
+
+class StreamingFirstIntegral():
+    """First field integral of repetitions added one at a time."""
+
+    def __init__(self, factor, dt, window, baseline=0, lag=1,
+                 integrate=True, default_window=None):
+        """Initialize object.
+
+        Args:
+            factor (float): flux to field integral factor [1/m];
+            dt (float): sample period [s];
+            window (tuple or str): (start, end) sample indexes of the flux
+                step, or 'auto' to detect them on the first forward and
+                backward records;
+            baseline (int): number of initial samples used as voltage offset
+                (limited to the window start);
+            lag (int): index shift of the integral (see integrate_flux);
+            integrate (bool): False if the records are already flux (e.g.
+                acquired by the integrator);
+            default_window (tuple): window used if the step is not detected.
+        """
+        self.factor = factor
+        self.dt = dt
+        self.lag = lag
+        self.integrate = integrate
+        self.default_window = default_window
+        self.window = None
+        self.baseline = baseline
+        if window != 'auto':
+            self.set_window(window)
+        self.flx_f = []
+        self.flx_b = []
+        self.stats_f = RunningStatistics()
+        self.stats_b = RunningStatistics()
+        self._pending = {'f': [], 'b': []}
+
+    def set_window(self, window):
+        """Sets the flux step window and limits the baseline to it."""
+        self.window = tuple(window)
+        if self.baseline > 0:
+            self.baseline = max(min(self.baseline, self.window[0]), 1)
+
+    def _add(self, data, direction):
+        """Integrates the records and updates the statistics."""
+        self._pending[direction].append(data)
+        if self.window is None:
+            if any(len(val) == 0 for val in self._pending.values()):
+                return None
+            self.set_window(_resolve_window(
+                'auto', self._pending['f'][0], self._pending['b'][0],
+                self.default_window, self.lag,
+                fdi_mode=not self.integrate))
+
+        _step = None
+        for _direction, _records in self._pending.items():
+            if _direction == 'f':
+                flx_list, stats = self.flx_f, self.stats_f
+            else:
+                flx_list, stats = self.flx_b, self.stats_b
+            for _data in _records:
+                if self.integrate:
+                    _flx = _integrate_flux(_data, self.dt,
+                                           baseline=self.baseline,
+                                           lag=self.lag)
+                else:
+                    _flx = _np.array(_data, dtype=float)
+                flx_list.append(_flx)
+                _start, _end = self.window
+                _step = (_flx[_end] - _flx[_start])*self.factor
+                stats.add(_step)
+            self._pending[_direction] = []
+        return _step
+
+    def add_forward(self, data):
+        """Adds a forward record.
+
+        Args:
+            data (array): voltage [V] (or flux [V.s]) samples.
+
+        Returns:
+            field integral step of the record [T.m] (None while the window
+            is not detected).
+        """
+        return self._add(data, 'f')
+
+    def add_backward(self, data):
+        """Adds a backward record.
+
+        Args:
+            data (array): voltage [V] (or flux [V.s]) samples.
+
+        Returns:
+            field integral step of the record [T.m] (None while the window
+            is not detected).
+        """
+        return self._add(data, 'b')
+
+    @property
+    def count(self):
+        """Number of complete (forward and backward) repetitions."""
+        return min(self.stats_f.count, self.stats_b.count)
+
+    @property
+    def I_mean(self):
+        """Running field integral [T.m]."""
+        return (self.stats_f.mean - self.stats_b.mean)/2
+
+    @property
+    def I_std(self):
+        """Running field integral standard deviation [T.m]."""
+        return 1/2*(self.stats_f.std**2 + self.stats_b.std**2)**0.5
+
+    def is_diverging(self, max_std, min_count=2):
+        """Checks the running standard deviation against a limit.
+
+        Args:
+            max_std (float): maximum standard deviation [T.m] (None
+                disables the check);
+            min_count (int): minimum number of complete repetitions.
+
+        Returns:
+            True if the standard deviation exceeds max_std;
+            False otherwise.
+        """
+        if max_std is None or self.count < min_count:
+            return False
+        return bool(_np.any(self.I_std > max_std))
+
+    def truncate(self, nsamples):
+        """Keeps only the first nsamples of the records added."""
+        self.flx_f = [flx[:nsamples] for flx in self.flx_f]
+        self.flx_b = [flx[:nsamples] for flx in self.flx_b]
+
+    def flux(self):
+        """Returns the forward and backward flux [V.s], one repetition per
+        column."""
+        return (_np.array(self.flx_f, dtype=float).T,
+                _np.array(self.flx_b, dtype=float).T)
+
+    def result(self):
+        """Returns the FirstIntegralResult of the repetitions added."""
+        flx_f, flx_b = self.flux()
+        return _field_integral(flx_f, flx_b, self.factor, self.window, axis=0)
+
+
+def first_integral_stream(cfg, fdi_mode=False, window=_FC_WINDOW,
+                          baseline=_FC_BASELINE):
+    """Creates a streaming analysis of flip coil records.
+
+    Args:
+        cfg (MeasurementConfig): measurement configuration;
+        fdi_mode (bool): True if the records are acquired by the integrator;
+        window (tuple or str): (start, end) sample indexes of the flux step,
+            or 'auto' to detect them;
+        baseline (int): number of initial samples used as voltage offset.
+
+    Returns:
+        StreamingFirstIntegral instance.
+    """
+    # I = flux/(2*N*width)
+    _factor = 1/(2*cfg.turns*cfg.width)
+    return StreamingFirstIntegral(_factor, cfg.nplc/60, window,
+                                  baseline=baseline, lag=_FC_LAG,
+                                  integrate=not fdi_mode,
+                                  default_window=_FC_WINDOW)
+
+
+def first_integral_sw_stream(meas, window=_SW_WINDOW):
+    """Creates a streaming analysis of the records of one stretched wire
+    position.
+
+    Args:
+        meas (MeasurementDataSW): measurement data (turns, nplc and step);
+        window (tuple or str): (start, end) sample indexes of the flux step,
+            or 'auto' to detect them (on the records of this position).
+
+    Returns:
+        StreamingFirstIntegral instance.
+    """
+    # I = flux/(N*step)
+    _factor = 1/(meas.turns*meas.step*1e-3)
+    return StreamingFirstIntegral(_factor, meas.nplc/60, window,
+                                  lag=_SW_LAG, default_window=_SW_WINDOW)
+
+
+def stacked_result(streams):
+    """Returns the FirstIntegralResult of a stretched wire scan.
+
+    Args:
+        streams (list): StreamingFirstIntegral instances, one per position.
+
+    Returns:
+        FirstIntegralResult instance with statistics per position.
+    """
+    _flux = [stream.flux() for stream in streams]
+    flx_f = _np.array([flx[0] for flx in _flux])
+    flx_b = _np.array([flx[1] for flx in _flux])
+    return _field_integral(flx_f, flx_b, streams[0].factor,
+                           streams[0].window, axis=1)
@@ -0,0 +1,53 @@
+"""Automatic detection of the flux step window.
+
+The flux step is located on the coil voltage of all repetitions at once:
+the offset and noise of each record are estimated with the median and the
+median absolute deviation, and the step is the span of samples where the
+median deviation over the repetitions is above the noise band. The window
+start is the last sample of the pre-step baseline and the window end is
+the first sample of the post-step plateau.
+"""
+
+import numpy as _np
+
+
+def detect_window(voltage, threshold=6, guard=2, lag=0, axis=0):
+    """Detects the flux step in a set of voltage records.
+
+    Args:
+        voltage (array): voltage records [V] (or flux derivative), one
+            repetition per column (or any shape with the samples along
+            axis, e.g. forward and backward records stacked);
+        threshold (float): noise band half width, in noise standard
+            deviations;
+        guard (int): number of samples added before and after the step;
+        lag (int): index shift of the integrated flux (see
+            integrate_flux), added to the window end;
+        axis (int): sample axis.
+
+    Returns:
+        (start, end) sample indexes of the flux step;
+        None if no step was found.
+    """
+    _v = _np.moveaxis(_np.asarray(voltage, dtype=float), axis, 0)
+    _v = _v.reshape(_v.shape[0], -1)
+    _nsamples = _v.shape[0]
+    if _nsamples < 2:
+        return None
+
+    _offset = _np.median(_v, axis=0)
+    _dev = _np.abs(_v - _offset)
+    _noise = 1.4826*_np.median(_dev, axis=0)
+    _noise = _np.maximum(_noise, _np.finfo(float).tiny)
+
+    # a sample is in the step if most repetitions are out of the noise band
+    _out = _np.median(_dev/_noise, axis=1) > threshold
+    if not _out.any():
+        return None
+
+    _idx = _np.flatnonzero(_out)
+    _start = max(int(_idx[0]) - guard, 0)
+    _end = min(int(_idx[-1]) + guard + lag, _nsamples - 1)
+    if _end <= _start:
+        return None
+    return _start, _end
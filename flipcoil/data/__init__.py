@@ -2,3 +2,4 @@
 
 from . import configuration
 from . import measurement
+from . import trajectory
@@ -0,0 +1,86 @@
+"""Flip coil encoder trajectories recorded during the flips.
+
+The trajectories gathered by the PPMAC are stored in a compressed numpy
+file next to the database (one file per measurement), so the database
+schema is not changed. Each flip direction is stored as an array with
+shape (repetitions, samples, 1 + motors), padded with nan: the first
+column is the time since the start of the gather [s] and the other
+columns are the encoder positions [counts].
+"""
+
+import os as _os
+import numpy as _np
+
+
+def trajectory_filename(database_name, collection, idn):
+    """Returns the trajectory file path of a measurement.
+
+    Args:
+        database_name (str): database file path (sqlite) or name (mongo);
+        collection (str): measurement collection name;
+        idn (int): measurement id.
+
+    Returns:
+        file path (in a trajectories directory next to the database).
+    """
+    _dirname = _os.path.join(
+        _os.path.dirname(_os.path.abspath(database_name)), 'trajectories')
+    _basename = '{0}_{1}_{2}.npz'.format(
+        _os.path.splitext(_os.path.basename(database_name))[0],
+        collection, idn)
+    return _os.path.join(_dirname, _basename)
+
+
+def stack_records(records):
+    """Stacks gather records with different lengths, padding with nan.
+
+    Args:
+        records (list): arrays with shape (samples, columns), None for
+            missing records.
+
+    Returns:
+        array with shape (records, samples, columns).
+    """
+    _valid = [rec for rec in records if rec is not None]
+    if len(_valid) == 0:
+        return _np.zeros((len(records), 0, 0))
+    _nsamples = max(rec.shape[0] for rec in _valid)
+    _ncols = max(rec.shape[1] for rec in _valid)
+    _stack = _np.full((len(records), _nsamples, _ncols), _np.nan)
+    for i, rec in enumerate(records):
+        if rec is not None:
+            _stack[i, :rec.shape[0], :rec.shape[1]] = rec
+    return _stack
+
+
+def save_trajectories(filename, traj_frw, traj_bck, motors=[7, 8]):
+    """Saves the forward and backward trajectories of a measurement.
+
+    Args:
+        filename (str): file path (see trajectory_filename);
+        traj_frw (list): forward gather records (see Ppmac.read_gather);
+        traj_bck (list): backward gather records;
+        motors (list): gathered motor numbers.
+    """
+    _dirname = _os.path.dirname(filename)
+    if _dirname and not _os.path.isdir(_dirname):
+        _os.makedirs(_dirname)
+    _np.savez_compressed(filename, frw=stack_records(traj_frw),
+                         bck=stack_records(traj_bck),
+                         motors=_np.array(motors))
+
+
+def load_trajectories(filename):
+    """Loads the trajectories of a measurement.
+
+    Args:
+        filename (str): file path (see trajectory_filename).
+
+    Returns:
+        (traj_frw, traj_bck, motors) tuple (see save_trajectories);
+        None if the measurement has no trajectory file.
+    """
+    if not _os.path.isfile(filename):
+        return None
+    with _np.load(filename) as _f:
+        return _f['frw'], _f['bck'], list(_f['motors'])
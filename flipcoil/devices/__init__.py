@@ -7,6 +7,8 @@ from imautils.devices import Agilent34970ALib as _Agilent34970ALib
 import time as _time
 import numpy as _np
 import sys as _sys
+import queue as _queue
+import itertools as _itertools
 import threading as _threading
 import traceback as _traceback
 import socket as _socket
@@ -60,63 +62,244 @@ class MultiChannel(_Agilent34970ALib.Agilent34970AGPIB):
 class Multimeter(_Agilent3458ALib.Agilent3458AGPIB):
     """Multimeter class."""
 
+    def _setting_key(self, command):
+        """Returns the instrument setting changed by a command (the command
+        header, plus the array name for DIM)."""
+        _cmd = command.strip()
+        _key = _cmd.split(' ')[0].upper()
+        if _key == 'DIM':
+            _key = 'DIM ' + _cmd[4:].split('(')[0].strip().upper()
+        return _key
+
+    def apply_settings(self, commands):
+        """Sends only the settings that differ from the instrument state.
+
+        A shadow copy of the last command sent for each setting is kept, so
+        repeated configurations send no commands. If a setting appears more
+        than once in commands, only the last one is applied. Changing the
+        function resets the shadow copy, since it also changes the range
+        and integration settings of the instrument, and a changed DIM array
+        is dimensioned after a SCRATCH, as in the full configuration.
+
+        Args:
+            commands (list): setting commands, in the order they are sent.
+
+        Returns:
+            number of commands sent.
+        """
+        if not hasattr(self, 'settings'):
+            self.settings = {}
+        _final = {}
+        for _cmd in commands:
+            _key = self._setting_key(_cmd)
+            _final.pop(_key, None)
+            _final[_key] = _cmd
+
+        _sent = []
+        for _key, _cmd in _final.items():
+            if self.settings.get(_key) == _cmd:
+                continue
+            if _key == 'FUNC':
+                self.settings = {}
+            if (_key.startswith('DIM ') and 'SCRATCH' in self.settings and
+                    'SCRATCH' not in _sent):
+                # arrays are dimensioned on a cleared memory
+                self.send_command(self.settings['SCRATCH'])
+                _sent.append('SCRATCH')
+            if _key == 'SCRATCH':
+                for _dim in [k for k in self.settings if k.startswith('DIM ')]:
+                    self.settings.pop(_dim)
+            try:
+                self.send_command(_cmd)
+            except Exception:
+                # the instrument state is unknown
+                self.settings = {}
+                raise
+            self.settings[_key] = _cmd
+            _sent.append(_key)
+        return len(_sent)
+
+    def resync(self):
+        """Sends all the settings again (e.g. after a reconnection or an
+        instrument error).
+
+        Returns:
+            number of commands sent.
+        """
+        _commands = list(getattr(self, 'settings', {}).values())
+        self.settings = {}
+        return self.apply_settings(_commands)
+
+    def clear_settings(self):
+        """Forgets the settings shadow copy, so the next configuration is
+        sent in full."""
+        self.settings = {}
+
+    def connect(self, *args, **kwargs):
+        """Connects to the instrument and clears the settings shadow copy."""
+        self.clear_settings()
+        return super().connect(*args, **kwargs)
+
+    def configure_commands(self, aper, mrange):
+        """Returns the commands of the basic multimeter configuration.
+        Args:
+            aper (float): A/D converter integration time in ms.
+            mrange (float): measurement range in volts.
+        """
+        return [
+            self.commands.func_volt,
+            self.commands.tarm_auto,
+            self.commands.trig_auto,
+            self.commands.nrdgs_ext,
+            self.commands.arange_off,
+            self.commands.fixedz_on,
+            self.commands.range + str(mrange),
+            self.commands.math_off,
+            self.commands.azero_once,
+            self.commands.trig_buffer_off,
+            self.commands.delay_0,
+            self.commands.aper + '{0:.10f}'.format(aper/1000),
+            self.commands.disp_off,
+            self.commands.scratch,
+            self.commands.end_gpib_always,
+            self.commands.mem_fifo,
+            ]
+
     def configure(self, aper, mrange):
         """Configure multimeter.
         Args:
             aper (float): A/D converter integration time in ms.
             mrange (float): measurement range in volts.
         """
-        self.send_command(self.commands.func_volt)
-        self.send_command(self.commands.tarm_auto)
-        self.send_command(self.commands.trig_auto)
-        self.send_command(self.commands.nrdgs_ext)
-        self.send_command(self.commands.arange_off)
-        self.send_command(self.commands.fixedz_on)
-        self.send_command(self.commands.range + str(mrange))
-        self.send_command(self.commands.math_off)
-        self.send_command(self.commands.azero_once)
-        self.send_command(self.commands.trig_buffer_off)
-        self.send_command(self.commands.delay_0)
-        self.send_command(
-            self.commands.aper + '{0:.10f}'.format(aper/1000))
-        self.send_command(self.commands.disp_off)
-        self.send_command(self.commands.scratch)
-        self.send_command(self.commands.end_gpib_always)
-        self.send_command(self.commands.mem_fifo)
+        self.apply_settings(self.configure_commands(aper, mrange))
 
     # Configure multimeter
     def configure_volt(self, nplc=3, time=3):
         _rgds = int(_np.ceil(time/(nplc/60)))
-        self.configure(50, 0)  # integration time 50ms and 100mV Range
-        self.send_command('NPLC {}'.format(nplc))  # volt.send_command('APER 0.05')
-        self.send_command('TRIG HOLD')
-        self.send_command('DIM Rdgs({})'.format(_rgds))
-        self.send_command('INBUF ON')
-        self.send_command('NRDGS {}, AUTO'.format(_rgds))
-        self.configure_reading_format('DREAL')
-        self.send_command('DISP ON')
+        self.nrdgs = _rgds
+        self.reading_time = nplc/60  # [s]
+        # integration time 50ms and 100mV Range
+        _commands = self.configure_commands(50, 0)
+        _commands.extend([
+            'NPLC {}'.format(nplc),  # volt.send_command('APER 0.05')
+            'TRIG HOLD',
+            'DIM Rdgs({})'.format(_rgds),
+            'INBUF ON',
+            'NRDGS {}, AUTO'.format(_rgds),
+            ])
+        _commands.extend(self.reading_format_commands('DREAL'))
+        _commands.append('DISP ON')
+        self.apply_settings(_commands)
 
-    def configure_reading_format(self, formtype):
-        """Configure multimeter reading format.
+    def configure_nrdgs(self, nrdgs):
+        """Configure the number of readings per trigger.
+        Args:
+            nrdgs (int): number of readings.
+        """
+        self.apply_settings(['NRDGS {}, AUTO'.format(nrdgs)])
+        self.nrdgs = nrdgs
+
+    def reading_format_commands(self, formtype):
+        """Returns the reading format commands.
         Args:
             formtype (str): format type [SREAL, DREAL].
         """
-        self.send_command(self.commands.mem_fifo)
+        _commands = [self.commands.mem_fifo]
         if formtype == 'SREAL':
-            self.send_command(self.commands.oformat_sreal)
-            self.send_command(self.commands.mformat_sreal)
+            _commands.extend([self.commands.oformat_sreal,
+                              self.commands.mformat_sreal])
         elif formtype == 'DREAL':
-            self.send_command(self.commands.oformat_dreal)
-            self.send_command(self.commands.mformat_dreal)
+            _commands.extend([self.commands.oformat_dreal,
+                              self.commands.mformat_dreal])
+        return _commands
+
+    def configure_reading_format(self, formtype):
+        """Configure multimeter reading format.
+        Args:
+            formtype (str): format type [SREAL, DREAL].
+        """
+        self.apply_settings(self.reading_format_commands(formtype))
 
     def start_measurement(self):
         volt.configure_reading_format('DREAL')
+        # clears the reading memory (not a setting, always sent)
+        volt.send_command(volt.commands.mem_fifo)
         volt.send_command('TRIG SGL')
 
     def get_data_count(self):
         volt.send_command(volt.commands.mcount)
         return int(volt.read_from_device().strip('\r\n'))
 
+    def wait_readings(self, n=None, timeout=10, poll=0.05, max_poll=0.5):
+        """Waits until the readings of a measurement are in memory.
+
+        The reading count (MCOUNT?) is polled at the time the remaining
+        readings are expected to be complete, so the transfer can start as
+        soon as they exist, with few queries during the acquisition.
+
+        Args:
+            n (int): number of readings (None uses the configured number
+                of readings);
+            timeout (float): maximum waiting time [s];
+            poll (float): minimum polling interval [s];
+            max_poll (float): maximum polling interval [s].
+
+        Returns:
+            number of readings in memory (less than n on timeout).
+        """
+        if n is None:
+            n = getattr(self, 'nrdgs', 0)
+        _reading_time = getattr(self, 'reading_time', 0)
+        _tf = _time.time() + timeout
+        _count = 0
+        while True:
+            try:
+                _count = self.get_data_count()
+            except Exception:
+                _traceback.print_exc(file=_sys.stdout)
+            if _count >= n:
+                return _count
+            _remaining = _tf - _time.time()
+            if _remaining <= 0:
+                return _count
+            _expected = (n - _count)*_reading_time
+            _sleep(min(max(_expected, poll), max_poll, _remaining))
+
+    def read_memory_block(self, count=None, out=None, reverse=False):
+        """Reads DREAL readings from memory in one binary transfer.
+
+        The readings are requested with RMEM and the whole block is read
+        with a single bus transfer. The raw bytes (big-endian doubles) are
+        decoded with numpy.frombuffer, without intermediate lists, and
+        copied into the acquisition buffer.
+
+        Args:
+            count (int): number of readings (None reads the memory reading
+                count);
+            out (array): preallocated buffer (e.g. a row of the acquisition
+                array) with count elements (None returns a new array);
+            reverse (bool): if True, stores the readings in reverse order.
+
+        Returns:
+            array with the readings [V] (out, if it was given);
+            None if the readings could not be read.
+        """
+        try:
+            if count is None:
+                count = self.get_data_count()
+            self.send_command('RMEM 1,{0},1'.format(count))
+            _raw = self.inst.read_bytes(8*count)
+            _readings = _np.frombuffer(_raw, dtype='>f8', count=count)
+            if reverse:
+                _readings = _readings[::-1]
+            if out is None:
+                return _readings.astype(float)
+            out[...] = _readings
+            return out
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            return None
+
     def error_query(self):
         volt.send_command('ERR?')
         return int(volt.read_from_device().strip('\r\n'))
@@ -124,10 +307,11 @@ class Multimeter(_Agilent3458ALib.Agilent3458AGPIB):
 
 class Fdi(Fdi_eth):
     def configure_integrator(self, time=3, interval=50, base_frq=1000,
-                             calibrate=0):
+                             calibrate=0, timestamps=False):
         self.main_settings(100, "Timer")  # gain, source
         # fdi.send('CALC:FLUX 0')  # configures to integrate between triggers
-        self.send('FORM:TIMESTAMP:ENABLE 0')  # disables timestamp
+        # enables or disables the timestamps
+        self.send('FORM:TIMESTAMP:ENABLE ' + str(int(bool(timestamps))))
         # fdi.send('TRIG:SOUR BUS') # trigger source from software
         # fdi.send('INP:COUP DC')  # Couples coil to the integrator
         # TRIG:SOUR TIMER
@@ -141,10 +325,101 @@ class Fdi(Fdi_eth):
 #         print(counts, ecounts)
         self.send('TRIG:COUN ' + str(counts))
         self.send('TRIG:ECO ' + str(ecounts))
+        self.counts = counts
+        self.interval = measurement_interval*10**-3  # [s]
+        self.timestamps = bool(timestamps)
         if calibrate:
             self.calibrate()
         return counts
 
+    def read_stream(self, out=None, timestamps_out=None, nsamples=None,
+                    timeout=10, max_poll=0.5):
+        """Reads the integrated flux in blocks while the flip is running.
+
+        The samples available in the integrator are fetched as they are
+        integrated and copied into a preallocated buffer, and the
+        acquisition ends as soon as the trigger count is reached.
+
+        Args:
+            out (array): preallocated flux buffer with nsamples elements
+                (None allocates a new one);
+            timestamps_out (array): preallocated timestamp buffer [s], used
+                if the timestamps are enabled (see configure_integrator);
+            nsamples (int): number of flux samples (None uses the trigger
+                count minus one, the flux is integrated between triggers);
+            timeout (float): maximum acquisition time [s];
+            max_poll (float): maximum interval between block reads [s].
+
+        Returns:
+            flux buffer (out); the samples not acquired before the timeout
+            are set to nan.
+        """
+        if nsamples is None:
+            nsamples = self.counts - 1
+        if out is None:
+            out = _np.empty(nsamples)
+        _timestamps = getattr(self, 'timestamps', False)
+        _width = 2 if _timestamps else 1
+        _interval = getattr(self, 'interval', 0.05)
+
+        _n = 0
+        _pending = _np.empty(0)
+        _tf = _time.time() + timeout
+        while _n < nsamples and _time.time() < _tf:
+            if self.get_data_count() > 0:
+                _block = _np.concatenate(
+                    [_pending, _np.asarray(self.get_data(), dtype=float)])
+                # timestamped samples are (flux, time) pairs, a value
+                # without its pair (block cut by the stream) is kept for
+                # the next read
+                _ncomplete = len(_block) - len(_block) % _width
+                _pending = _block[_ncomplete:]
+                _block = _block[:_ncomplete].reshape(-1, _width)
+                _block = _block[:nsamples - _n]
+                out[_n:_n + len(_block)] = _block[:, 0]
+                if _timestamps and timestamps_out is not None:
+                    timestamps_out[_n:_n + len(_block)] = _block[:, 1]
+                _n += len(_block)
+            if _n < nsamples:
+                _sleep(min(max((nsamples - _n)*_interval, _interval),
+                           max_poll, max(_tf - _time.time(), 0)))
+        out[_n:] = _np.nan
+        return out
+
+
+# motion snapshot record (one row per motor)
+SNAPSHOT_DTYPE = _np.dtype([
+    ('motor', _np.int8),
+    ('pos', _np.float64),  # [counts]
+    ('stopped', _np.bool_),  # desired velocity zero
+    ('in_pos', _np.bool_),
+    ('homed', _np.bool_),
+    ])
+
+
+# PPMAC command priorities (lower values are sent first)
+PRIORITY_ABORT = 0
+PRIORITY_MOTION = 1
+PRIORITY_QUERY = 2
+PRIORITY_POLL = 3
+
+
+class PpmacRequest():
+    """PPMAC command waiting in the command channel."""
+
+    def __init__(self, msg, timeout=1):
+        """Initialize object.
+
+        Args:
+            msg (str): command;
+            timeout (float): maximum time to wait for the reply [s].
+        """
+        self.msg = msg
+        self.timeout = timeout
+        self.reply = None
+        self.error = None
+        self.done = _threading.Event()
+
 
 class Ppmac(Ppmac_eth):
     # deltatau functions
@@ -152,41 +427,460 @@ class Ppmac(Ppmac_eth):
         super().__init__()
         self.lock_ppmac = _threading.RLock()
         self.flag_abort = False
+        self.echo = True  # gpascii echoes the commands on the shell
+        # jog parameters of each motor, used to predict the move times
+        self.jog = {}
+        # gather buffer settings (see configure_gather)
+        self.gather = None
+        # command channel: all PPMAC I/O is done by one worker thread
+        self._requests = _queue.PriorityQueue()
+        self._sequence = _itertools.count()
+        self._worker = None
+        self._worker_lock = _threading.Lock()
+
+    def _start_worker(self):
+        """Starts the command channel thread if it is not running."""
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = _threading.Thread(
+                    target=self._run_channel, daemon=True)
+                self._worker.start()
+
+    def _run_channel(self):
+        """Command channel loop: sends the queued commands in priority
+        order and stores each reply in its request."""
+        while True:
+            _priority, _seq, _request = self._requests.get()
+            try:
+                _request.reply = self._transact(
+                    _request.msg, _request.timeout)
+            except Exception as e:
+                _request.error = e
+            finally:
+                _request.done.set()
+
+    def _drain(self):
+        """Discards unread replies of previous commands."""
+        while self.ppmac.recv_ready():
+            self.ppmac.recv(4096)
+
+    def _transact(self, msg, timeout=1):
+        """Sends a command and reads its reply (command channel thread).
+
+        The reply is read until the gpascii terminator (\\x06) that follows
+        the command echo, so each reply is paired with its command.
+        """
+        with self.lock_ppmac:
+            self._drain()
+            super().write(msg)
+            _buf = ''
+            _tf = _time.time() + timeout
+            _timeout = self.ppmac.gettimeout()
+            try:
+                while True:
+                    if not self.echo:
+                        _reply = _buf
+                    elif msg in _buf:
+                        _reply = _buf.split(msg)[-1]
+                    else:
+                        _reply = ''
+                    if '\x06' in _reply:
+                        return _reply.split('\x06')[0].strip('\r\n ')
+                    _remaining = _tf - _time.time()
+                    if _remaining <= 0:
+                        raise _socket.timeout('PPMAC reply timeout: ' + msg)
+                    self.ppmac.settimeout(_remaining)
+                    _data = self.ppmac.recv(4096)
+                    if len(_data) == 0:
+                        raise ConnectionError('PPMAC connection closed.')
+                    _buf = _buf + _data.decode(errors='replace')
+            finally:
+                self.ppmac.settimeout(_timeout)
+
+    def request(self, msg, priority=PRIORITY_QUERY, timeout=1):
+        """Sends a command through the command channel.
+
+        Commands from all threads are queued and sent one at a time by the
+        channel thread, in priority order (ABORT, MOTION, QUERY, POLL) and
+        in arrival order for the same priority. The call blocks until the
+        reply of the command is read.
+
+        Args:
+            msg (str): command;
+            priority (int): command priority (PRIORITY_* constants);
+            timeout (float): maximum time to wait for the reply after the
+                command is sent [s].
+
+        Returns:
+            reply string, without the command echo and the terminator.
+
+        Raises:
+            socket.timeout if the reply does not arrive in time.
+        """
+        if _threading.current_thread() is self._worker:
+            return self._transact(msg, timeout)
+        self._start_worker()
+        _request = PpmacRequest(msg, timeout)
+        self._requests.put((priority, next(self._sequence), _request))
+        _request.done.wait()
+        if _request.error is not None:
+            raise _request.error
+        return _request.reply
+
+    def write(self, msg, priority=PRIORITY_MOTION, timeout=1):
+        """Sends a command through the command channel.
+
+        Args:
+            msg (str): command;
+            priority (int): command priority (PRIORITY_* constants);
+            timeout (float): maximum time to wait for the reply [s].
+
+        Returns:
+            reply string;
+            None if the reply could not be read.
+        """
+        try:
+            return self.request(msg, priority=priority, timeout=timeout)
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            return None
+
+    def query(self, msg, timeout=1, priority=PRIORITY_QUERY):
+        """Sends a command and reads its reply.
+
+        The reply is read until the gpascii terminator (\\x06), so the
+        query returns as soon as the answer arrives.
+
+        Args:
+            msg (str): command;
+            timeout (float): maximum time to wait for the reply [s];
+            priority (int): command priority (PRIORITY_* constants).
+
+        Returns:
+            reply string, without the command echo and the terminator.
+
+        Raises:
+            socket.timeout if the reply does not arrive in time.
+        """
+        return self.request(msg, priority=priority, timeout=timeout)
+
+    def kill(self, motors):
+        """Kills (disables) a motor set ahead of the queued commands.
+
+        Args:
+            motors (list): motor numbers.
+        """
+        return self.write('#' + ','.join(str(n) for n in motors) + 'k',
+                          priority=PRIORITY_ABORT)
+
+    def snapshot(self, motors=[], priority=PRIORITY_QUERY):
+        """Reads positions and motion flags of a motor set.
+
+        Positions, DesVelZero, InPos and HomeComplete of all motors are
+        requested in a single command line, so one round trip is needed
+        regardless of the number of motors.
+
+        Args:
+            motors (list): motor numbers;
+            priority (int): command priority (PRIORITY_* constants).
+
+        Returns:
+            structured array (SNAPSHOT_DTYPE) with one row per motor;
+            None if the reply could not be read.
+        """
+        try:
+            _motors = [int(n) for n in motors]
+            _flags = ['DesVelZero', 'InPos', 'HomeComplete']
+            msg = '#' + ','.join(str(n) for n in _motors) + 'p'
+            for n in _motors:
+                for _flag in _flags:
+                    msg = msg + ' Motor[{0}].{1}'.format(n, _flag)
+            _tokens = self.query(msg, priority=priority).split()
+
+            _values = {}
+            _pos = []
+            for _token in _tokens:
+                if '=' in _token:
+                    _key, _val = _token.split('=')
+                    _values[_key] = int(float(_val))
+                else:
+                    _pos.append(float(_token))
+
+            _snapshot = _np.zeros(len(_motors), dtype=SNAPSHOT_DTYPE)
+            _snapshot['motor'] = _motors
+            _snapshot['pos'] = _pos
+            for _field, _flag in zip(['stopped', 'in_pos', 'homed'], _flags):
+                _snapshot[_field] = [
+                    _values['Motor[{0}].{1}'.format(n, _flag)]
+                    for n in _motors]
+            return _snapshot
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            return None
+
+    def configure_gather(self, motors=[7, 8], frequency=1000, duration=3):
+        """Configures the gather buffer to record motor positions.
+
+        The servo counter is gathered with the positions, so the sample
+        times are known even if the gather period is rounded to a multiple
+        of the servo period.
+
+        Args:
+            motors (list): motor numbers;
+            frequency (float): gather frequency [Hz] (limited to the servo
+                frequency);
+            duration (float): maximum gather time [s].
+
+        Returns:
+            True if successfull;
+            False otherwise.
+        """
+        try:
+            _servo_period = float(
+                self.query('Sys.ServoPeriod').split('=')[-1])*1e-3  # [s]
+            _period = max(int(round(1/(frequency*_servo_period))), 1)
+            _nsamples = int(_np.ceil(duration/(_period*_servo_period))) + 1
+            _addr = ['Sys.ServoCount.a'] + [
+                'Motor[{0}].ActPos.a'.format(n) for n in motors]
+
+            msg = 'Gather.Enable=0;Gather.Items={0};Gather.Period={1};' \
+                'Gather.MaxSamples={2}'.format(
+                    len(_addr), _period, _nsamples)
+            for i, _item in enumerate(_addr):
+                msg = msg + ';Gather.Addr[{0}]={1}'.format(i, _item)
+            if self.write(msg) is None:
+                return False
+            self.gather = {'motors': list(motors),
+                           'servo_period': _servo_period,
+                           'period': _period*_servo_period,
+                           'max_samples': _nsamples}
+            return True
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            return False
+
+    def start_gather(self):
+        """Clears the gather buffer and starts gathering."""
+        self.write('Gather.Enable=0;Gather.Enable=2')
+
+    def stop_gather(self):
+        """Stops gathering."""
+        self.write('Gather.Enable=0')
+
+    def read_gather(self, timeout=10):
+        """Downloads the gather buffer in one bulk transfer.
+
+        Args:
+            timeout (float): maximum transfer time [s].
+
+        Returns:
+            array with one row per sample: the time since the first sample
+            [s] followed by the positions of the gathered motors [counts];
+            None if the buffer could not be read.
+        """
+        try:
+            _lines = self.query('list gather', timeout=timeout).splitlines()
+            _rows = [line.split() for line in _lines if line.strip()]
+            _data = _np.array(_rows, dtype=float).reshape(
+                len(_rows), len(self.gather['motors']) + 1)
+            _data[:, 0] = ((_data[:, 0] - _data[0, 0]) *
+                           self.gather['servo_period'])
+            return _data
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            return None
+
+    def motors_stopped(self, motors, all_motors=True):
+        """Checks the DesVelZero flags of a motor set in one round trip.
+
+        Args:
+            motors (list): motor numbers;
+            all_motors (bool): if True, checks if all motors stopped;
+                otherwise, checks if any motor stopped.
+
+        Returns:
+            True if the motors stopped;
+            False otherwise (or if the flags could not be read).
+        """
+        _snapshot = self.snapshot(motors)
+        if _snapshot is None:
+            return False
+        if all_motors:
+            return bool(_snapshot['stopped'].all())
+        return bool(_snapshot['stopped'].any())
+
+    def set_jog(self, motors, speed, ta, ts):
+        """Configures the jog parameters of a motor set.
+
+        Args:
+            motors (list): motor numbers;
+            speed (float): JogSpeed [counts/ms];
+            ta (float): JogTa, acceleration time [ms] (or, if negative,
+                inverse acceleration [ms^2/count]);
+            ts (float): JogTs, jerk time [ms] (or, if negative, inverse
+                jerk [ms^3/count]).
+        """
+        for n in motors:
+            msg = ('Motor[{0}].JogSpeed={1};'
+                   'Motor[{0}].JogTa={2};'
+                   'Motor[{0}].JogTs={3}'.format(n, speed, ta, ts))
+            self.write(msg)
+            self.jog[n] = (speed, ta, ts)
+
+    def predict_move_time(self, motors, distance):
+        """Predicts the duration of a jog move from the jog parameters.
+
+        Args:
+            motors (list): motor numbers (the slowest one is used);
+            distance (float): move distance [counts].
+
+        Returns:
+            predicted move time [s];
+            None if the jog parameters of a motor are unknown.
+        """
+        _times = []
+        for n in motors:
+            if n not in self.jog:
+                return None
+            _speed, _ta, _ts = self.jog[n]
+            _speed = abs(_speed)
+            if _speed == 0:
+                return None
+            _dist = abs(distance)
+
+            # acceleration [counts/ms^2]
+            if _ta < 0:
+                _acc = -1/_ta
+            elif _ta > 0:
+                _acc = _speed/_ta
+            else:
+                _acc = _np.inf
+            # time added by the jerk limited (S-curve) ramps [ms]
+            if _ts < 0:
+                _tj = _acc*(-1*_ts) if _np.isfinite(_acc) else 0
+            else:
+                _tj = _ts
+
+            if _dist >= _speed**2/_acc:
+                _t = _dist/_speed + _speed/_acc
+            else:
+                _t = 2*(_dist/_acc)**0.5
+            _times.append((_t + _tj)*1e-3)
+        return max(_times)
+
+    def wait_motion_done(self, motors, timeout=60, settle=0, distance=None,
+                         delay=None, condition=None, poll=0.05,
+                         max_poll=0.5, min_delay=0.1, dwell=0):
+        """Waits the end of a move of a motor set.
+
+        The first check is scheduled at the predicted move time (see
+        predict_move_time), and the flags are then polled with an
+        increasing interval. After the motors stop, the in-position flags
+        are polled for up to settle seconds, and the wait lasts at least
+        dwell seconds. An abort request ends the wait at any stage.
+
+        Args:
+            motors (list): motor numbers;
+            timeout (float): maximum move time [s];
+            settle (float): maximum time to wait the in-position flags
+                after the motors stop [s] (0 disables the settle check);
+            distance (float): move distance [counts], used to predict the
+                move time;
+            delay (float): time of the first check [s] (None uses the
+                predicted move time);
+            condition (function): check that returns True when the move is
+                done (None checks the DesVelZero flags);
+            poll (float): initial polling interval [s];
+            max_poll (float): maximum polling interval [s];
+            min_delay (float): minimum time of the first check [s], so the
+                stopped state before the move starts is not taken as the
+                end of the move;
+            dwell (float): minimum time waited after the motors stop [s]
+                (e.g. for the coil to stop before the encoders are read).
+
+        Returns:
+            dict with the done and aborted flags, the predicted time, the
+            motion time, the settle time, the total time [s] and the number
+            of polls.
+        """
+        _t0 = _time.time()
+        _metrics = {'done': False, 'aborted': False, 'predicted_time': None,
+                    'motion_time': None, 'settle_time': 0, 'total_time': 0,
+                    'polls': 0}
+        if distance is not None:
+            _metrics['predicted_time'] = self.predict_move_time(
+                motors, distance)
+        if delay is None:
+            delay = _metrics['predicted_time'] or 0
+        _sleep(max(delay, min_delay))
+
+        _interval = poll
+        _stopped = False
+        while _time.time() - _t0 < timeout:
+            if self.flag_abort:
+                _metrics['aborted'] = True
+                break
+            _metrics['polls'] += 1
+            if condition is not None:
+                _stopped = condition()
+            else:
+                _stopped = self.motors_stopped(motors)
+            if _stopped:
+                break
+            _sleep(_interval)
+            _interval = min(_interval*1.5, max_poll)
+
+        _t1 = _time.time()
+        _metrics['motion_time'] = _t1 - _t0
+        if _stopped and settle > 0:
+            _interval = poll
+            while _time.time() - _t1 < settle:
+                if self.flag_abort:
+                    _metrics['aborted'] = True
+                    break
+                _metrics['polls'] += 1
+                _snapshot = self.snapshot(motors)
+                if _snapshot is not None and _snapshot['in_pos'].all():
+                    break
+                _sleep(_interval)
+                _interval = min(_interval*1.5, max_poll)
+        if _stopped and not _metrics['aborted']:
+            while _time.time() - _t1 < dwell:
+                if self.flag_abort:
+                    _metrics['aborted'] = True
+                    break
+                _sleep(max(min(poll, _t1 + dwell - _time.time()), 0))
+        if _stopped:
+            _metrics['settle_time'] = _time.time() - _t1
+
+        _metrics['done'] = bool(_stopped)
+        _metrics['total_time'] = _time.time() - _t0
+        return _metrics
 
     def motor_stopped(self, n=5):
-#         with self.lock_ppmac:
         try:
             msg = 'Motor[' + str(n) + '].DesVelZero'
-            self.write(msg)
-            _sleep(0.1)
-            ans = self.read().split(msg)[-1]
-            return int(ans.split(msg)[-1].split('=')[-1].split('\r')[0])
+            ans = self.query(msg)
+            return int(ans.split('=')[-1].split('\r')[0])
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
             return None
 
     def in_motion(self):
-#         with self.lock_ppmac:
         try:
             msg = 'motionFlag'
-            self.write(msg)
-            _sleep(0.1)
-            ans = self.read().split(msg)[-1]
+            ans = self.query(msg)
             return int(ans.split('=')[-1][0])
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
             return None
 
     def read_motor_pos(self, motors=[]):
-#         with self.lock_ppmac:
         try:
             msg = '#'
             msg = msg + str(motors).strip('[]').replace(' ', '')
             msg = msg + 'p'
-            self.write(msg)
-            _sleep(0.1)
-            ans = self.read()
-            ans1 = ans.split(msg)[-1].strip('\r\n\x06').split(' ')
+            ans1 = self.query(msg).split()
             pos = _np.array([float(val) for val in ans1])
             return pos
         except Exception:
@@ -194,15 +888,11 @@ class Ppmac(Ppmac_eth):
             return None
 
     def read_axis_pos(self, axis='', coord=1):
-#         with self.lock_ppmac:
         try:
             if all([axis is not None,
                     axis != '']):
                 msg = '&' + str(coord) + axis + 'p'
-                self.write(msg)
-                ans = self.read()
-                ans1 = ans.split(msg)[-1].strip('\r\n\x06')
-                return float(ans1)
+                return float(self.query(msg))
             else:
                 print(axis)
                 return None
@@ -211,16 +901,9 @@ class Ppmac(Ppmac_eth):
             return None
 
     def motor_homed(self, motor):
-#         with self.lock_ppmac:
         try:
-#             try:
-            self.read()
-#             except _socket.timeout:
-#                 pass
-            _sleep(1)
-            self.write("Motor{0}Homed".format(motor))
-            _ans = self.read()
-            if int(_ans.split('=')[-1].strip('\r\n\x06')):
+            _ans = self.query("Motor{0}Homed".format(motor))
+            if int(_ans.split('=')[-1]):
                 return True
             else:
                 return False
@@ -228,7 +911,8 @@ class Ppmac(Ppmac_eth):
             _traceback.print_exc(file=_sys.stdout)
             return None
 
-    def remove_backlash(self, target_pos=0, elim=2, ccw=1, max_tries=100):
+    def remove_backlash(self, target_pos=0, elim=2, ccw=1, max_tries=100,
+                        dwell=1):
         try:
             target_pos_steps = int(target_pos*102400/360000)
             if ccw > 0:
@@ -243,16 +927,14 @@ class Ppmac(Ppmac_eth):
 
             self.write('#5j=' + str(ccw*(dp + -1*target_pos_steps)) +
                        ';#6j=' + str(ccw*(-1*dp + target_pos_steps)))
-            _sleep(0.1)
-            while not self.motor_stopped(5):
-                _sleep(0.1)
-            _sleep(1)
+            if self.wait_motion_done([5, 6], settle=1,
+                                     dwell=dwell)['aborted']:
+                return False
             self.write('#5j^' + str(-1*ccw*dp) +
                        ';#6j^' + str(ccw*dp))
-            _sleep(0.1)
-            while not self.motor_stopped(5):
-                _sleep(0.1)
-            _sleep(1)
+            if self.wait_motion_done([5, 6], settle=1, distance=dp,
+                                     dwell=dwell)['aborted']:
+                return False
             p_list = self.read_motor_pos([5, 6, 7, 8])
 
             while(any([abs(-1*target_pos - p_list[-2]) > lim,
@@ -264,16 +946,15 @@ class Ppmac(Ppmac_eth):
                 dp6 = dp6 + ccw*int((target_pos - p_list[-1])*102400/360000)
                 self.write('#5j=' + str(ccw*(dp + -1*target_pos_steps)) +
                            ';#6j=' + str(ccw*(-1*dp + target_pos_steps)))
-                _sleep(0.1)
-                while not self.motor_stopped(5):
-                    _sleep(0.1)
-                _sleep(1)
+                if self.wait_motion_done([5, 6], settle=1,
+                                         dwell=dwell)['aborted']:
+                    return False
                 self.write('#5j^' + str(ccw*dp5) +
                            ';#6j^' + str(ccw*dp6))
-                _sleep(0.1)
-                while not self.motor_stopped(5):
-                    _sleep(0.1)
-                _sleep(1)
+                if self.wait_motion_done([5, 6], settle=1,
+                                         distance=max(abs(dp5), abs(dp6)),
+                                         dwell=dwell)['aborted']:
+                    return False
                 p_list = _np.floor(self.read_motor_pos([5, 6, 7, 8]))
                 n_tries = n_tries + 1
 
@@ -296,16 +977,16 @@ class Ppmac(Ppmac_eth):
             # volta 1000 passos antes do zero
             steps = _np.array([bck_stps, -1*bck_stps]) - 1*sf*p_list
             self.write('#5j^{0};#6j^{1}'.format(steps[0], steps[1]))
-            _sleep(0.1)
-            while not self.motor_stopped(5):
-                _sleep(0.1)
-            _sleep(interval)
+            if self.wait_motion_done([5, 6], settle=interval,
+                                     distance=_np.abs(steps).max(),
+                                     dwell=interval)['aborted']:
+                return False
             p_list = self.read_motor_pos([7, 8])
             p_sign_init = _np.sign(p_list)
             in_pos = [False, False]
 
             tries = max_tries
-            # repete rotina enquanto no estiver na posio
+            # repete rotina enquanto nï¿½o estiver na posiï¿½ï¿½o
             while all([not in_pos[0] or not in_pos[1], tries > 0]):
                 tries -= 1
                 p_list = self.read_motor_pos([7, 8])
@@ -314,11 +995,10 @@ class Ppmac(Ppmac_eth):
                     if abs(steps[i]) < 5 and steps[i] != 0:
                         steps[i] = int(steps[i]/abs(steps[i]))
                 self.write('#5j^{0};#6j^{1}'.format(steps[0], steps[1]))
-                _sleep(0.1)
-                while all([not self.motor_stopped(5),
-                           not self.motor_stopped(6)]):
-                    _sleep(0.1)
-                _time.sleep(interval)
+                if self.wait_motion_done([5, 6], settle=interval,
+                                         distance=_np.abs(steps).max(),
+                                         dwell=interval)['aborted']:
+                    return False
                 p_list = self.read_motor_pos([7, 8])
                 p_sign = _np.sign(p_list)
                 sign_changed = not all(_np.equal(p_sign, p_sign_init))
@@ -331,11 +1011,10 @@ class Ppmac(Ppmac_eth):
                         sign_changed]):
                     steps = _np.array([bck_stps, -1*bck_stps]) - 1*sf*p_list
                     self.write('#5j^{0};#6j^{1}'.format(steps[0], steps[1]))
-                    _sleep(0.1)
-                    while all([not self.motor_stopped(5),
-                               not self.motor_stopped(6)]):
-                        _sleep(0.1)
-                    _sleep(3)
+                    if self.wait_motion_done([5, 6], settle=3,
+                                             distance=_np.abs(steps).max(),
+                                             dwell=3)['aborted']:
+                        return False
                     p_list = self.read_motor_pos([7, 8])
                     p_sign_init = _np.sign(p_list)
 
@@ -16,12 +16,29 @@ from qtpy.QtCore import Qt as _Qt
 import qtpy.uic as _uic
 
 import flipcoil.data as _data
+from flipcoil.analysis.ambient import AmbientMemo as _AmbientMemo
+from flipcoil.analysis.cache import AnalysisCache as _AnalysisCache
+from flipcoil.analysis.firstintegral import (
+    FC_WINDOW as _FC_WINDOW,
+    SW_WINDOW as _SW_WINDOW,
+    FirstIntegralResult as _FirstIntegralResult,
+    first_integral as _first_integral,
+    first_integral_sw as _first_integral_sw,
+    subtract_ambient as _subtract_ambient,
+    )
 from flipcoil.gui.utils import (
+    ANALYSIS_CACHE_SIZE as _ANALYSIS_CACHE_SIZE,
+    ANALYSIS_CHUNK_SIZE as _ANALYSIS_CHUNK_SIZE,
     get_ui_file as _get_ui_file,
     sleep as _sleep,
     update_db_name_list as _update_db_name_list,
     )
 
+from flipcoil.gui.plotting import (
+    LinePlot as _LinePlot,
+    column_traces as _column_traces,
+    paired_traces as _paired_traces,
+    )
 from flipcoil.gui.viewcfgwidget import ViewCfgWidget as _ViewCfgWidget
 
 import matplotlib
@@ -60,12 +77,18 @@ class AnalysisWidget(_QWidget):
         self.meas_fc = _data.measurement.MeasurementData()
         self.meas_sw = _data.measurement.MeasurementDataSW()
 
-        self.amb_cfg = _data.configuration.MeasurementConfig()
         self.amb_meas_fc = _data.measurement.MeasurementData()
         self.amb_meas_sw = _data.measurement.MeasurementDataSW()
 
         self.meas = self.meas_sw
         self.amb_meas = self.amb_meas_sw
+        self.result = None
+        # detects the flux step window instead of the fixed sample indexes
+        self.auto_window = False
+        self.meas_ids = {}
+        self.amb_memo_fc = _AmbientMemo(self.amb_meas_fc)
+        self.amb_memo_sw = _AmbientMemo(self.amb_meas_sw)
+        self.cache = _AnalysisCache(max_bytes=_ANALYSIS_CACHE_SIZE*2**20)
         self.plot = self.plot_sw
 
         self.connect_signal_slots()
@@ -99,8 +122,8 @@ class AnalysisWidget(_QWidget):
         self.ui.cmb_meas_name.currentIndexChanged.connect(
             self.load_measurement)
         self.ui.pbt_load_meas.clicked.connect(self.load_measurement)
-        self.ui.cmb_plot.currentIndexChanged.connect(self.plot)
-        self.ui.pbt_update.clicked.connect(self.update_meas_list)
+        self.ui.cmb_plot.currentIndexChanged.connect(self.update_plot)
+        self.ui.pbt_update.clicked.connect(self.refresh_meas_list)
         self.ui.pbt_viewcfg.clicked.connect(self.view_cfg)
         self.ui.rdb_sw.clicked.connect(self.change_meas_mode)
         self.ui.rdb_fc.clicked.connect(self.change_meas_mode)
@@ -143,6 +166,7 @@ class AnalysisWidget(_QWidget):
         """Configures plot widget"""
         self.canvas = MplCanvas(self, width=5, height=4, dpi=100)
         _toolbar = _NavigationToolbar(self.canvas, self)
+        self.line_plot = _LinePlot(self.canvas, _toolbar)
 
         _layout = _QVBoxLayout()
         _layout.addWidget(self.canvas)
@@ -153,6 +177,7 @@ class AnalysisWidget(_QWidget):
     def update_meas_list(self):
         """Update measurement list in combobox."""
         try:
+            self.meas_ids.clear()
             self.ui.cmb_meas_name.currentIndexChanged.disconnect()
             _update_db_name_list(self.meas, self.ui.cmb_meas_name)
             self.ui.cmb_meas_name.currentIndexChanged.connect(
@@ -160,43 +185,129 @@ class AnalysisWidget(_QWidget):
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
 
+    def refresh_meas_list(self):
+        """Discards cached results and updates the measurement list."""
+        # records may have been changed (e.g. reprocessed)
+        self.cache.invalidate()
+        self.amb_memo_fc.invalidate()
+        self.amb_memo_sw.invalidate()
+        self.update_meas_list()
+
+    def analysis_params(self):
+        """Returns the analysis parameters used in the cache keys."""
+        return {'sw': self.ui.rdb_sw.isChecked(),
+                'window': self.window_param()}
+
+    def window_param(self):
+        """Returns the window argument of the analysis functions."""
+        if self.auto_window:
+            return 'auto'
+        if self.ui.rdb_sw.isChecked():
+            return _SW_WINDOW
+        return _FC_WINDOW
+
+    def get_meas_id(self):
+        """Returns the database id of the selected measurement."""
+        meas_name = self.ui.cmb_meas_name.currentText()
+        meas_cmb_idx = self.ui.cmb_meas_name.currentIndex()
+        _key = (self.meas.collection_name, meas_name, meas_cmb_idx)
+        if _key in self.meas_ids:
+            return self.meas_ids[_key]
+
+        meas_list = []
+        for i in range(self.ui.cmb_meas_name.count()):
+            meas_list.append(self.ui.cmb_meas_name.itemText(i))
+        if all([meas_list.count(meas_name) > 1,
+                meas_cmb_idx > 0]):
+            idx = -1
+            for i in range(len(meas_list)):
+                if meas_name == meas_list[i]:
+                    idx += 1
+        else:
+            idx = 0
+        _id = self.meas.db_search_field('name', meas_name)[idx]['id']
+        self.meas_ids[_key] = _id
+        return _id
+
+    def cache_snapshot(self):
+        """Returns the current measurement state to be cached."""
+        _snapshot = {
+            'meas': {attr: getattr(self.meas, attr, None) for attr in
+                     list(self.meas.db_dict) + _FirstIntegralResult.fields},
+            'result': self.result,
+            }
+        if not self.ui.rdb_sw.isChecked():
+            _snapshot['cfg'] = {attr: getattr(self.cfg, attr, None)
+                                for attr in self.cfg.db_dict}
+        return _snapshot
+
+    def cache_restore(self, snapshot):
+        """Restores a cached measurement state."""
+        for attr, value in snapshot['meas'].items():
+            setattr(self.meas, attr, value)
+        for attr, value in snapshot.get('cfg', {}).items():
+            setattr(self.cfg, attr, value)
+        self.result = snapshot['result']
+        if self.ui.rdb_sw.isChecked():
+            self.show_ambient_field(self.result, index=0)
+        else:
+            self.show_ambient_field(self.result)
+
+    def cache_result(self, record, result):
+        """Caches a measurement analysed during the acquisition.
+
+        Args:
+            record (dict): saved measurement (see Sequencer.saved_record);
+            result (FirstIntegralResult): acquisition results.
+
+        Returns:
+            True if the result was cached;
+            False if it does not match the analysis mode and window.
+        """
+        if any([record['collection_name'] != self.meas.collection_name,
+                record['window'] != self.window_param()]):
+            return False
+        _key = self.cache.make_key(record['collection_name'], record['idn'],
+                                   self.analysis_params())
+        _snapshot = {'meas': dict(record['meas']), 'result': result}
+        if not self.ui.rdb_sw.isChecked() and 'cfg' in record:
+            _snapshot['cfg'] = dict(record['cfg'])
+        return self.cache.put(_key, _snapshot,
+                              amb_idn=record['meas'].get('Iamb_id'))
+
     def load_measurement(self):
         """Loads selected measurement from database."""
         try:
-            if self.ui.rdb_sw.isChecked():
-                _first_integral_calculus = self.first_integral_calculus_sw
-            else:
-                _first_integral_calculus = self.first_integral_calculus
+            if not self.ui.rdb_sw.isChecked():
                 self.cfg.db_update_database(
                     self.database_name,
                     mongo=self.mongo, server=self.server)
             self.meas.db_update_database(
                 self.database_name,
                 mongo=self.mongo, server=self.server)
-            meas_list = []
-            for i in range(self.ui.cmb_meas_name.count()):
-                meas_list.append(self.ui.cmb_meas_name.itemText(i))
-            meas_name = self.ui.cmb_meas_name.currentText()
-            meas_cmb_idx = self.ui.cmb_meas_name.currentIndex()
-            if all([meas_list.count(meas_name) > 1,
-                    meas_cmb_idx > 0]):
-                idx = -1
-                for i in range(len(meas_list)):
-                    if meas_name == meas_list[i]:
-                        idx += 1
+
+            _id = self.get_meas_id()
+            _key = self.cache.make_key(self.meas.collection_name, _id,
+                                       self.analysis_params())
+            _snapshot = self.cache.get(_key)
+            if _snapshot is not None:
+                self.cache_restore(_snapshot)
             else:
-                idx = 0
-            _id = self.meas.db_search_field('name', meas_name)[idx]['id']
-            self.meas.db_read(_id)
-            self.ui.le_comments.setText(self.meas.comments)
+                self.meas.db_read(_id)
+                if self.ui.rdb_sw.isChecked():
+                    _meas = self.first_integral_calculus_sw(self.meas)
+                else:
+                    self.cfg.db_read(self.meas.cfg_id)
+                    _meas = self.first_integral_calculus(
+                        cfg=self.cfg, meas=self.meas)
+                if _meas is not None:
+                    self.cache.put(_key, self.cache_snapshot(),
+                                   amb_idn=self.meas.Iamb_id)
 
+            self.ui.le_comments.setText(self.meas.comments)
             if self.ui.rdb_sw.isChecked():
-                self.first_integral_calculus_sw(self.meas)
                 self.ui.le_cfg_name.setText('')
             else:
-                self.cfg.db_read(self.meas.cfg_id)
-                self.first_integral_calculus(cfg=self.cfg, meas=self.meas)
-
                 cfg_name = self.cfg.name + ' / ' + str(self.cfg.idn)
                 self.ui.le_cfg_name.setText(cfg_name)
 
@@ -224,327 +335,176 @@ class AnalysisWidget(_QWidget):
             self.plot = self.plot_fc
             self.amb_meas = self.amb_meas_fc
 
-        self.ui.cmb_plot.currentIndexChanged.connect(self.plot)
         self.update_meas_list()
 
-    def first_integral_calculus(self, cfg, meas, fdi_mode=False):
+    def update_plot(self):
+        """Plots the selected view of the current measurement mode."""
+        self.plot()
+
+    def first_integral_calculus(self, cfg, meas, fdi_mode=False,
+                                result=None):
         """Calculates first field integral from raw data.
 
         Args:
             cfg (MeasurementConfig): measurement configuration;
-            meas (MeasurementData): measurement data.
+            meas (MeasurementData): measurement data;
+            result (FirstIntegralResult): results already calculated during
+                the acquisition (None calculates them from meas).
 
         Returns:
             MeaseurementData instance if the calculations were successfull;
             None otherwise
         """
         try:
-            # _width = 12.5e-3  # [m]
-            _width = cfg.width
-            _turns = cfg.turns  # number of coil turns
-            _dt = cfg.nplc/60
-            # I = flux/(2*N*width)
-            if not fdi_mode:
-                for i in range(meas.data_frw.shape[1]):
-                    _offset_f = meas.data_frw[:40, i].mean()
-                    _offset_b = meas.data_bck[:40, i].mean()
-                    _f_f = _np.array([0])
-                    _f_b = _np.array([0])
-                    for idx in range(meas.data_frw[:, i].shape[0]-1):
-                        # dv = ((v[i+1] - v[i])/2)/0.05
-                        # f = np.append(f, f[i]+dv)
-                        _f_f_part = meas.data_frw[:idx, i] - _offset_f
-                        _f_b_part = meas.data_bck[:idx, i] - _offset_b
-                        _f_f = _np.append(_f_f, _np.trapz(_f_f_part, dx=_dt))
-                        _f_b = _np.append(_f_b, _np.trapz(_f_b_part, dx=_dt))
-                    if i == 0:
-                        meas.flx_f = _f_f
-                        meas.flx_b = _f_b
-                    else:
-                        meas.flx_f = _np.vstack([meas.flx_f, _f_f])
-                        meas.flx_b = _np.vstack([meas.flx_b, _f_b])
-                meas.flx_f = meas.flx_f.transpose()
-                meas.flx_b = meas.flx_b.transpose()
+            if result is None:
+                _result = _first_integral(
+                    cfg, meas, fdi_mode=fdi_mode, window=self.window_param())
             else:
-                meas.flx_f = _np.copy(meas.data_frw)
-                meas.flx_b = _np.copy(meas.data_bck)
-
-            meas.I_f = meas.flx_f * 1/(2*_turns*_width)
-            meas.I_b = meas.flx_b * 1/(2*_turns*_width)
-            meas.I = (meas.flx_f - meas.flx_b)/2 * 1/(2*_turns*_width)
-
-            meas.If = meas.I_f[61, :] - meas.I_f[40, :]
-            meas.If_std = meas.If.std()
-
-            meas.Ib = meas.I_b[61, :] - meas.I_b[40, :]
-            meas.Ib_std = meas.Ib.std()
-
-            meas.I_mean = (meas.If.mean() - meas.Ib.mean())/2
-            meas.I_std = 1/2*(meas.If_std**2 + meas.Ib_std**2)**0.5
+                _result = result
 
             if meas.Iamb_id > 0:
-                self.amb_cfg.db_update_database(
-                    self.database_name,
-                    mongo=self.mongo, server=self.server)
-                self.amb_meas.db_update_database(
+                self.amb_meas_fc.db_update_database(
                     self.database_name,
                     mongo=self.mongo, server=self.server)
+                _subtract_ambient(
+                    _result, self.amb_memo_fc.get(meas.Iamb_id))
 
-                self.ambient_field_calculus(meas)
-            else:
-                self.ui.le_Imeas.setText('')
-                self.ui.le_Iamb.setText('')
-                self.ui.le_Iamb_name.setText('')
-
-            return meas
+            self.result = _result
+            self.show_ambient_field(_result)
+            return _result.apply(meas)
 
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
             return None
 
-    def first_integral_calculus_sw(self, meas):
+    def first_integral_calculus_sw(self, meas, result=None):
         """Calculates first field integral from stretched wire raw data.
 
         Args:
-            cfg (MeasurementConfig): measurement configuration;
-            meas (MeasurementData): measurement data.
+            meas (MeasurementDataSW): measurement data;
+            result (FirstIntegralResult): results already calculated during
+                the acquisition (None calculates them from meas).
 
         Returns:
-            MeaseurementData instance if the calculations were successfull;
+            MeaseurementDataSW instance if the calculations were successfull;
             None otherwise
         """
         try:
-            # _width = 12.5e-3  # [m]
-            _step = meas.step*1e-3  # [m]
-            _turns = meas.turns  # number of coil turns
-            _dt = meas.nplc/60
-
-            shape = meas.data_frw.shape
-
-            meas.flx_f = _np.zeros(shape)
-            meas.flx_b = _np.zeros(shape)
-            # I = flux/step
-
-            # data[i, j, k]
-            # i: position index
-            # j: measurement voltage array index
-            # k: measurement number index
-            for i in range(shape[0]):
-                pos = meas.transversal_pos[i]
-#                 _offset_f = meas.data_frw[:40, i].mean()
-#                 _offset_b = meas.data_bck[:40, i].mean()
-
-                for k in range(shape[2]):
-                    _f_f = _np.array([])
-                    _f_b = _np.array([])
-                    for idx in range(shape[1]):
-                        # dv = ((v[i+1] - v[i])/2)/0.05
-                        # f = np.append(f, f[i]+dv)
-                        _f_f_part = meas.data_frw[i, :idx, k]  # - _offset_f
-                        _f_b_part = meas.data_bck[i, :idx, k]  # - _offset_b
-                        _f_f = _np.append(_f_f, _np.trapz(_f_f_part, dx=_dt))
-                        _f_b = _np.append(_f_b, _np.trapz(_f_b_part, dx=_dt))
-                    if k == 0:
-                        flx_f = _f_f
-                        flx_b = _f_b
-                    else:
-                        flx_f = _np.vstack([flx_f, _f_f])
-                        flx_b = _np.vstack([flx_b, _f_b])
-                meas.flx_f[i] = flx_f.transpose()
-                meas.flx_b[i] = flx_b.transpose()
-
-            meas.I_f = meas.flx_f / (_turns * _step)
-            meas.I_b = meas.flx_b / (_turns * _step)
-            meas.I = (meas.I_f - meas.I_b) / 2
-
-            meas.If = _np.zeros([shape[0], shape[2]])
-            meas.If_std = _np.zeros(shape[0])
-            meas.Ib = _np.zeros([shape[0], shape[2]])
-            meas.Ib_std = _np.zeros(shape[0])
-            meas.I_mean = _np.zeros(shape[0])
-            meas.I_std = _np.zeros(shape[0])
-
-            for i in range(shape[0]):
-                meas.If[i] = meas.I_f[i, 61, :] - meas.I_f[i, 27, :]
-                meas.If_std[i] = meas.If[i].std()
-
-                meas.Ib[i] = meas.I_b[i, 61, :] - meas.I_b[i, 27, :]
-                meas.Ib_std[i] = meas.Ib[i].std()
-
-                meas.I_mean[i] = (meas.If[i].mean() - meas.Ib[i].mean())/2
-                meas.I_std[i] = 1/2 * (meas.If_std[i]**2 + meas.Ib_std[i]**2)**0.5
+            if result is None:
+                _result = _first_integral_sw(
+                    meas, window=self.window_param(),
+                    chunk_size=_ANALYSIS_CHUNK_SIZE)
+            else:
+                _result = result
 
             if meas.Iamb_id > 0:
-                self.amb_meas.db_update_database(
+                self.amb_meas_sw.db_update_database(
                     self.database_name,
                     mongo=self.mongo, server=self.server)
-#
-                self.ambient_field_calculus_sw(meas)
-#             else:
-#                 self.ui.le_Imeas.setText('')
-#                 self.ui.le_Iamb.setText('')
-#                 self.ui.le_Iamb_name.setText('')
-#
-#             return meas
+                _subtract_ambient(
+                    _result, self.amb_memo_sw.get(meas.Iamb_id))
 
-        except Exception:
-            _traceback.print_exc(file=_sys.stdout)
-            return None
-
-    def ambient_field_calculus(self, meas):
-        """Discounts ambient field from measurement and prints results."""
-        try:
-            self.amb_meas.db_read(meas.Iamb_id)
-            self.amb_cfg.db_read(self.amb_meas.cfg_id)
-            _result = '{:.2f} +/- {:.2f}'.format(meas.I_mean*10**6,
-                                                 meas.I_std*10**6)
+            self.result = _result
+            self.show_ambient_field(_result, index=0)
+            return _result.apply(meas)
 
-            meas.I_mean = meas.I_mean - self.amb_meas.I_mean
-            meas.I_std = (meas.I_std**2 + self.amb_meas.I_std**2)**0.5
-
-            _result1 = '{:.2f} +/- {:.2f}'.format(self.amb_meas.I_mean*10**6,
-                                                  self.amb_meas.I_std*10**6)
-            _amb_name = self.amb_meas.name + ' / ' + str(self.amb_meas.idn)
-
-            self.ui.le_Imeas.setText(_result)
-            self.ui.le_Iamb.setText(_result1)
-            self.ui.le_Iamb_name.setText(_amb_name)
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
             return None
 
-    def ambient_field_calculus_sw(self, meas):
-        """Discounts ambient field from measurement and prints results."""
-        try:
-            self.amb_meas.db_read(meas.Iamb_id)
-            _result = '{:.2f} +/- {:.2f}'.format(meas.I_mean[0]*10**6,
-                                                 meas.I_std[0]*10**6)
-
-            meas.I_mean = meas.I_mean - self.amb_meas.I_mean
-            meas.I_std = (meas.I_std**2 + self.amb_meas.I_std**2)**0.5
+    def show_ambient_field(self, result, index=None):
+        """Prints measured and ambient field results.
 
-            _result1 = '{:.2f} +/- {:.2f}'.format(self.amb_meas.I_mean[0]*10**6,
-                                                  self.amb_meas.I_std[0]*10**6)
-            _amb_name = self.amb_meas.name + ' / ' + str(self.amb_meas.idn)
+        Args:
+            result (FirstIntegralResult): analysis results;
+            index (int): position index for stretched wire results.
+        """
+        try:
+            if result.amb_idn == 0:
+                self.ui.le_Imeas.setText('')
+                self.ui.le_Iamb.setText('')
+                self.ui.le_Iamb_name.setText('')
+                return
+
+            _values = [result.I_mean_meas, result.I_std_meas,
+                       result.amb_I_mean, result.amb_I_std]
+            if index is not None:
+                _values = [val[index] for val in _values]
+            _result = '{:.2f} +/- {:.2f}'.format(_values[0]*10**6,
+                                                 _values[1]*10**6)
+            _result1 = '{:.2f} +/- {:.2f}'.format(_values[2]*10**6,
+                                                  _values[3]*10**6)
+            _amb_name = result.amb_name + ' / ' + str(result.amb_idn)
 
             self.ui.le_Imeas.setText(_result)
             self.ui.le_Iamb.setText(_result1)
             self.ui.le_Iamb_name.setText(_amb_name)
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
-            return None
 
     def plot_sw(self):
-        """Plots measurement data.
-
-        Args:
-            plot_from_measurementwidget (bool): flag indicating wether to get
-            measruement data and configurations from measuerement widget (if
-            True) or analysis widget (if False, default)."""
+        """Plots stretched wire measurement data (first position)."""
         try:
             _meas = self.meas_sw
             _dt = _meas.nplc/60
 
             _t = _np.linspace(0, _meas.duration, _meas.I.shape[1])
 
-            self.canvas.axes.cla()
-            if self.ui.cmb_plot.currentText() == 'Integrated Field Result':
-                for k in range(_meas.I.shape[2]):
-                    self.canvas.axes.plot(_t, _meas.I[0, :, k], label=str(k))
-                self.canvas.axes.set_xlabel('Time [s]')
-                self.canvas.axes.set_ylabel('First Field Integral [T.m]')
-
-            elif self.ui.cmb_plot.currentText() == 'Forward Results':
-                for k in range(_meas.I_f.shape[2]):
-                    _color = 'C' + str(k)
-                    self.canvas.axes.plot(_t, _meas.I_f[0, :, k], _color + '-',
-                                          label=str(k))
-                self.canvas.axes.set_xlabel('Time [s]')
-                self.canvas.axes.set_ylabel('First Field Integral [T.m]')
-
-            elif self.ui.cmb_plot.currentText() == 'Backward Results':
-                for k in range(_meas.I_b.shape[2]):
-                    _color = 'C' + str(k)
-                    self.canvas.axes.plot(_t, _meas.I_b[0, :, k], _color + '-',
-                                          label=str(k))
-                self.canvas.axes.set_xlabel('Time [s]')
-                self.canvas.axes.set_ylabel('First Field Integral [T.m]')
-
-            elif self.ui.cmb_plot.currentText() == 'Forward/Backward Results':
-                for k in range(_meas.I_f.shape[2]):
-                    _color = 'C' + str(k)
-                    self.canvas.axes.plot(_t, _meas.I_f[0, :, k], _color + '-',
-                                          label=str(k))
-                    self.canvas.axes.plot(_t, _meas.I_b[0, :, k], _color + '--')
-                self.canvas.axes.set_xlabel('Time [s]')
-                self.canvas.axes.set_ylabel('First Field Integral [T.m]')
-
-            elif self.ui.cmb_plot.currentText() == 'Forward Voltage':
-                for k in range(_meas.data_frw.shape[2]):
-                    _color = 'C' + str(k)
-                    self.canvas.axes.plot(_t, _meas.data_frw[0, :, k],
-                                          _color + '-', label=str(k))
-                    _std = _meas.data_frw[0, :, k].std()
-                    _min = _meas.data_frw[0, :, k].min()
-                    _max = _meas.data_frw[0, :, k].max()
-                    _vpp = _max - _min
-                    print('M{0} std={1:.2E}, min={2:.2E}, '
-                          'max={3:.2E}, Vpp={4:.2E}'.format(k, _std, _min,
-                                                            _max, _vpp))
-                self.canvas.axes.set_xlabel('Time [s]')
-                self.canvas.axes.set_ylabel('Voltage [V]')
-
-            elif self.ui.cmb_plot.currentText() == 'Backward Voltage':
-                for k in range(_meas.data_bck.shape[2]):
-                    _color = 'C' + str(k)
-                    self.canvas.axes.plot(_t, _meas.data_bck[0, :, k],
-                                          _color + '-', label=str(k))
-                    _std = _meas.data_bck[0, :, k].std()
-                    _min = _meas.data_bck[0, :, k].min()
-                    _max = _meas.data_bck[0, :, k].max()
-                    _vpp = _max - _min
+            _plot = self.ui.cmb_plot.currentText()
+            _xlabel = 'Time [s]'
+            _traces = []
+            if _plot == 'Integrated Field Result':
+                _traces = _column_traces(_t, _meas.I[0])
+                _ylabel = 'First Field Integral [T.m]'
+
+            elif _plot == 'Forward Results':
+                _traces = _column_traces(_t, _meas.I_f[0])
+                _ylabel = 'First Field Integral [T.m]'
+
+            elif _plot == 'Backward Results':
+                _traces = _column_traces(_t, _meas.I_b[0])
+                _ylabel = 'First Field Integral [T.m]'
+
+            elif _plot == 'Forward/Backward Results':
+                _traces = _paired_traces(_t, _meas.I_f[0], _meas.I_b[0])
+                _ylabel = 'First Field Integral [T.m]'
+
+            elif _plot in ['Forward Voltage', 'Backward Voltage']:
+                if _plot == 'Forward Voltage':
+                    _data = _meas.data_frw[0]
+                else:
+                    _data = _meas.data_bck[0]
+                _traces = _column_traces(_t, _data)
+                _ylabel = 'Voltage [V]'
+                _std = _data.std(axis=0)
+                _min = _data.min(axis=0)
+                _max = _data.max(axis=0)
+                for k in range(_data.shape[1]):
                     print('M{0} std={1:.2E}, min={2:.2E}, '
-                          'max={3:.2E}, Vpp={4:.2E}'.format(k, _std, _min,
-                                                            _max, _vpp))
-                self.canvas.axes.set_xlabel('Time [s]')
-                self.canvas.axes.set_ylabel('Voltage [V]')
-
-            elif self.ui.cmb_plot.currentText() == 'Forward/Backward Voltage':
-                for k in range(_meas.data_frw.shape[2]):
-                    _color = 'C' + str(k)
-                    self.canvas.axes.plot(_t, _meas.data_frw[0, :, k],
-                                          _color + '-', label=str(k))
-                    self.canvas.axes.plot(_t, _meas.data_bck[0, :, k],
-                                          _color + '--')
-                self.canvas.axes.set_xlabel('Time [s]')
-                self.canvas.axes.set_ylabel('Voltage [V]')
-
-            elif self.ui.cmb_plot.currentText() == 'Forward Voltage FFT':
-                for k in range(_meas.data_frw.shape[2]):
-                    _color = 'C' + str(k)
-                    n = _meas.data_frw.shape[1]
-                    fft = _np.fft.fft(_meas.data_frw[0, :, k])*2/n
-                    freq = _np.fft.fftfreq(n, _dt)
-                    self.canvas.axes.plot(freq[:n//2], _np.real(fft[:n//2]),
-                                          _color + '-', label=str(k))
-                self.canvas.axes.set_xlabel('Frequency [Hz]')
-                self.canvas.axes.set_ylabel('Amplitude [V]')
-
-            elif self.ui.cmb_plot.currentText() == 'Backward Voltage FFT':
-                for k in range(_meas.data_bck.shape[2]):
-                    _color = 'C' + str(k)
-                    n = _meas.data_bck.shape[1]
-                    fft = _np.fft.fft(_meas.data_bck[0, :, k])*2/n
-                    freq = _np.fft.fftfreq(n, _dt)
-                    self.canvas.axes.plot(freq[:n//2], _np.real(fft[:n//2]),
-                                          _color + '-', label=str(k))
-                self.canvas.axes.set_xlabel('Frequency [Hz]')
-                self.canvas.axes.set_ylabel('Amplitude [V]')
-
-            self.canvas.axes.grid(1)
-            self.canvas.axes.legend()
-            self.canvas.figure.tight_layout()
-            self.canvas.draw()
+                          'max={3:.2E}, Vpp={4:.2E}'.format(
+                              k, _std[k], _min[k], _max[k],
+                              _max[k] - _min[k]))
+
+            elif _plot == 'Forward/Backward Voltage':
+                _traces = _paired_traces(_t, _meas.data_frw[0],
+                                         _meas.data_bck[0])
+                _ylabel = 'Voltage [V]'
+
+            elif _plot in ['Forward Voltage FFT', 'Backward Voltage FFT']:
+                if _plot == 'Forward Voltage FFT':
+                    _data = _meas.data_frw[0]
+                else:
+                    _data = _meas.data_bck[0]
+                n = _data.shape[0]
+                fft = _np.fft.fft(_data, axis=0)*2/n
+                freq = _np.fft.fftfreq(n, _dt)
+                _traces = _column_traces(freq[:n//2],
+                                         _np.real(fft[:n//2]))
+                _xlabel = 'Frequency [Hz]'
+                _ylabel = 'Amplitude [V]'
+
+            if len(_traces) > 0:
+                self.line_plot.update(_traces, _xlabel, _ylabel)
 
             _result = '{:.2f} +/- {:.2f}'.format(_meas.I_mean[0]*10**6,
                                                  _meas.I_std[0]*10**6)
@@ -559,88 +519,47 @@ class AnalysisWidget(_QWidget):
             _traceback.print_exc(file=_sys.stdout)
 
     def plot_fc(self):
-        """Plots measurement data.
-
-        Args:
-            plot_from_measurementwidget (bool): flag indicating wether to get
-            measruement data and configurations from measuerement widget (if
-            True) or analysis widget (if False, default)."""
+        """Plots flip coil measurement data."""
         try:
-#             if plot_from_measurementwidget:
-#                 _meas = self.parent_window.measurement.meas
-#                 _cfg = self.parent_window.measurement.cfg
-#             else:
             _meas = self.meas
             _cfg = self.cfg
             _dt = _cfg.nplc/60
 
-#             if sw:
-#                 _t = _np.linspace(0, _cfg.duration, _meas.I.shape[1])
-#             else:
-            _t = _np.linspace(0, _cfg.duration, _meas.I.shape[0])
-
-            self.canvas.axes.cla()
-            if self.ui.cmb_plot.currentText() == 'Integrated Field Result':
-                for i in range(_meas.I.shape[1]):
-#                     if sw:
-#                         self.canvas.axes.plot(_t, _meas.I[0, :, i], label=str(i))
-#                     else:
-                    self.canvas.axes.plot(_t, _meas.I[:, i], label=str(i))
-                self.canvas.axes.set_xlabel('Time [s]')
-                self.canvas.axes.set_ylabel('First Field Integral [T.m]')
-
-            elif self.ui.cmb_plot.currentText() == 'Forward Results':
-                for i in range(_meas.I_f.shape[1]):
-                    _color = 'C' + str(i)
-                    self.canvas.axes.plot(_t, _meas.I_f[:, i], _color + '-',
-                                          label=str(i))
-                self.canvas.axes.set_xlabel('Time [s]')
-                self.canvas.axes.set_ylabel('First Field Integral [T.m]')
-
-            elif self.ui.cmb_plot.currentText() == 'Backward Results':
-                for i in range(_meas.I_b.shape[1]):
-                    _color = 'C' + str(i)
-                    self.canvas.axes.plot(_t, _meas.I_b[:, i], _color + '-',
-                                          label=str(i))
-                self.canvas.axes.set_xlabel('Time [s]')
-                self.canvas.axes.set_ylabel('First Field Integral [T.m]')
-
-            elif self.ui.cmb_plot.currentText() == 'Forward/Backward Results':
-                for i in range(_meas.I_f.shape[1]):
-                    _color = 'C' + str(i)
-                    self.canvas.axes.plot(_t, _meas.I_f[:, i], _color + '-',
-                                          label=str(i))
-                    self.canvas.axes.plot(_t, _meas.I_b[:, i], _color + '--')
-                self.canvas.axes.set_xlabel('Time [s]')
-                self.canvas.axes.set_ylabel('First Field Integral [T.m]')
-
-            elif self.ui.cmb_plot.currentText() == 'Forward Voltage':
-                for i in range(_meas.data_frw.shape[1]):
-                    _color = 'C' + str(i)
-                    self.canvas.axes.plot(_t, _meas.data_frw[:, i],
-                                          _color + '-', label=str(i))
-                self.canvas.axes.set_xlabel('Time [s]')
-                self.canvas.axes.set_ylabel('Voltage [V]')
-
-            elif self.ui.cmb_plot.currentText() == 'Backward Voltage':
-                for i in range(_meas.data_bck.shape[1]):
-                    _color = 'C' + str(i)
-                    self.canvas.axes.plot(_t, _meas.data_bck[:, i],
-                                          _color + '-', label=str(i))
-                self.canvas.axes.set_xlabel('Time [s]')
-                self.canvas.axes.set_ylabel('Voltage [V]')
-
-            elif self.ui.cmb_plot.currentText() == 'Forward/Backward Voltage':
-                for i in range(_meas.data_frw.shape[1]):
-                    _color = 'C' + str(i)
-                    self.canvas.axes.plot(_t, _meas.data_frw[:, i],
-                                          _color + '-', label=str(i))
-                    self.canvas.axes.plot(_t, _meas.data_bck[:, i],
-                                          _color + '--')
-                self.canvas.axes.set_xlabel('Time [s]')
-                self.canvas.axes.set_ylabel('Voltage [V]')
-
-            elif self.ui.cmb_plot.currentText() == 'Positioning Error':
+            # records may be shorter than the configured duration
+            _t = _np.arange(_meas.I.shape[0])*_dt
+
+            _plot = self.ui.cmb_plot.currentText()
+            _xlabel = 'Time [s]'
+            _traces = []
+            if _plot == 'Integrated Field Result':
+                _traces = _column_traces(_t, _meas.I)
+                _ylabel = 'First Field Integral [T.m]'
+
+            elif _plot == 'Forward Results':
+                _traces = _column_traces(_t, _meas.I_f)
+                _ylabel = 'First Field Integral [T.m]'
+
+            elif _plot == 'Backward Results':
+                _traces = _column_traces(_t, _meas.I_b)
+                _ylabel = 'First Field Integral [T.m]'
+
+            elif _plot == 'Forward/Backward Results':
+                _traces = _paired_traces(_t, _meas.I_f, _meas.I_b)
+                _ylabel = 'First Field Integral [T.m]'
+
+            elif _plot == 'Forward Voltage':
+                _traces = _column_traces(_t, _meas.data_frw)
+                _ylabel = 'Voltage [V]'
+
+            elif _plot == 'Backward Voltage':
+                _traces = _column_traces(_t, _meas.data_bck)
+                _ylabel = 'Voltage [V]'
+
+            elif _plot == 'Forward/Backward Voltage':
+                _traces = _paired_traces(_t, _meas.data_frw, _meas.data_bck)
+                _ylabel = 'Voltage [V]'
+
+            elif _plot == 'Positioning Error':
                 _dir = 'forward'
                 if _dir == 'forward':
                     p0 = 0
@@ -662,28 +581,34 @@ class AnalysisWidget(_QWidget):
 #                 pos7f = np.array([-90000, -270000])
 #                 pos8f = np.array([90000, 270000])
 
-                self.canvas.axes.plot(p0 - _meas.pos7f[0, :], label='ErA+i')
-                self.canvas.axes.plot(p1 - _meas.pos7f[1, :], label='ErA+f')
-                self.canvas.axes.plot(p1 - _meas.pos7b[0, :],
-                                      '--', label='ErA-i')
-                self.canvas.axes.plot(p0 - _meas.pos7b[1, :],
-                                      '--', label='ErA-f')
-                self.canvas.axes.plot(p0 - _meas.pos8f[0, :], label='ErB+i')
-                self.canvas.axes.plot(-1*p1 - _meas.pos8f[1, :], label='ErB+f')
-                self.canvas.axes.plot(-1*p1 - _meas.pos8b[0, :],
-                                      '--', label='ErB-i')
-                self.canvas.axes.plot(p0 - _meas.pos8b[1, :],
-                                      '--', label='ErB-f')
+                _n = _np.arange(_meas.pos7f.shape[1])
+                _errors = [
+                    (p0 - _meas.pos7f[0, :], '-', 'ErA+i'),
+                    (p1 - _meas.pos7f[1, :], '-', 'ErA+f'),
+                    (p1 - _meas.pos7b[0, :], '--', 'ErA-i'),
+                    (p0 - _meas.pos7b[1, :], '--', 'ErA-f'),
+                    (p0 - _meas.pos8f[0, :], '-', 'ErB+i'),
+                    (-1*p1 - _meas.pos8f[1, :], '-', 'ErB+f'),
+                    (-1*p1 - _meas.pos8b[0, :], '--', 'ErB-i'),
+                    (p0 - _meas.pos8b[1, :], '--', 'ErB-f'),
+                    ]
+                _traces = [{'x': _n, 'y': _err, 'color': 'C' + str(k),
+                            'linestyle': _style, 'label': _label}
+                           for k, (_err, _style, _label) in enumerate(
+                               _errors)]
                 _error_lim = 57*_np.ones(_meas.pos7f.shape[1])
-                self.canvas.axes.plot(_error_lim, 'k--')
-                self.canvas.axes.plot(-1*_error_lim, 'k--')
-                self.canvas.axes.set_xlabel('Measurement #')
-                self.canvas.axes.set_ylabel('Position Error [mdeg]')
+                _traces.extend([
+                    {'x': _n, 'y': _error_lim, 'color': 'k',
+                     'linestyle': '--'},
+                    {'x': _n, 'y': -1*_error_lim, 'color': 'k',
+                     'linestyle': '--'},
+                    ])
+                _xlabel = 'Measurement #'
+                _ylabel = 'Position Error [mdeg]'
 #                 plt.title('Coil Position Error')
-            self.canvas.axes.grid(1)
-            self.canvas.axes.legend()
-            self.canvas.figure.tight_layout()
-            self.canvas.draw()
+
+            if len(_traces) > 0:
+                self.line_plot.update(_traces, _xlabel, _ylabel)
 
             _result = '{:.2f} +/- {:.2f}'.format(_meas.I_mean*10**6,
                                                  _meas.I_std*10**6)
@@ -3,7 +3,6 @@
 import os as _os
 import sys as _sys
 import numpy as _np
-import time as _time
 import traceback as _traceback
 
 from qtpy.QtWidgets import (
@@ -16,6 +15,20 @@ from qtpy.QtCore import Qt as _Qt
 import qtpy.uic as _uic
 
 import flipcoil.data as _data
+from flipcoil.analysis.firstintegral import (
+    FC_WINDOW as _FC_WINDOW,
+    SW_WINDOW as _SW_WINDOW,
+    )
+from flipcoil.acquisition.settling import (
+    EncoderSettle as _EncoderSettle,
+    CurrentSettle as _CurrentSettle,
+    VoltageNoiseSettle as _VoltageNoiseSettle,
+    )
+import flipcoil.acquisition.planner as _planner
+from flipcoil.acquisition.sequencer import (
+    FlipCoilSequencer as _FlipCoilSequencer,
+    StretchedWireSequencer as _StretchedWireSequencer,
+    )
 from flipcoil.gui.measurementdialog import MeasurementDialog \
     as _MeasurementDialog
 from flipcoil.gui.utils import (
@@ -26,8 +39,6 @@ from flipcoil.gui.utils import (
     )
 from flipcoil.devices import (
     ppmac as _ppmac,
-    fdi as _fdi,
-    ps as _ps,
     volt as _volt,
     )
 from pywin.framework import startup
@@ -47,6 +58,29 @@ class MeasurementWidget(_QWidget):
 
         self.flag_rm_backlash = True
         self.flag_save = False
+        # running I_std limit [T.m] that aborts a measurement (None disables)
+        self.max_running_std = None
+        # shortens the flip coil records to the end of the flux step
+        self.flag_adaptive_duration = False
+        self.adaptive_margin = 0.5  # [s] recorded after the flux step
+        # gathers the rotation encoders during the flips
+        self.flag_gather = False
+        self.gather_frequency = 1000  # [Hz]
+        # overlaps the record transfers with the damping waits
+        self.flag_pipeline = True
+        # detects the flux step window on the first records (False uses
+        # the default window of the measurement mode)
+        self.auto_window = False
+        # settle detectors of the scan moves and current changes and of
+        # the stretched wire damping (None uses the fixed waits)
+        self.move_settle = _EncoderSettle([1, 2, 3, 4])
+        self.current_settle = _CurrentSettle()
+        self.damping_settle = _VoltageNoiseSettle()
+        self.sequencer = None
+        self.prg_dialog = None
+        self.progress_text = ''
+        # settle and cycle time messages of the last sequence
+        self.sequence_log = []
 
         self.volt = _volt
 
@@ -97,14 +131,6 @@ class MeasurementWidget(_QWidget):
         self.ui.pbt_load_cfg.clicked.connect(self.load_cfg)
         self.ui.pbt_update_cfg.clicked.connect(self.update_cfg_list)
 
-    def save_log(self, array, name='', comments=''):
-        """Saves log on file."""
-        name = name + _time.strftime('_%y_%m_%d_%H_%M', _time.localtime()) + '.dat'
-        head = ('Turn1[V.s]\tTurn2[V.s]\tTurn3[V.s]\tTurn4[V.s]\tTurn5[V.s]\t' + 
-                'Turn6[V.s]\tTurn7[V.s]\tTurn8[V.s]\tTurn9[V.s]\tTurn10[V.s]')
-        comments = comments + '\n'
-        _np.savetxt(name, array, delimiter='\t', comments=comments, header=head)
-
     def test_steps(self):
         """Tests steps from ui values and prints initial and final positions.
         """
@@ -121,23 +147,18 @@ class MeasurementWidget(_QWidget):
             _frw_steps = [self.ui.sb_frw5.value(), self.ui.sb_frw6.value()]
             _bck_steps = [self.ui.sb_bck5.value(), self.ui.sb_bck6.value()]
 
-#             with _ppmac.lock_ppmac:
-            self.motors.timer.stop()
             _ppmac.write('#5j^' + str(_frw_steps[0]) +
                          ';#6j^' + str(_frw_steps[1]))
             _sleep(5)
             pos7f, pos8f = _ppmac.read_motor_pos([7, 8])
-#             with _ppmac.lock_ppmac:
             _ppmac.write('#5j^' + str(_bck_steps[0]) +
                          ';#6j^' + str(_bck_steps[1]))
             print(pos7f, pos8f)
             _sleep(5)
             pos7b, pos8b = _ppmac.read_motor_pos([7, 8])
             print(pos7b, pos8b)
-            self.motors.timer.start(1000)
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
-            self.motors.timer.start(1000)
 
     def update_cfg_list(self):
         """Updates configuration name list in combobox."""
@@ -311,15 +332,23 @@ class MeasurementWidget(_QWidget):
     def start_measurement(self):
         """Starts measurement or scan according to configurations. If number
         of measurements > 1, each step in a scan will be repeated before
-        changing the setpoint."""
+        changing the setpoint.
+
+        The setpoints are validated here and the measurements run on the
+        sequencer worker thread (see acquisition.sequencer)."""
 
         try:
+            if self.sequencer is not None and self.sequencer.running:
+                _QMessageBox.information(self, 'Warning',
+                                         'A measurement is already running.',
+                                         _QMessageBox.Ok)
+                return False
+
             self.update_cfg_from_ui()
             _ppmac.flag_abort = False
             if self.ui.rdb_sw.isChecked():
                 _meas = self.meas_sw
                 _meas.mode = 'sw'
-                _measure_first_integral = self.measure_first_intgral_sw
 
                 _meas.motion_axis = self.ui.cmb_motion_axis.currentText()
                 _meas.start_pos = self.ui.dsb_scan_start.value()  # [mm]
@@ -328,7 +357,6 @@ class MeasurementWidget(_QWidget):
             else:
                 _meas = self.meas
                 _meas.mode = 'fc'
-                _measure_first_integral = self.measure_first_intgral
 
             scan_flag = self.dialog.ui.chb_scan.isChecked()
             repeats = self.dialog.ui.sb_repetitions.value()
@@ -337,183 +365,75 @@ class MeasurementWidget(_QWidget):
             _meas.duration = self.ui.dsb_duration.value()
             _meas.nmeasurements = self.ui.sb_nmeasurements.value()
 
-            if not scan_flag:
-                # update meas.name and meas.comments
-                _meas.comments = self.dialog.ui.le_comments.text()
-
-                # measure
-#                 if self.ui.rdb_sw.isChecked():
-#                     raise RuntimeError
-
-                for i in range(repeats):
-                    if _ppmac.flag_abort:
-                        _QMessageBox.information(self, 'Warning',
-                                                 'Measurement Aborted.',
-                                                 _QMessageBox.Ok)
-                        return False
-                    name = self.dialog.ui.le_meas_name.text()
-                    if _meas.mode == 'fc':
-                        name = (name + '_' + self.cfg.direction +
-                                _time.strftime('_%y%m%d_%H%M'))
-                    else:
-                        name = (name + _time.strftime('_%y%m%d_%H%M'))
-                    _meas.name = name
-                    _meas.hour = _time.strftime('%H:%M:%S')
-                    _measure_first_integral()
+            if _meas.mode == 'sw' and not self.update_transversal_pos():
+                return False
 
             if scan_flag:
-                param = self.dialog.ui.cmb_scan_param.currentText()
-                start = self.dialog.ui.dsb_scan_start.value()
-                end = self.dialog.ui.dsb_scan_end.value()
-                step = self.dialog.ui.dsb_scan_step.value()
-                if step == 0:
-                    n_steps = 1
-                else:
-                    # number of steps
-                    n_steps = int(1 + _np.ceil((end-start)/step))
-
-#                 if _meas.mode == 'sw':
-#                     _meas.comments = self.dialog.ui.le_comments.text()
-#                     name = (self.dialog.ui.le_meas_name.text() +
-#                             _time.strftime('_%y%m%d_%H%M'))
-#                     _meas.name = name
-#                     _meas.hour = _time.strftime('%H:%M:%S')
-# 
-#                     _measure_first_integral()
-#                     _QMessageBox.information(self, 'Information',
-#                                              'Measurement Finished.',
-#                                              _QMessageBox.Ok)
-#                     return True
-
-                # get previous parameter
-                if 'X' in param:
-                    if _meas.mode == 'sw' and _meas.motion_axis == 'X':
-                        _QMessageBox.information(self, 'Warning',
-                                                 'Motion axis and scan axis '
-                                                 'must not be the same.\n'
-                                                 'Measurement Aborted.',
-                                                 _QMessageBox.Ok)
-                        return False
-                    previous_param = self.motors.ui.dsb_pos_x.value()
-                elif 'Y' in param:
-                    if _meas.mode == 'sw' and _meas.motion_axis == 'Y':
-                        _QMessageBox.information(self, 'Warning',
-                                                 'Motion axis and scan axis '
-                                                 'must not be the same.\n'
-                                                 'Measurement Aborted.',
-                                                 _QMessageBox.Ok)
-                        return False
-                    previous_param = self.motors.ui.dsb_pos_y.value()
-                elif 'Speed' in param:
-                    previous_param = self.cfg.speed
-                elif 'Acceleration' in param:
-                    previous_param = self.cfg.accel
-                elif 'Jerk' in param:
-                    previous_param = self.cfg.jerk
-
-                for i in range(n_steps):
-                    if _ppmac.flag_abort:
-                        _QMessageBox.information(self, 'Warning',
-                                                 'Measurement Aborted.',
-                                                 _QMessageBox.Ok)
-                        return False
-                    # change setpoint
-                    setpoint = start + i * step
-                    if i == n_steps - 1:
-                        setpoint = end
-
-                    if 'X' in param:
-                        p_str = '_X={0:.2f}_'.format(setpoint)
-                        _x_lim = [self.motors.ui.dsb_min_x.value()*10**3,
-                                  self.motors.ui.dsb_max_x.value()*10**3]
-                        if _x_lim[0] <= setpoint <= _x_lim[1]:
-                            self.motors.ui.dsb_pos_x.setValue(setpoint)
-                            self.motors.move_xy()
-                            _sleep(10)
-                        else:
-                            _QMessageBox.information(self, 'Warning',
-                                                     'X out of range.',
-                                                     _QMessageBox.Ok)
-                            raise ValueError
-                    elif 'Y' in param:
-                        p_str = '_Y={0:.2f}_'.format(setpoint)
-                        _y_lim = [self.motors.ui.dsb_min_y.value()*10**3,
-                                  self.motors.ui.dsb_max_y.value()*10**3]
-                        if _y_lim[0] <= setpoint <= _y_lim[1]:
-                            self.motors.ui.dsb_pos_y.setValue(setpoint)
-                            self.motors.move_xy()
-                            _sleep(10)
-                        else:
-                            _QMessageBox.information(self, 'Warning',
-                                                     'Y out of range.',
-                                                     _QMessageBox.Ok)
-                            raise ValueError
-                    elif 'Speed' in param:
-                        p_str = '_Spd={0:.2f}_'.format(setpoint)
-                        self.cfg.speed = setpoint
-                    elif 'Acceleration' in param:
-                        p_str = '_Acc={0:.2f}_'.format(setpoint)
-                        self.cfg.accel = setpoint
-                    elif 'Jerk' in param:
-                        p_str = '_Jrk={0:.2f}_'.format(setpoint)
-                        self.cfg.jerk = setpoint
-                    elif 'Current' in param:
-                        p_str = '_I={0:.2f}_'.format(setpoint)
-                        if self.ps.ps.read_ps_onoff():
-                            self.ps.ui.dsb_current_setpoint.setValue(setpoint)
-                            _min = self.ps.cfg.min_current
-                            _max = self.ps.cfg.max_current
-                            if _min <= setpoint <= _max:
-                                self.ps.ps.set_slowref(setpoint)
-                                _sleep(10)
-                            else:
-                                _QMessageBox.information(self, 'Warning',
-                                                         'Current out of '
-                                                         'range.',
-                                                         _QMessageBox.Ok)
-                                raise ValueError
-                        else:
-                            _QMessageBox.information(self, 'Warning',
-                                                     'Power supply is'
-                                                     ' turned off.',
-                                                     _QMessageBox.Ok)
-                            return False
-
-                    # update meas.name, meas.comments:
-                    comments = self.dialog.ui.le_comments.text()
-                    comments = comments + ' Scan: ' + p_str.strip('_') + '.'
-                    _meas.comments = comments
-
-                    # measure
-                    for i in range(repeats):
-                        name = self.dialog.ui.le_meas_name.text()
-                        name = (name + '_' + self.cfg.direction + p_str +
-                                _time.strftime('_%y%m%d_%H%M'))
-                        _meas.hour = _time.strftime('%H:%M:%S')
-                        _meas.name = name
-
-                        _measure_first_integral()
-
-                # set previous parameter
-#                 if 'X' in param:
-#                     self.motors.ui.dsb_pos_x.setValue(previous_param)
-#                 elif 'Y' in param:
-#                     self.motors.ui.dsb_pos_y.setValue(previous_param)
-                if 'Speed' in param:
-                    self.cfg.speed = previous_param
-                elif 'Acceleration' in param:
-                    self.cfg.accel = previous_param
-                elif 'Jerk' in param:
-                    self.cfg.jerk = previous_param
-                elif 'Current' in param:
-                    self.ps.ui.dsb_current_setpoint.setValue(setpoint)
-                    self.ps.ps.set_slowref(setpoint)
-                    _sleep(5)
-                    self.ps.ps.turn_off()
+                plan = self.scan_plan(_meas)
+                if plan is None:
+                    return False
+            else:
+                plan = [{}]
 
-            _QMessageBox.information(self, 'Information',
-                                     'Measurement Finished.',
-                                     _QMessageBox.Ok)
+            if self.dialog.ui.chb_Iamb.isChecked():
+                _meas.Iamb_id = 0
+            else:
+                _id = self.dialog.ui.cmb_Iamb.currentIndex()
+                _meas.Iamb_id = self.dialog.amb_list[_id]['id']
+
+            if _meas.mode == 'sw':
+                self.motors.configure_ppmac()
+                _seq = _StretchedWireSequencer(
+                    _meas, plan=plan, repeats=repeats, parent=self)
+                _seq.damping_settle = self.damping_settle
+            else:
+                _meas.cfg_id = self.ui.cmb_cfg_name.currentIndex() + 1
+                _seq = _FlipCoilSequencer(
+                    self.cfg, _meas, plan=plan, repeats=repeats, parent=self)
+                _seq.flag_rm_backlash = self.flag_rm_backlash
+                _seq.flag_save = self.flag_save
+                _seq.flag_adaptive_duration = self.flag_adaptive_duration
+                _seq.adaptive_margin = self.adaptive_margin
+                _seq.flag_gather = self.flag_gather
+                _seq.gather_frequency = self.gather_frequency
+                _seq.x_sf = self.motors.x_sf
+                _seq.y_sf = self.motors.y_sf
+            _seq.flag_pipeline = self.flag_pipeline
+            _seq.move_settle = self.move_settle
+            _seq.current_settle = self.current_settle
+            if self.auto_window:
+                _seq.window = 'auto'
+            elif _meas.mode == 'sw':
+                _seq.window = _SW_WINDOW
+            else:
+                _seq.window = _FC_WINDOW
+            _seq.ppmac_cfg = self.motors.cfg
+            _seq.poller = self.motors.poller
+            _seq.name = self.dialog.ui.le_meas_name.text()
+            _seq.comments = self.dialog.ui.le_comments.text()
+            _seq.direction = self.cfg.direction
+            _seq.database_name = self.database_name
+            _seq.mongo = self.mongo
+            _seq.server = self.server
+            _seq.max_running_std = self.max_running_std
+            if scan_flag and not self.confirm_scan(_seq):
+                return False
+
+            self.prg_dialog = _QProgressDialog('Measurement', 'Abort', 0, 1,
+                                               self)
+            self.prg_dialog.setWindowTitle('Measurement Progress')
+            self.prg_dialog.setValue(0)
+            self.prg_dialog.show()
+            self.progress_text = ''
+            self.sequence_log = []
+
+            _seq.progress.connect(self.update_progress)
+            _seq.log.connect(self.show_log)
+            _seq.measurement_done.connect(self.measurement_done)
+            _seq.finished.connect(self.measurement_finished)
+            self.prg_dialog.canceled.connect(_seq.abort)
+            self.sequencer = _seq
+            _seq.start()
             return True
 
         except Exception:
@@ -523,401 +443,214 @@ class MeasurementWidget(_QWidget):
                                      _QMessageBox.Ok)
             return False
 
-    def measure_first_intgral_sw(self):
-        """Runs first field integral measurement in stretched wire mode."""
-        try:
-            _meas = self.meas_sw
-            if self.dialog.ui.chb_Iamb.isChecked():
-                self.meas_sw.Iamb_id = 0
-            else:
-                _id = self.dialog.ui.cmb_Iamb.currentIndex()
-                self.meas_sw.Iamb_id = self.dialog.amb_list[_id]['id']
-#             turns = self.ui.sb_turns.value()
-#             nplc = self.ui.dsb_nplc.value()
-#             duration = self.ui.dsb_duration.value()
-#             nmeasurements = self.ui.sb_nmeasurements.value()
-#             self.meas.cfg_id = self.ui.cmb_cfg_name.currentIndex() + 1
-            ##Teste manual
-#             start = self.dialog.ui.dsb_scan_start.value()  # [mm]
-#             end = self.dialog.ui.dsb_scan_end.value()  # [mm]
-#             step = self.dialog.ui.dsb_scan_step.value()  # [mm]
-#             param = self.dialog.ui.cmb_scan_param.currentText()
-#             self.meas_sw.mode = 'sw'
-#             self.meas_sw.turns = turns
-            motion_axis = self.meas_sw.motion_axis
-            nmeasurements = self.meas_sw.nmeasurements
-            nplc = self.meas_sw.nplc
-            duration = self.meas_sw.duration
-            start = self.meas_sw.start_pos
-            end = self.meas_sw.end_pos
-            step = self.meas_sw.step
-
-            # PPMAC configurations
-            ppmac_cfg = self.motors.cfg
-            if motion_axis == 'X':
-                speed = ppmac_cfg.speed_x  # [mm/s]
-                accel = ppmac_cfg.accel_x  # [mm/s^2]
-                jerk = ppmac_cfg.jerk_x  # [mm/s^3]
-                _ppmac.write('#2,4,5,6k')
-                _ppmac.write('#1,3j/')
-                move_axis = self.motors.move_x
-            elif motion_axis == 'Y':
-                speed = ppmac_cfg.speed_y  # [mm/s]
-                accel = ppmac_cfg.accel_y  # [mm/s^2]
-                jerk = ppmac_cfg.jerk_y  # [mm/s^3]
-                _ppmac.write('#1,3,5,6k')
-                _ppmac.write('#2,4j/')
-                move_axis = self.motors.move_y
-            self.motors.configure_ppmac()
-
-            self.meas_sw.speed = speed
-            self.meas_sw.accel = accel
-            self.meas_sw.jerk = jerk
-
-            if end < start:
+    def update_transversal_pos(self):
+        """Updates the stretched wire transversal positions.
+
+        Returns:
+            True if successfull;
+            False otherwise."""
+        start = self.meas_sw.start_pos
+        end = self.meas_sw.end_pos
+        step = self.meas_sw.step
+
+        if end < start:
+            _QMessageBox.information(self, 'Warning',
+                                     'End position should be greater than '
+                                     'start position.\n'
+                                     'Measurement Aborted.',
+                                     _QMessageBox.Ok)
+            return False
+        elif start == end:
+            self.meas_sw.transversal_pos = _np.array([start])
+        elif (end - start) < step:
+            self.meas_sw.transversal_pos = _np.array([start, end])
+        else:
+            # number of steps
+            n_steps = int(1 + _np.ceil((end-start) / step))
+            self.meas_sw.transversal_pos = _np.linspace(start, end, n_steps)
+        return True
+
+    def scan_axis(self, meas, param, start, end, step):
+        """Validates a scan axis of the measurement dialog.
+
+        Args:
+            meas (MeasurementData or MeasurementDataSW): measurement data;
+            param (str): scan parameter name;
+            start (float): first setpoint;
+            end (float): last setpoint;
+            step (float): setpoint step.
+
+        Returns:
+            (key, setpoints) tuple (see acquisition.planner);
+            None if the axis is not valid.
+        """
+        setpoints = _planner.axis_values(start, end, step)
+
+        _lim = None
+        if 'X' in param or 'Y' in param:
+            _axis = 'X' if 'X' in param else 'Y'
+            if meas.mode == 'sw' and meas.motion_axis == _axis:
                 _QMessageBox.information(self, 'Warning',
-                                         'End position should be greater than '
-                                         'start position.\n'
+                                         'Motion axis and scan axis '
+                                         'must not be the same.\n'
                                          'Measurement Aborted.',
                                          _QMessageBox.Ok)
-                return False
-            elif start == end:
-                n_steps = 1
-                self.meas_sw.transversal_pos = _np.array([start])
+                return None
+            _key = _axis.lower()
+            if _axis == 'X':
+                _lim = [self.motors.ui.dsb_min_x.value()*10**3,
+                        self.motors.ui.dsb_max_x.value()*10**3]
             else:
-                if (end - start) < step:
-                    self.meas_sw.transversal_pos = _np.array([start, end])
-                else:
-                    # number of steps
-                    n_steps = int(1 + _np.ceil((end-start) / step))
-                    # warning if n_steps is not an integer?
-                    # check if start and end pos are inside limits
-                    self.meas_sw.transversal_pos = _np.linspace(start, end,
-                                                                n_steps)
-
-            _prg_dialog = _QProgressDialog('Measurement', 'Abort', 0,
-                                           nmeasurements + 1, self)
-            _prg_dialog.setWindowTitle('Measurement Progress')
-            _prg_dialog.show()
-            _QApplication.processEvents()
-
-            data_frw = []
-            data_bck = []
-
-            self.motors.timer.stop()
-
-            _sleep(1)
-
-            counts = int(_np.ceil(3/(self.meas_sw.nplc/60)))
-            _volt.configure_volt(nplc=nplc, time=duration)
-            _sleep(0.5)
-
-            _prg_dialog.setValue(0)
-
-            for pos in self.meas_sw.transversal_pos:
-                _init_pos = pos - step/2  # [mm]
-                _end_pos = pos + step/2  # [mm]
-                data_frw_aux = _np.array([])
-                data_bck_aux = _np.array([])
-
-                for i in range(self.meas_sw.nmeasurements):
-                    if _prg_dialog.wasCanceled():
-                        _prg_dialog.destroy()
-                        _ppmac.flag_abort = True
-                        return False
-
-                    # Forward measurement
-                    # go to init pos
-                    move_axis(_init_pos)
-                    _sleep(3)  # wait vibrations damping
-                    _volt.start_measurement()
-                    _t0 = _time.time()
-                    _sleep(1)
-                    # move step
-                    move_axis(_end_pos)
-                    _sleep(3)
-
-                    if _time.time() - _t0 <= duration + 1:
-                        _sleep(duration + 1 + _t0 - _time.time())
-
-                    _data = _volt.get_readings_from_memory(5)[::-1]
-                    if i == 0:
-                        data_frw_aux = _np.append(data_frw_aux, _data)
-                    else:
-                        data_frw_aux = _np.vstack([data_frw_aux, _data])
-
-                    _sleep(3)
-
-                    # Backward measurement
-                    _volt.start_measurement()
-                    _t0 = _time.time()
-                    _sleep(1)
-                    # move - step
-                    move_axis(_init_pos)
-                    _sleep(3)
-
-                    if _time.time() - _t0 <= duration + 1:
-                        _sleep(duration + 1 + _t0 - _time.time())
-
-                    _data = _volt.get_readings_from_memory(5)[::-1]
-
-                    if i == 0:
-                        data_bck_aux = _np.append(data_bck_aux, _data)
-                    else:
-                        data_bck_aux = _np.vstack([data_bck_aux, _data])
-                    _prg_dialog.setValue(i+1)
-
-                data_frw.append(data_frw_aux.transpose())
-                data_bck.append(data_bck_aux.transpose())
-
-            # data[i, j, k]
-            # i: position index
-            # j: measurement voltage array index
-            # k: measurement number index
-            self.meas_sw.data_frw = _np.array(data_frw)
-            self.meas_sw.data_bck = _np.array(data_bck)
-
-            # data analisys
-            self.analysis.first_integral_calculus_sw(self.meas_sw)
-            self.save_sw_measurement()
-            self.analysis.update_meas_list()
-            _count = self.analysis.cmb_meas_name.count() - 1
-            self.analysis.cmb_meas_name.setCurrentIndex(_count)
-
-            self.motors.timer.start(1000)
-            _prg_dialog.destroy()
-            return True
+                _lim = [self.motors.ui.dsb_min_y.value()*10**3,
+                        self.motors.ui.dsb_max_y.value()*10**3]
+        elif 'Speed' in param:
+            _key = 'speed'
+        elif 'Acceleration' in param:
+            _key = 'accel'
+        elif 'Jerk' in param:
+            _key = 'jerk'
+        elif 'Current' in param:
+            _axis = 'Current'
+            _key = 'current'
+            if not self.ps.ps.read_ps_onoff():
+                _QMessageBox.information(self, 'Warning',
+                                         'Power supply is turned off.',
+                                         _QMessageBox.Ok)
+                return None
+            _lim = [self.ps.cfg.min_current, self.ps.cfg.max_current]
+        else:
+            return None
 
-        except Exception:
-            _traceback.print_exc(file=_sys.stdout)
+        if _lim is not None and not all(
+                _lim[0] <= setpoint <= _lim[1] for setpoint in setpoints):
             _QMessageBox.information(self, 'Warning',
-                                     'Measurement Failed.',
+                                     _axis + ' out of range.',
                                      _QMessageBox.Ok)
-            self.motors.timer.start(1000)
-            return False
+            return None
+        return _key, setpoints
+
+    def scan_plan(self, meas):
+        """Builds the scan plan (1 or 2 dimensional grid) from the
+        measurement dialog.
 
-    def measure_first_integral(self, fdi_mode=False):
-        """Runs first field integral measurement.
+        Args:
+            meas (MeasurementData or MeasurementDataSW): measurement data.
 
         Returns:
-            True if successfull;
-            False otherwise.
+            list of plan points (see acquisition.planner);
+            None if the scan is not valid.
         """
-        try:
-#             _ppmac.flag_abort = False
-#             self.update_cfg_from_ui()
+        _ui = self.dialog.ui
+        _rows = [(_ui.cmb_scan_param, _ui.dsb_scan_start, _ui.dsb_scan_end,
+                  _ui.dsb_scan_step)]
+        if _ui.chb_scan2.isChecked():
+            _rows.append((_ui.cmb_scan_param2, _ui.dsb_scan_start2,
+                          _ui.dsb_scan_end2, _ui.dsb_scan_step2))
+
+        axes = {}
+        for cmb, dsb_start, dsb_end, dsb_step in _rows:
+            _axis = self.scan_axis(meas, cmb.currentText(), dsb_start.value(),
+                                   dsb_end.value(), dsb_step.value())
+            if _axis is None:
+                return None
+            if _axis[0] in axes:
+                _QMessageBox.information(self, 'Warning',
+                                         'Scan parameters must not be '
+                                         'the same.\nMeasurement Aborted.',
+                                         _QMessageBox.Ok)
+                return None
+            axes[_axis[0]] = _axis[1]
+        return _planner.grid_plan(axes)
 
-#             self.meas.comments = self.dialog.ui.te_comments.toPlainText()
-            if self.dialog.ui.chb_Iamb.isChecked():
-                self.meas.Iamb_id = 0
-            else:
-                _id = self.dialog.ui.cmb_Iamb.currentIndex()
-                self.meas.Iamb_id = self.dialog.amb_list[_id]['id']
-            self.meas.cfg_id = self.ui.cmb_cfg_name.currentIndex() + 1
+    def confirm_scan(self, sequencer):
+        """Shows the scan size and estimated time before starting it.
 
-            ppmac_cfg = self.motors.cfg
-            speed = self.cfg.speed * ppmac_cfg.steps_per_turn * 10**-3  # [turns/s]
-            if self.cfg.accel != 0:
-                ta = -1/self.cfg.accel * 1/ppmac_cfg.steps_per_turn * 10**6  # [turns/s^2]
-            else:
-                ta = 0
-            if self.cfg.jerk != 0:
-                ts = -1/self.cfg.jerk * 1/ppmac_cfg.steps_per_turn * 10**9  # [turns/s^3]
-            else:
-                ts = 0
-            start_pos = int(self.cfg.start_pos*10**3)
-#             ta = -0.4  # acceleration time [ms]
-#             ts = 0  # jerk time [ms]
-#             wait = 2000  # time to wait between moves [ms]
-            _dir = 1 if self.cfg.direction == 'ccw' else -1
-
-            _prg_dialog = _QProgressDialog('Measurement', 'Abort', 0,
-                                           self.cfg.nmeasurements + 1, self)
-            _prg_dialog.setWindowTitle('Measurement Progress')
-            _prg_dialog.show()
-            _QApplication.processEvents()
+        Args:
+            sequencer (Sequencer): measurement sequencer with the plan.
 
-            data_frw = _np.array([])
-            data_bck = _np.array([])
-            self.meas.pos7f = _np.zeros((2, self.cfg.nmeasurements))
-            self.meas.pos7b = _np.zeros((2, self.cfg.nmeasurements))
-            self.meas.pos8f = _np.zeros((2, self.cfg.nmeasurements))
-            self.meas.pos8b = _np.zeros((2, self.cfg.nmeasurements))
-
-#             auto_current = self.dialog.ui.chb_auto_current.isChecked()
-#             if auto_current:
-#                 currents = _np.copy(
-#                     self.ps.cfg.current_array)
-#                 if len(currents) == 0:
-#                     auto_current = False
-
-#             with _ppmac.lock_ppmac:
-            self.motors.timer.stop()
-            _ppmac.write('#1..4k')
-            _sleep(1)
-            self.meas.x_pos = (_ppmac.read_motor_pos([1, 3]) *
-                               self.motors.x_sf)
-            self.meas.y_pos = (_ppmac.read_motor_pos([2, 4]) *
-                               self.motors.y_sf)
-
-            msg = ('Motor[{0}].JogSpeed={1};'
-                   'Motor[{0}].JogTa={2};'
-                   'Motor[{0}].JogTs={3}'.format(5, speed, ta, ts))
-            _ppmac.write(msg)
-            msg = ('Motor[{0}].JogSpeed={1};'
-                   'Motor[{0}].JogTa={2};'
-                   'Motor[{0}].JogTs={3}'.format(6, speed, ta, ts))
-            _ppmac.write(msg)
-
-            if fdi_mode:
-                counts = _fdi.configure_integrator(time=self.cfg.duration,
-                                                   interval=50)
-                _fdi.send('INP:COUP DC')
-            else:
-                counts = int(_np.ceil(3/(self.cfg.nplc/60)))
-                _volt.configure_volt(nplc=self.cfg.nplc, time=self.cfg.duration)
-            _sleep(0.5)
-#             _ppmac.remove_backlash(start_pos)
-#             _sleep(10)
-#             self.meas.name = (self.dialog.ui.le_meas_name.currentText() +
-#                               _time.strftime('_%y%m%d_%H%M'))
-            _prg_dialog.setValue(0)
-            for i in range(self.cfg.nmeasurements):
-                if _prg_dialog.wasCanceled():
-                    _prg_dialog.destroy()
-                    _ppmac.flag_abort = True
-                    return False
+        Returns:
+            True if the scan was confirmed;
+            False otherwise.
+        """
+        _cfg = self.motors.cfg
+        # stage setpoints in [um] and speeds in [mm/s]
+        _rates = {'x': _cfg.speed_x*10**3, 'y': _cfg.speed_y*10**3}
+        _estimate = _planner.estimate_time(
+            sequencer.plan, sequencer.measurement_time(),
+            repeats=sequencer.repeats, rates=_rates,
+            settle_times=sequencer.settle_times())
+        _msg = ('Scan: {0} points x {1} measurements.\n'
+                'Estimated time: up to {2:.0f} h {3:02.0f} min.\n'
+                'Start the scan?'.format(
+                    len(sequencer.plan), sequencer.repeats,
+                    _estimate//3600, (_estimate % 3600)//60))
+        _reply = _QMessageBox.question(
+            self, 'Scan', _msg, _QMessageBox.Yes | _QMessageBox.No,
+            _QMessageBox.Yes)
+        return _reply == _QMessageBox.Yes
+
+    def update_progress(self, step, total, text):
+        """Shows the sequencer progress on the progress dialog.
+
+        Args:
+            step (int): finished steps;
+            total (int): total steps;
+            text (str): progress dialog label.
+        """
+        if self.prg_dialog is None:
+            return
+        self.progress_text = text
+        self.prg_dialog.setMaximum(total + 1)
+        self.prg_dialog.setValue(step)
+        self.prg_dialog.setLabelText(text)
+
+    def show_log(self, text):
+        """Keeps a sequencer log message and shows it on the progress
+        dialog.
+
+        Args:
+            text (str): log message.
+        """
+        self.sequence_log.append(text)
+        if self.prg_dialog is None:
+            return
+        self.prg_dialog.setLabelText(self.progress_text + '\n' + text)
+
+    def measurement_done(self, result, record):
+        """Shows a finished measurement on the analysis tab.
 
-                if (self.flag_rm_backlash and
-                    any([abs(_ppmac.read_motor_pos([7])[0]) % 360000 > self.cfg.max_init_error,
-                         abs(_ppmac.read_motor_pos([8])[0]) % 360000 > self.cfg.max_init_error])):
-                    _ppmac.remove_backlash(start_pos)
-                if fdi_mode:
-                    _fdi.start_measurement()
-                else:
-                    _volt.start_measurement()
-                _sleep(1)
-
-                self.meas.pos7f[0, i], self.meas.pos8f[0, i] = (
-                    _ppmac.read_motor_pos([7, 8]))
-#                 with _ppmac.lock_ppmac:
-                _ppmac.write('#5j^' + str(self.cfg.steps_f[0]) +
-                             ';#6j^' + str(self.cfg.steps_f[1]))
-
-                if fdi_mode:
-                    while(_fdi.get_data_count() < counts - 1):
-                        _sleep(0.1)
-                    _data = _fdi.get_data()
-                else:
-                    _sleep(3)
-        #             while(volt.get_data_count() < counts):
-        #                 _sleep(0.1)
-                    _data = _volt.get_readings_from_memory(5)
-                if i == 0:
-                    data_frw = _np.append(data_frw, _data)
-                else:
-                    data_frw = _np.vstack([data_frw, _data])
-                self.meas.pos7f[1, i], self.meas.pos8f[1, i] = (
-                    _ppmac.read_motor_pos([7, 8]))
-
-                _sleep(5)
-
-                if fdi_mode:
-                    _fdi.start_measurement()
-                else:
-                    _volt.start_measurement()
-                _sleep(1)
-
-                self.meas.pos7b[0, i], self.meas.pos8b[0, i] = (
-                    _ppmac.read_motor_pos([7, 8]))
-#                 with _ppmac.lock_ppmac:
-                _ppmac.write('#5j^' + str(self.cfg.steps_b[0]) +
-                             ';#6j^' + str(self.cfg.steps_b[1]))
-                if fdi_mode:
-                    while(_fdi.get_data_count() < counts - 1):
-                        _sleep(0.1)
-                    _data = _fdi.get_data()
-                    _fdi.send('INP:COUP GND')
-                else:
-                    _sleep(3)
-        #             while(volt.get_data_count() < counts):
-        #                 time.sleep(0.1)
-                    _data = _volt.get_readings_from_memory(5)
-                if i == 0:
-                    data_bck = _np.append(data_bck, _data)
-                else:
-                    data_bck = _np.vstack([data_bck, _data])
-                self.meas.pos7b[1, i], self.meas.pos8b[1, i] = (
-                    _ppmac.read_motor_pos([7, 8]))
-
-                _prg_dialog.setValue(i+1)
-
-            self.meas.data_frw = data_frw.transpose()
-            self.meas.data_bck = data_bck.transpose()
-
-            if self.flag_save:
-                self.save_log(self.meas.data_frw, 'frw', 'Flip Coil')
-                self.save_log(self.meas.data_bck, 'bck', 'Flip Coil')
-                self.save_log(self.meas.pos7f, 'pos7f')
-                self.save_log(self.meas.pos8f, 'pos8f')
-                self.save_log(self.meas.pos7b, 'pos7b')
-                self.save_log(self.meas.pos8b, 'pos8b')
-
-            _meas = self.analysis.first_integral_calculus(
-                cfg=self.cfg, meas=self.meas)
-            if _meas is not None:
-                self.meas = _meas
+        Args:
+            result (FirstIntegralResult): measurement results;
+            record (dict): saved measurement (see Sequencer.saved_record).
+        """
+        try:
+            self.analysis.result = result
+            if self.sequencer.mode == 'sw':
+                self.analysis.show_ambient_field(result, index=0)
             else:
-                _QMessageBox.warning(self, 'Warning',
-                                     'Calculations failed.',
-                                     _QMessageBox.Ok)
-                return False
-            self.save_measurement()
+                self.analysis.show_ambient_field(result)
+            # the record is loaded from the cache, not integrated again
+            if record is not None:
+                self.analysis.cache_result(record, result)
             self.analysis.update_meas_list()
             _count = self.analysis.cmb_meas_name.count() - 1
             self.analysis.cmb_meas_name.setCurrentIndex(_count)
-#             self.analysis.plot(plot_from_measurementwidget=True)
-
-            self.motors.timer.start(1000)
-            _prg_dialog.destroy()
-            return True
-
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
-            _QMessageBox.information(self, 'Warning',
-                                     'Measurement Failed.',
-                                     _QMessageBox.Ok)
-            self.motors.timer.start(1000)
-            return False
 
-    def save_measurement(self):
-        """Saves current measurement into database."""
-        try:
-            self.meas.db_update_database(
-                        self.database_name,
-                        mongo=self.mongo, server=self.server)
-            self.meas.db_save()
-            self.analysis.update_meas_list()
-            return True
-        except Exception:
-            _QMessageBox.warning(self, 'Information',
-                                 'Failed to save this measurement.',
-                                 _QMessageBox.Ok)
-            _traceback.print_exc(file=_sys.stdout)
-            return False
+    def measurement_finished(self, success, message):
+        """Closes the progress dialog at the end of the sequence.
 
-    def save_sw_measurement(self):
-        """Saves current measurement into database."""
-        try:
-            self.meas_sw.db_update_database(
-                        self.database_name,
-                        mongo=self.mongo, server=self.server)
-            self.meas_sw.db_save()
-#             self.analysis.update_meas_list()
-            return True
-        except Exception:
-            _QMessageBox.warning(self, 'Information',
-                                 'Failed to save this measurement.',
-                                 _QMessageBox.Ok)
-            _traceback.print_exc(file=_sys.stdout)
-            return False
+        Args:
+            success (bool): True if all measurements finished;
+            message (str): sequence result message.
+        """
+        if self.prg_dialog is not None:
+            self.prg_dialog.destroy()
+            self.prg_dialog = None
+        if success:
+            _QMessageBox.information(self, 'Information', message,
+                                     _QMessageBox.Ok)
+        else:
+            _QMessageBox.information(self, 'Warning', message,
+                                     _QMessageBox.Ok)
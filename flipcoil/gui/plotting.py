@@ -0,0 +1,173 @@
+"""Plot rendering for the Flip Coil Control application."""
+
+import numpy as _np
+
+
+def minmax_decimate(x, y, npoints):
+    """Reduces a trace to about npoints, keeping its envelope.
+
+    The samples are split in npoints/2 bins and only the minimum and the
+    maximum of each bin (plus the first and last samples) are kept, so
+    peaks and spikes are preserved at screen resolution.
+
+    Args:
+        x (array): x data;
+        y (array): y data;
+        npoints (int): maximum number of points.
+
+    Returns:
+        decimated x and y arrays (the inputs if they are already short).
+    """
+    _n = len(y)
+    if _n <= npoints or npoints < 4:
+        return x, y
+
+    _size = int(_np.ceil(_n/(npoints//2)))
+    _nfull = (_n//_size)*_size
+    _bins = _np.asarray(y[:_nfull]).reshape(-1, _size)
+    _offsets = _np.arange(0, _nfull, _size)
+    _idx = [[0], _offsets + _bins.argmin(axis=1),
+            _offsets + _bins.argmax(axis=1)]
+    if _nfull < _n:
+        _tail = _np.asarray(y[_nfull:])
+        _idx.append([_nfull + _tail.argmin(), _nfull + _tail.argmax()])
+    _idx.append([_n - 1])
+    _idx = _np.unique(_np.concatenate(_idx))
+    return _np.asarray(x)[_idx], _np.asarray(y)[_idx]
+
+
+class LinePlot():
+    """Line plot that keeps its artists alive between updates.
+
+    Line artists are created once and reused: switching between views only
+    updates their data and styles in place, and the axes labels, legend and
+    layout are rebuilt only when they change. Long traces are decimated to
+    the axes width (see minmax_decimate) and decimated again for the
+    visible range when the x limits change (e.g. zoom).
+    """
+
+    points_per_pixel = 2
+
+    def __init__(self, canvas, toolbar=None):
+        """Initialize object.
+
+        Args:
+            canvas (FigureCanvas): canvas with an axes attribute;
+            toolbar (NavigationToolbar2QT): navigation toolbar (its view
+                history is reset on each update).
+        """
+        self.canvas = canvas
+        self.axes = canvas.axes
+        self.toolbar = toolbar
+        self.lines = []
+        self._data = []
+        self._labels = None
+        self._legend = None
+        self.axes.grid(1)
+        self.axes.callbacks.connect('xlim_changed', self._on_xlim_changed)
+
+    def _npoints(self):
+        """Returns the number of points drawn per trace."""
+        return max(int(self.axes.bbox.width*self.points_per_pixel), 100)
+
+    def _set_line_data(self, index, xlim=None):
+        """Sets the decimated data of a line, limited to xlim."""
+        _x, _y = self._data[index]
+        if xlim is not None and len(_x) > 1 and _x[-1] > _x[0]:
+            _i0 = max(_np.searchsorted(_x, min(xlim), 'left') - 1, 0)
+            _i1 = _np.searchsorted(_x, max(xlim), 'right') + 1
+            _x, _y = _x[_i0:_i1], _y[_i0:_i1]
+        self.lines[index].set_data(*minmax_decimate(_x, _y, self._npoints()))
+
+    def _on_xlim_changed(self, axes):
+        """Decimates the traces again for the visible x range."""
+        _xlim = axes.get_xlim()
+        for i in range(len(self._data)):
+            if self.lines[i].get_visible():
+                self._set_line_data(i, _xlim)
+        self.canvas.draw_idle()
+
+    def _get_line(self, index):
+        """Returns the line artist of index, creating it if needed."""
+        while len(self.lines) <= index:
+            _line, = self.axes.plot([], [])
+            self.lines.append(_line)
+        return self.lines[index]
+
+    def update(self, traces, xlabel='', ylabel=''):
+        """Updates the plot.
+
+        Args:
+            traces (list): list of dicts with the x and y data and the
+                optional color, linestyle and label of each line;
+            xlabel (str): x axis label;
+            ylabel (str): y axis label.
+        """
+        self._data = []
+        for i, trace in enumerate(traces):
+            _line = self._get_line(i)
+            self._data.append((_np.asarray(trace['x']),
+                               _np.asarray(trace['y'])))
+            self._set_line_data(i)
+            _line.set_color(trace.get('color', 'C' + str(i)))
+            _line.set_linestyle(trace.get('linestyle', '-'))
+            _line.set_label(trace.get('label', '_nolegend_'))
+            _line.set_visible(True)
+        for _line in self.lines[len(traces):]:
+            _line.set_data([], [])
+            _line.set_label('_nolegend_')
+            _line.set_visible(False)
+
+        self.axes.relim(visible_only=True)
+        self.axes.autoscale_view()
+
+        _layout = False
+        if (xlabel, ylabel) != self._labels:
+            self.axes.set_xlabel(xlabel)
+            self.axes.set_ylabel(ylabel)
+            self._labels = (xlabel, ylabel)
+            _layout = True
+
+        _legend = [(trace.get('label'), trace.get('color'),
+                    trace.get('linestyle')) for trace in traces
+                   if not trace.get('label', '_').startswith('_')]
+        if _legend != self._legend:
+            if len(_legend) > 0:
+                self.axes.legend()
+            elif self.axes.get_legend() is not None:
+                self.axes.get_legend().remove()
+            self._legend = _legend
+
+        if _layout:
+            self.canvas.figure.tight_layout()
+        if self.toolbar is not None:
+            self.toolbar.update()
+        self.canvas.draw_idle()
+
+
+def column_traces(x, data, linestyle='-', labels=True):
+    """Returns one trace per column of data.
+
+    Args:
+        x (array): x data;
+        data (array): y data, one line per column;
+        linestyle (str): line style;
+        labels (bool): if True, the lines are labeled with the column index.
+
+    Returns:
+        list of trace dicts (see LinePlot.update).
+    """
+    return [{'x': x, 'y': data[:, k], 'color': 'C' + str(k),
+             'linestyle': linestyle,
+             'label': str(k) if labels else '_nolegend_'}
+            for k in range(data.shape[1])]
+
+
+def paired_traces(x, data_frw, data_bck):
+    """Returns forward (solid, labeled) and backward (dashed) traces with
+    the same color per column."""
+    _traces = []
+    for _frw, _bck in zip(column_traces(x, data_frw),
+                          column_traces(x, data_bck, '--', labels=False)):
+        _traces.extend([_frw, _bck])
+    return _traces
@@ -0,0 +1,185 @@
+"""Background PPMAC poller for the Flip Coil Control application.
+
+A worker thread owns the periodic PPMAC reads and keeps a timestamped
+cache of the motor positions and status flags (see Ppmac.snapshot). Each
+new snapshot is published through the status_updated signal, so display
+code never touches the socket, and measurement code can reuse fresh
+cached values instead of issuing its own reads. The polls are sent with
+the lowest command channel priority, behind motion and measurement
+commands.
+"""
+
+import sys as _sys
+import time as _time
+import threading as _threading
+import traceback as _traceback
+import numpy as _np
+
+from qtpy.QtCore import (
+    QObject as _QObject,
+    Signal as _Signal,
+    )
+
+from flipcoil.devices import (
+    ppmac as _ppmac,
+    PRIORITY_POLL as _PRIORITY_POLL,
+    PRIORITY_QUERY as _PRIORITY_QUERY,
+    )
+
+
+POLL_MOTORS = [1, 2, 3, 4, 7, 8]
+
+
+class PpmacPoller(_QObject):
+    """Polls the PPMAC motor status on a worker thread."""
+
+    status_updated = _Signal(object)
+
+    def __init__(self, motors=POLL_MOTORS, parent=None):
+        """Initialize object.
+
+        Args:
+            motors (list): motor numbers polled;
+            parent (QObject): parent object.
+        """
+        super().__init__(parent)
+        self.motors = list(motors)
+        self.interval = 1.0  # [s]
+        self.status = None
+        self.timestamp = 0.0
+        self._lock = _threading.Lock()  # cache lock
+        self._busy = _threading.Lock()  # held while a poll is in flight
+        self._enabled = _threading.Event()
+        self._wake = _threading.Event()
+        self._closed = False
+        self._thread = _threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def connected(self):
+        """True if the PPMAC connection is open."""
+        return hasattr(_ppmac, 'ppmac') and not _ppmac.ppmac.closed
+
+    @property
+    def active(self):
+        """True if the periodic polling is enabled."""
+        return self._enabled.is_set()
+
+    def start(self, interval=1000):
+        """Starts (or resumes) the periodic polling.
+
+        Args:
+            interval (int): polling interval [ms] (same unit as QTimer).
+        """
+        self.interval = interval/1000
+        self._enabled.set()
+        self._wake.set()
+
+    def stop(self):
+        """Pauses the periodic polling.
+
+        Blocks until an in-flight poll finishes.
+        """
+        self._enabled.clear()
+        with self._busy:
+            pass
+
+    def close(self):
+        """Stops the worker thread."""
+        self._closed = True
+        self._enabled.clear()
+        self._wake.set()
+        self._thread.join(timeout=2)
+
+    def _run(self):
+        """Worker thread loop."""
+        while not self._closed:
+            self._enabled.wait(timeout=0.5)
+            if self._closed:
+                break
+            if not self._enabled.is_set():
+                continue
+            with self._busy:
+                # stop() may have been called while waiting for the lock
+                if self._enabled.is_set() and self.connected:
+                    self.refresh(priority=_PRIORITY_POLL)
+            self._wake.wait(timeout=self.interval)
+            self._wake.clear()
+
+    def refresh(self, motors=None, priority=_PRIORITY_QUERY):
+        """Reads a new snapshot and updates the cache.
+
+        Args:
+            motors (list): additional motor numbers to read;
+            priority (int): command channel priority.
+
+        Returns:
+            snapshot array (see Ppmac.snapshot);
+            None if the snapshot could not be read.
+        """
+        try:
+            _motors = list(self.motors)
+            for n in (motors or []):
+                if n not in _motors:
+                    _motors.append(n)
+            _t = _time.time()
+            _status = _ppmac.snapshot(_motors, priority=priority)
+            if _status is None:
+                return None
+            with self._lock:
+                if _t >= self.timestamp:
+                    self.status = _status
+                    self.timestamp = _t
+            self.status_updated.emit(_status)
+            return _status
+        except Exception:
+            _traceback.print_exc(file=_sys.stdout)
+            return None
+
+    def get(self, max_age=None, since=None):
+        """Returns the cached snapshot.
+
+        Args:
+            max_age (float): maximum age of the snapshot [s] (None accepts
+                any age);
+            since (float): oldest accepted snapshot time (time.time()).
+
+        Returns:
+            (snapshot, timestamp) tuple;
+            (None, timestamp) if there is no snapshot or it is too old.
+        """
+        with self._lock:
+            _status, _timestamp = self.status, self.timestamp
+        if _status is None:
+            return None, _timestamp
+        if max_age is not None and _time.time() - _timestamp > max_age:
+            return None, _timestamp
+        if since is not None and _timestamp < since:
+            return None, _timestamp
+        return _status, _timestamp
+
+    def positions(self, motors, max_age=None, since=None):
+        """Returns motor positions, reusing the cache if it is fresh.
+
+        The PPMAC is only read (and the cache updated) if the cached
+        snapshot is older than max_age or since, or if it does not contain
+        all motors.
+
+        Args:
+            motors (list): motor numbers;
+            max_age (float): maximum age of the cached positions [s];
+            since (float): oldest accepted snapshot time (time.time()).
+
+        Returns:
+            array with the motor positions [counts];
+            None if the positions could not be read.
+        """
+        _status, _ = self.get(max_age=max_age, since=since)
+        if (_status is None or
+                not all(n in _status['motor'] for n in motors)):
+            _status = self.refresh(motors)
+            if _status is None:
+                return None
+        _index = [int(_np.flatnonzero(_status['motor'] == n)[0])
+                  for n in motors]
+        return _status['pos'][_index]
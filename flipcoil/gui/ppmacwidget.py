@@ -9,10 +9,7 @@ from qtpy.QtWidgets import (
     QMessageBox as _QMessageBox,
     QApplication as _QApplication,
     )
-from qtpy.QtCore import (
-    Qt as _Qt,
-    QTimer as _QTimer,
-    )
+from qtpy.QtCore import Qt as _Qt
 import qtpy.uic as _uic
 
 from flipcoil.gui.utils import (
@@ -21,6 +18,7 @@ from flipcoil.gui.utils import (
     update_db_name_list as _update_db_name_list,
     load_db_from_name as _load_db_from_name,
     )
+from flipcoil.gui.ppmacpoller import PpmacPoller as _PpmacPoller
 from flipcoil.devices import ppmac as _ppmac
 import flipcoil.data as _data
 
@@ -43,8 +41,11 @@ class PpmacWidget(_QWidget):
 
         self.steps_per_turn = 102400  # roation motor steps/turn
 
-        self.timer = _QTimer()
-        self.timer.start(1000)
+        self.status = None
+        self.pos = None
+        # the poller thread owns the periodic PPMAC reads
+        self.poller = _PpmacPoller(parent=self)
+        self.poller.start(1000)
 
         self.ppmac = _ppmac
         self.cfg = _data.configuration.PpmacConfig()
@@ -81,7 +82,7 @@ class PpmacWidget(_QWidget):
 
     def connect_signal_slots(self):
         """Create signal/slot connections."""
-        self.ui.timer.timeout.connect(self.update_position)
+        self.poller.status_updated.connect(self.update_position)
         self.ui.pbt_move.clicked.connect(self.move)
         self.ui.pbt_move_xy.clicked.connect(self.move_xy)
         self.ui.pbt_home.clicked.connect(self.home)
@@ -92,20 +93,23 @@ class PpmacWidget(_QWidget):
         self.ui.pbt_load_cfg.clicked.connect(self.load_cfg)
         self.ui.pbt_update_cfg.clicked.connect(self.update_cfg_list)
 
-    def update_position(self):
-        """Updates position displays on ui."""
+    def update_position(self, status):
+        """Updates position displays on ui from a poller snapshot.
+
+        Args:
+            status (array): motor snapshot (see Ppmac.snapshot) of the
+                polled motors [1, 2, 3, 4, 7, 8]."""
         try:
-            if hasattr(_ppmac, 'ppmac'):
-                if all([not _ppmac.ppmac.closed,
-                        self.parent().currentWidget() == self]):
-                    self.pos = _ppmac.read_motor_pos([1, 2, 3, 4, 7, 8])
-                    self.ui.lcd_pos1.display(self.pos[0]*self.cfg.x_sf)
-                    self.ui.lcd_pos2.display(self.pos[1]*self.cfg.y_sf)
-                    self.ui.lcd_pos3.display(self.pos[2]*self.cfg.x_sf)
-                    self.ui.lcd_pos4.display(self.pos[3]*self.cfg.y_sf)
-                    self.ui.lcd_pos5.display(self.pos[4]*self.angular_sf)
-                    self.ui.lcd_pos6.display(self.pos[5]*self.angular_sf)
-                    _QApplication.processEvents()
+            self.status = status
+            self.pos = self.status['pos']
+            if self.parent() is None or self.parent().currentWidget() != self:
+                return
+            self.ui.lcd_pos1.display(self.pos[0]*self.cfg.x_sf)
+            self.ui.lcd_pos2.display(self.pos[1]*self.cfg.y_sf)
+            self.ui.lcd_pos3.display(self.pos[2]*self.cfg.x_sf)
+            self.ui.lcd_pos4.display(self.pos[3]*self.cfg.y_sf)
+            self.ui.lcd_pos5.display(self.pos[4]*self.angular_sf)
+            self.ui.lcd_pos6.display(self.pos[5]*self.angular_sf)
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
 
@@ -270,40 +274,23 @@ class PpmacWidget(_QWidget):
             else:
                 _ts_y = 0
 
-            self.timer.stop()
             # Configures rotation motors:
             for i in [5, 6]:
                 if i == 5:
                     _home_offset = self.cfg.home_offset5
                 else:
                     _home_offset = self.cfg.home_offset6
-                msg = ('Motor[{0}].JogSpeed={1};'
-                       'Motor[{0}].JogTa={2};'
-                       'Motor[{0}].JogTs={3};'
-                       'Motor[{0}].HomeOffset={4}'.format(i, _spd, _ta, _ts,
-                                                          _home_offset))
-#                 with _ppmac.lock_ppmac:
+                _ppmac.set_jog([i], _spd, _ta, _ts)
+                msg = 'Motor[{0}].HomeOffset={1}'.format(i, _home_offset)
                 _ppmac.write(msg)
 
             # Configures X motors:
-            for i in [1, 3]:
-                msg = ('Motor[{0}].JogSpeed={1};'
-                       'Motor[{0}].JogTa={2};'
-                       'Motor[{0}].JogTs={3}'.format(i, _spd_x, _ta_x, _ts_x))
-#                 with _ppmac.lock_ppmac:
-                _ppmac.write(msg)
+            _ppmac.set_jog([1, 3], _spd_x, _ta_x, _ts_x)
 
             # Configures Y motors:
-            for i in [2, 4]:
-                msg = ('Motor[{0}].JogSpeed={1};'
-                       'Motor[{0}].JogTa={2};'
-                       'Motor[{0}].JogTs={3}'.format(i, _spd_y, _ta_y, _ts_y))
-#                 with _ppmac.lock_ppmac:
-                _ppmac.write(msg)
-                self.timer.start(1000)
+            _ppmac.set_jog([2, 4], _spd_y, _ta_y, _ts_y)
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
-            self.timer.start(1000)
 
     def home(self):
         """Home rotation motors.
@@ -312,26 +299,22 @@ class PpmacWidget(_QWidget):
             True if successfull;
             False otherwise."""
         try:
-            self.timer.stop()
             _home5 = self.cfg.home_offset5
             _home6 = self.cfg.home_offset6
             _msg = 'Motor[7].HomeOffset={0};Motor[8].HomeOffset={1}'.format(
                 _home5, _home6)
-#             with _ppmac.lock_ppmac:
             _ppmac.write(_msg)
             _ppmac.write('enable plc HomeA')
-            _sleep(3)
-            while (all([not _ppmac.motor_homed(5),
-                        not _ppmac.motor_homed(6)])):
-                _sleep(1)
+            _ppmac.wait_motion_done(
+                [5, 6], timeout=300, delay=3, max_poll=1,
+                condition=lambda: any([_ppmac.motor_homed(5),
+                                       _ppmac.motor_homed(6)]))
             self.ppmac.remove_backlash(0)
 #             self.ui.chb_homed.setChecked(True)
-            self.timer.start(1000)
             return True
         except Exception:
             self.ui.chb_homed.setChecked(False)
             _traceback.print_exc(file=_sys.stdout)
-            self.timer.start(1000)
             return False
 
     def home_x(self):
@@ -341,8 +324,6 @@ class PpmacWidget(_QWidget):
             True if successfull;
             False otherwise."""
         try:
-            self.timer.stop()
-#             with _ppmac.lock_ppmac:
             _ppmac.write('#1,3j/')
             _ppmac.write('enable plc HomeX')
             _sleep(3)
@@ -350,12 +331,10 @@ class PpmacWidget(_QWidget):
 #                         not _ppmac.motor_homed(3)])):
 #                 _sleep(1)
 #             self.ui.chb_homed_x.setChecked(True)
-            self.timer.start(1000)
             return True
         except Exception:
             self.ui.chb_homed_x.setChecked(False)
             _traceback.print_exc(file=_sys.stdout)
-            self.timer.start(1000)
             return False
 
     def home_y(self):
@@ -365,12 +344,9 @@ class PpmacWidget(_QWidget):
             True if successfull;
             False otherwise"""
         try:
-            self.timer.stop()
-#             with _ppmac.lock_ppmac:
             _ppmac.write('#2,4j/')
             _ppmac.write('enable plc HomeY')
             _sleep(3)
-            self.timer.start(1000)
 #             while (all([not _ppmac.motor_homed(2),
 #                         not _ppmac.motor_homed(4)])):
 #                 _sleep(1)
@@ -379,7 +355,6 @@ class PpmacWidget(_QWidget):
         except Exception:
             self.ui.chb_homed_y.setChecked(False)
             _traceback.print_exc(file=_sys.stdout)
-            self.timer.start(1000)
             return False
 
     def move(self):
@@ -390,14 +365,28 @@ class PpmacWidget(_QWidget):
                 _mode = '='
             else:
                 _mode = '^'
-#             with _ppmac.lock_ppmac:
-            self.timer.stop()
             _ppmac.write('#5j' + _mode + str(_steps[0]) +
                          ';#6j' + _mode + str(_steps[1]))
-            self.timer.start(1000)
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
-            self.timer.start(1000)
+
+    def move_distance(self, target, index, absolute=True):
+        """Returns the move distance of a linear axis.
+
+        Args:
+            target (float): target position (or displacement) [counts];
+            index (int): axis index in the displayed positions (0 for X,
+                1 for Y);
+            absolute (bool): True for absolute positioning.
+
+        Returns:
+            move distance [counts], or None if the position is unknown.
+        """
+        if not absolute:
+            return abs(target)
+        if getattr(self, 'pos', None) is None:
+            return None
+        return abs(target - self.pos[index])
 
     def move_x(self, position, absolute=True):
         """Move X motors and returns only after they stop.
@@ -427,20 +416,15 @@ class PpmacWidget(_QWidget):
             else:
                 _mode = '^'
 
-            self.timer.stop()
             _ppmac.write('#1,3j/')
             _msg_x = '#1,3j' + _mode + str(_pos_x)
             _ppmac.write(_msg_x)
-            _sleep(0.2)
-            while (not all([self.ppmac.motor_stopped(1),
-                            self.ppmac.motor_stopped(3)])):
-                _sleep(0.2)
-            self.timer.start(1000)
+            self.ppmac.wait_motion_done(
+                [1, 3], distance=self.move_distance(_pos_x, 0, absolute))
 
             return True
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
-            self.timer.start(1000)
             return False
 
     def move_y(self, position, absolute=True):
@@ -471,20 +455,15 @@ class PpmacWidget(_QWidget):
             else:
                 _mode = '^'
 
-            self.timer.stop()
             _ppmac.write('#2,4j/')
             _msg_y = '#2,4j' + _mode + str(_pos_y)
             _ppmac.write(_msg_y)
-            _sleep(0.2)
-            while (not all([self.ppmac.motor_stopped(2),
-                            self.ppmac.motor_stopped(4)])):
-                _sleep(0.2)
-            self.timer.start(1000)
+            self.ppmac.wait_motion_done(
+                [2, 4], distance=self.move_distance(_pos_y, 1, absolute))
 
             return True
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
-            self.timer.start(1000)
             return False
 
     def move_xy(self):
@@ -518,16 +497,12 @@ class PpmacWidget(_QWidget):
             else:
                 _mode = '^'
 
-#             with _ppmac.lock_ppmac:
-            self.timer.stop()
             _ppmac.write('#1..4j/')
             _msg_x = '#1,3j' + _mode + str(_pos_x)
             _msg_y = '#2,4j' + _mode + str(_pos_y)
             _ppmac.write(_msg_x + ';' + _msg_y)
-            self.timer.start(1000)
 
             return True
         except Exception:
             _traceback.print_exc(file=_sys.stdout)
-            self.timer.start(1000)
             return False
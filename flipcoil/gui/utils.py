@@ -6,6 +6,7 @@ import sys as _sys
 import numpy as _np
 import pandas as _pd
 import time as _time
+import threading as _threading
 import os.path as _path
 import traceback as _traceback
 # import pyqtgraph as _pyqtgraph
@@ -31,6 +32,8 @@ MONGO = False
 SERVER = 'localhost'
 UPDATE_POSITIONS_INTERVAL = 0.5  # [s]
 UPDATE_PLOT_INTERVAL = 0.1  # [s]
+ANALYSIS_CHUNK_SIZE = 8  # [positions integrated per call]
+ANALYSIS_CACHE_SIZE = 256  # [MB]
 TABLE_NUMBER_ROWS = 1000
 TABLE_MAX_NUMBER_ROWS = 100
 TABLE_MAX_STR_SIZE = 100
@@ -118,14 +121,20 @@ def get_value_from_string(text):
 def sleep(time):
     """Halts the program while processing UI events.
 
+    Outside the GUI thread (e.g. in the measurement sequencer) the calling
+    thread just sleeps, since the UI events belong to the GUI thread.
+
     Args:
         time (float): time to halt the program in seconds."""
     try:
+        if _threading.current_thread() is not _threading.main_thread():
+            _time.sleep(max(time, 0))
+            return
         _dt = 0.1
         _tf = _time.time() + time
         while _time.time() < _tf:
             _QApplication.processEvents()
-            _time.sleep(_dt)
+            _time.sleep(max(min(_dt, _tf - _time.time()), 0))
     except Exception:
         _traceback.print_exc(file=_sys.stdout)
 
@@ -0,0 +1 @@
+"""Flip coil tests."""
@@ -0,0 +1,40 @@
+"""Analysis cache tests."""
+
+import unittest as _unittest
+
+from flipcoil.analysis.cache import AnalysisCache
+from flipcoil.analysis.ambient import ambient_saved
+
+
+class TestAmbientInvalidation(_unittest.TestCase):
+    """Tests that saving an ambient record discards the results that
+    discount it."""
+
+    def setUp(self):
+        self.cache = AnalysisCache()
+        self.key_amb = AnalysisCache.make_key('flipcoil', 10)
+        self.key_other = AnalysisCache.make_key('flipcoil', 11)
+        self.key_raw = AnalysisCache.make_key('flipcoil', 12)
+        self.cache.put(self.key_amb, 'amb 5', amb_idn=5)
+        self.cache.put(self.key_other, 'amb 6', amb_idn=6)
+        self.cache.put(self.key_raw, 'no amb')
+
+    def test_saved_record(self):
+        ambient_saved('flipcoil', 5)
+        self.assertIsNone(self.cache.get(self.key_amb))
+        self.assertEqual(self.cache.get(self.key_other), 'amb 6')
+        self.assertEqual(self.cache.get(self.key_raw), 'no amb')
+
+    def test_collection(self):
+        ambient_saved('flipcoil')
+        self.assertIsNone(self.cache.get(self.key_amb))
+        self.assertIsNone(self.cache.get(self.key_other))
+        self.assertEqual(self.cache.get(self.key_raw), 'no amb')
+
+    def test_other_collection(self):
+        ambient_saved('stretchedwire', 5)
+        self.assertEqual(self.cache.get(self.key_amb), 'amb 5')
+
+
+if __name__ == '__main__':
+    _unittest.main()
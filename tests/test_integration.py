@@ -0,0 +1,81 @@
+"""Flux integration engine tests."""
+
+import unittest as _unittest
+import numpy as _np
+
+from flipcoil.analysis import integration as _integration
+
+
+def _legacy_flux(data, dt, baseline, lag):
+    """Prefix integrals of the legacy analysis, one record per column."""
+    _flx = _np.zeros(data.shape)
+    for i in range(data.shape[1]):
+        _v = data[:, i]
+        if baseline > 0:
+            _v = _v - _v[:baseline].mean()
+        for j in range(data.shape[0]):
+            # integral up to sample j - lag
+            _flx[j, i] = _np.trapz(_v[:max(j - lag + 1, 0)], dx=dt)
+    return _flx
+
+
+class TestIntegrateFlux(_unittest.TestCase):
+    """Tests integrate_flux against the legacy prefix integrals."""
+
+    def setUp(self):
+        _rng = _np.random.RandomState(0)
+        self.dt = 0.01
+        self.data = _rng.normal(size=(200, 3)) + 0.5
+
+    def test_flip_coil(self):
+        _flx = _integration.integrate_flux(self.data, self.dt,
+                                           baseline=40, lag=2)
+        _np.testing.assert_allclose(
+            _flx, _legacy_flux(self.data, self.dt, 40, 2), atol=1e-12)
+
+    def test_stretched_wire(self):
+        _flx = _integration.integrate_flux(self.data, self.dt, lag=1)
+        _np.testing.assert_allclose(
+            _flx, _legacy_flux(self.data, self.dt, 0, 1), atol=1e-12)
+
+    def test_axis(self):
+        _flx = _integration.integrate_flux(self.data.T, self.dt,
+                                           baseline=40, lag=2, axis=1)
+        _np.testing.assert_allclose(
+            _flx.T, _legacy_flux(self.data, self.dt, 40, 2), atol=1e-12)
+
+    def test_short_record(self):
+        _flx = _integration.integrate_flux(self.data[:2], self.dt, lag=2)
+        _np.testing.assert_array_equal(_flx, _np.zeros((2, 3)))
+
+
+class TestIntegrateFluxBatch(_unittest.TestCase):
+    """Tests integrate_flux_batch against integrate_flux."""
+
+    def setUp(self):
+        _rng = _np.random.RandomState(1)
+        self.dt = 0.01
+        # positions x samples x repetitions
+        self.data = _rng.normal(size=(7, 100, 4))
+
+    def test_chunks(self):
+        _flx = _integration.integrate_flux_batch(
+            self.data, self.dt, baseline=10, lag=1, chunk_size=3)
+        for i in range(self.data.shape[0]):
+            _np.testing.assert_allclose(
+                _flx[i], _legacy_flux(self.data[i], self.dt, 10, 1),
+                atol=1e-12)
+
+    def test_whole_stack(self):
+        _np.testing.assert_allclose(
+            _integration.integrate_flux_batch(self.data, self.dt, lag=1),
+            _integration.integrate_flux_batch(self.data, self.dt, lag=1,
+                                              chunk_size=2))
+
+    def test_first_axis(self):
+        with self.assertRaises(ValueError):
+            _integration.integrate_flux_batch(self.data, self.dt, axis=0)
+
+
+if __name__ == '__main__':
+    _unittest.main()
@@ -0,0 +1,76 @@
+"""Scan planner tests."""
+
+import unittest as _unittest
+
+from flipcoil.acquisition import planner as _planner
+
+
+class TestAxisValues(_unittest.TestCase):
+    """Tests axis_values."""
+
+    def test_includes_end(self):
+        self.assertEqual(_planner.axis_values(0, 5, 2), [0, 2, 4, 5])
+
+    def test_descending(self):
+        self.assertEqual(_planner.axis_values(4, 0, 2), [4, 2, 0])
+
+    def test_zero_step(self):
+        self.assertEqual(_planner.axis_values(0, 5, 0), [5])
+
+
+class TestGridPlan(_unittest.TestCase):
+    """Tests grid_plan ordering."""
+
+    def test_serpentine(self):
+        _plan = _planner.grid_plan({'x': [0, 1, 2], 'y': [10, 20]})
+        self.assertEqual(
+            [(p['y'], p['x']) for p in _plan],
+            [(10, 0), (10, 1), (10, 2), (20, 2), (20, 1), (20, 0)])
+
+    def test_current_never_reversed(self):
+        _plan = _planner.grid_plan({'current': [1, 2], 'x': [0, 1]})
+        self.assertEqual(
+            [(p['current'], p['x']) for p in _plan],
+            [(1, 0), (1, 1), (2, 1), (2, 0)])
+
+    def test_current_is_slowest(self):
+        _plan = _planner.grid_plan(
+            {'x': [0, 1], 'y': [0, 1], 'current': [5, 6]})
+        self.assertEqual([p['current'] for p in _plan], [5]*4 + [6]*4)
+        # the stage keeps its position across the current change
+        self.assertEqual(
+            (_plan[3]['x'], _plan[3]['y']), (_plan[4]['x'], _plan[4]['y']))
+
+
+class TestEstimateTime(_unittest.TestCase):
+    """Tests estimate_time."""
+
+    def test_measurements_only(self):
+        _plan = _planner.grid_plan({'x': [0, 1, 2]})
+        self.assertEqual(
+            _planner.estimate_time(_plan, 10, repeats=2), 60)
+
+    def test_rates(self):
+        _plan = _planner.grid_plan({'x': [0, 100]})
+        # the first point is not counted without a start
+        self.assertEqual(
+            _planner.estimate_time(_plan, 1, rates={'x': 50}), 4)
+        self.assertEqual(
+            _planner.estimate_time(_plan, 1, start={'x': 200},
+                                   rates={'x': 50}), 8)
+
+    def test_settle_groups(self):
+        _plan = [{'x': 0, 'y': 0}, {'x': 1, 'y': 1}]
+        # x and y settle together
+        self.assertEqual(
+            _planner.estimate_time(_plan, 1,
+                                   settle_times={'x': 2, 'y': 3}), 8)
+
+    def test_defaults_not_shared(self):
+        _plan = [{'x': 0}, {'x': 1}]
+        self.assertEqual(_planner.estimate_time(_plan, 1), 2)
+        self.assertEqual(_planner.estimate_time(_plan, 1), 2)
+
+
+if __name__ == '__main__':
+    _unittest.main()
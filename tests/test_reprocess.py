@@ -0,0 +1,73 @@
+"""Database reprocessing tests."""
+
+import os as _os
+import sqlite3 as _sqlite3
+import tempfile as _tempfile
+import unittest as _unittest
+
+from flipcoil.analysis import reprocess as _reprocess
+
+
+class TestWriteBatch(_unittest.TestCase):
+    """Tests that the overrides are stored with the summaries."""
+
+    def setUp(self):
+        _fd, self.filename = _tempfile.mkstemp(suffix='.db')
+        _os.close(_fd)
+        self.addCleanup(_os.remove, self.filename)
+        _con = _sqlite3.connect(self.filename)
+        with _con:
+            _con.execute('CREATE TABLE measurements_sw '
+                         '(id INTEGER, turns REAL, I_mean TEXT, I_std TEXT)')
+            _con.execute('CREATE TABLE measurements '
+                         '(id INTEGER, cfg_id INTEGER, I_mean REAL, '
+                         'I_std REAL)')
+            _con.execute('CREATE TABLE measurement_cfg '
+                         '(id INTEGER, width REAL, turns REAL)')
+            _con.executemany('INSERT INTO measurements_sw VALUES '
+                             '(?, 1, NULL, NULL)', [(1,), (2,)])
+            _con.executemany('INSERT INTO measurements VALUES '
+                             '(?, ?, NULL, NULL)', [(1, 1), (2, 2)])
+            _con.executemany('INSERT INTO measurement_cfg VALUES '
+                             '(?, 0.01, 1)', [(1,), (2,)])
+        _con.close()
+
+    def query(self, sql):
+        _con = _sqlite3.connect(self.filename)
+        try:
+            return _con.execute(sql).fetchall()
+        finally:
+            _con.close()
+
+    def test_override_fields(self):
+        self.assertEqual(
+            _reprocess.override_fields('measurements_sw', 0.02, 10),
+            ({'turns': 10.0}, {}))
+        self.assertEqual(
+            _reprocess.override_fields('measurements', 0.02, None),
+            ({}, {'width': 0.02}))
+
+    def test_stretched_wire_turns(self):
+        _fields, _cfg_fields = _reprocess.override_fields(
+            'measurements_sw', turns=10)
+        _reprocess.write_batch(self.filename, 'measurements_sw',
+                               [(1, 1.5, 0.5)], fields=_fields,
+                               cfg_fields=_cfg_fields)
+        self.assertEqual(
+            self.query('SELECT id, turns, I_mean FROM measurements_sw'),
+            [(1, 10.0, '1.5'), (2, 1.0, None)])
+
+    def test_flip_coil_cfg(self):
+        _fields, _cfg_fields = _reprocess.override_fields(
+            'measurements', width=0.02, turns=10)
+        _reprocess.write_batch(self.filename, 'measurements',
+                               [(1, 1.5, 0.5)], fields=_fields,
+                               cfg_ids=[1], cfg_fields=_cfg_fields)
+        self.assertEqual(self.query('SELECT * FROM measurement_cfg'),
+                         [(1, 0.02, 10.0), (2, 0.01, 1.0)])
+        self.assertEqual(self.query('SELECT I_mean FROM measurements'),
+                         [(1.5,), (None,)])
+
+
+if __name__ == '__main__':
+    _unittest.main()
@@ -0,0 +1,77 @@
+"""Measurement sequencer tests."""
+
+import unittest as _unittest
+from unittest import mock as _mock
+
+from flipcoil.acquisition import planner as _planner
+from flipcoil.acquisition import sequencer as _sequencer
+
+
+class _Detector():
+    """Settle detector that counts its waits."""
+
+    def __init__(self, name):
+        self.name = name
+        self.timeout = 10
+        self.setpoint = None
+        self.waits = 0
+
+    def wait(self, sleep=None):
+        self.waits += 1
+        return True, 0
+
+
+class TestApplySetpoint(_unittest.TestCase):
+    """Tests that only the changed setpoints are applied and settled."""
+
+    def setUp(self):
+        self.seq = _sequencer.Sequencer(None)
+        self.seq.move_settle = _Detector('encoder')
+        self.seq.current_settle = _Detector('current')
+        self.seq.move_xy = _mock.Mock()
+        self.seq.wait = _mock.Mock()
+        _patcher = _mock.patch.object(_sequencer, '_ps')
+        self.ps = _patcher.start()
+        self.addCleanup(_patcher.stop)
+
+    def test_grid(self):
+        _plan = _planner.grid_plan(
+            {'current': [1, 2], 'y': [0, 10], 'x': [0, 5, 10]})
+        for point in _plan:
+            self.seq.apply_setpoint(point)
+        # 2 currents, 12 points (each with a single stage axis change,
+        # except the first point and the current change)
+        self.assertEqual(self.ps.set_slowref.call_count, 2)
+        self.assertEqual(self.seq.current_settle.waits, 2)
+        self.assertEqual(self.seq.move_xy.call_count, 11)
+        self.assertEqual(self.seq.move_settle.waits, 11)
+        self.seq.wait.assert_not_called()
+
+    def test_changed_axis_only(self):
+        self.seq.apply_setpoint({'x': 0, 'y': 0})
+        self.seq.apply_setpoint({'x': 5, 'y': 0})
+        self.seq.move_xy.assert_called_with(5, None)
+
+    def test_repeated_point(self):
+        self.seq.apply_setpoint({'x': 0, 'current': 1})
+        self.seq.apply_setpoint({'x': 0, 'current': 1})
+        self.assertEqual(self.seq.move_xy.call_count, 1)
+        self.assertEqual(self.ps.set_slowref.call_count, 1)
+        self.assertEqual(self.seq.move_settle.waits, 1)
+        self.assertEqual(self.seq.current_settle.waits, 1)
+
+    def test_fixed_wait(self):
+        self.seq.move_settle = None
+        self.seq.apply_setpoint({'x': 0})
+        self.seq.apply_setpoint({'x': 0})
+        self.seq.wait.assert_called_once_with(self.seq.settle_time)
+
+    def test_restore_clears_setpoints(self):
+        self.seq.apply_setpoint({'x': 0})
+        self.seq.restore_setpoint(turn_off=False)
+        self.seq.apply_setpoint({'x': 0})
+        self.assertEqual(self.seq.move_xy.call_count, 2)
+
+
+if __name__ == '__main__':
+    _unittest.main()
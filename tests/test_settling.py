@@ -0,0 +1,51 @@
+"""Settle detector tests."""
+
+import unittest as _unittest
+from unittest import mock as _mock
+import numpy as _np
+
+from flipcoil.acquisition import settling as _settling
+
+
+def _bursts(rms_list):
+    """Returns multimeter bursts with the given RMS values."""
+    return [None if rms is None else rms*_np.array([1.0, -1.0]*10)
+            for rms in rms_list]
+
+
+class TestVoltageNoiseSettle(_unittest.TestCase):
+    """Tests VoltageNoiseSettle.check."""
+
+    def setUp(self):
+        _patcher = _mock.patch.object(_settling, '_volt')
+        self.volt = _patcher.start()
+        self.addCleanup(_patcher.stop)
+        self.volt.reading_time = 0.001
+        self.detector = _settling.VoltageNoiseSettle()
+        self.detector.reset()
+
+    def checks(self, rms_list):
+        self.volt.read_memory_block.side_effect = _bursts(rms_list)
+        return [self.detector.check() for _ in rms_list]
+
+    def test_decaying(self):
+        self.assertEqual(self.checks([1, 0.5, 0.25, 0.24]),
+                         [False, False, False, True])
+
+    def test_growing(self):
+        # a coil still ringing up is not settled
+        self.assertEqual(self.checks([0.1, 0.105, 0.11, 0.2, 0.4]),
+                         [False]*5)
+
+    def test_noise_floor(self):
+        self.detector.noise_floor = 0.1
+        self.assertEqual(self.checks([0.3, 0.14, 0.2]),
+                         [False, True, False])
+
+    def test_failed_read(self):
+        self.assertEqual(self.checks([1, None, 0.95]),
+                         [False, False, True])
+
+
+if __name__ == '__main__':
+    _unittest.main()
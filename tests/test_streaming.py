@@ -0,0 +1,41 @@
+"""Streaming analysis tests."""
+
+import unittest as _unittest
+import numpy as _np
+
+from flipcoil.analysis.streaming import RunningStatistics
+
+
+class TestRunningStatistics(_unittest.TestCase):
+    """Tests RunningStatistics against numpy."""
+
+    def test_scalars(self):
+        _values = _np.random.RandomState(0).normal(5, 2, size=50)
+        _stats = RunningStatistics()
+        for value in _values:
+            _stats.add(value)
+        self.assertEqual(_stats.count, 50)
+        self.assertAlmostEqual(_stats.mean, _np.mean(_values), places=12)
+        self.assertAlmostEqual(_stats.std, _np.std(_values), places=12)
+
+    def test_arrays(self):
+        # stretched wire steps, one value per position
+        _values = _np.random.RandomState(1).normal(size=(20, 6))
+        _stats = RunningStatistics()
+        for value in _values:
+            _stats.add(value)
+        _np.testing.assert_allclose(_stats.mean, _values.mean(axis=0))
+        _np.testing.assert_allclose(_stats.std, _values.std(axis=0))
+
+    def test_single_value(self):
+        _stats = RunningStatistics()
+        _stats.add(3.0)
+        self.assertEqual(_stats.mean, 3.0)
+        self.assertEqual(_stats.std, 0.0)
+
+    def test_empty(self):
+        self.assertEqual(RunningStatistics().std, 0.0)
+
+
+if __name__ == '__main__':
+    _unittest.main()